@@ -0,0 +1,145 @@
+"""
+asistan_acil.py — Acil belirti hızlı yolu (LLM'den önce 112 uyarısı)
+
+Sistem talimatı modele göğüs ağrısı, nefes darlığı, bilinç kaybı ve şiddetli kanamada
+112'yi önermesini söyler; ancak acil durumdaki kullanıcı bu uyarıyı okumak için tüm LLM
+süresini beklememeli. Bu modül:
+- Acil belirti ifadelerini uygulama başlarken tek bir Aho-Corasick otomatına derler
+- Her gelen mesajı tek geçişte tarar (mesaj uzunluğuyla doğrusal; kalıp sayısından bağımsız)
+- Eşleşme Türkçe'ye uygun küçük harf + aksan katlamalı metinde yapılır: "GÖĞÜS AĞRISI",
+  "gogsum agriyor", "Göğsümde ağrı" aynı kalıba düşer
+- Kalıplar kelime başında eşleşir (ek alan kökler: "bayıl" → bayıldı, bayılıyorum ...)
+
+API eşleşmede hazır 112 uyarısını hemen döndürür/akıtır; LLM yanıtı ardından gelir veya atlanır.
+"""
+
+from collections import deque
+from typing import Dict, Iterable, List, Tuple
+
+from asistan_onbellek import fold_text
+
+# Kategori → (kullanıcıya gösterilen etiket, ifadeler). İfadeler fold_text ile katlanır;
+# kök olarak yazılabilir (kelime başında eşleşir, kelime sonu serbesttir). Tek başına sıradan
+# sorularda da geçen kökler ("morardı", "konuşamıyor", "zehirlenme") bağlamıyla yazılır:
+# "dizim morardı", "bebeğim henüz konuşamıyor", "gıda zehirlenmesi sonrası" acil sayılmaz.
+EMERGENCY_PATTERNS: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    "chest_pain": ("göğüs ağrısı", (
+        "göğüs ağrı", "göğsüm ağrı", "göğsümde ağrı", "göğsümde sıkışma", "göğsümde baskı",
+        "göğüs sıkışma", "kalp krizi", "kalbim sıkış", "sol koluma vuran",
+    )),
+    "breathing": ("nefes darlığı", (
+        "nefes darlığı", "nefes alamıyor", "nefes alamam", "nefesim daral", "nefesim kesil",
+        "boğuluyor", "dudakları morar", "dudaklarım morar", "dudağı morar", "yüzü morar",
+        "yüzüm morar", "rengi morar",
+    )),
+    "unconscious": ("bilinç kaybı", (
+        "bilinç kaybı", "bilincini kaybet", "bilincimi kaybet", "bayıldı", "bayılıyor",
+        "bayılacak", "kendinden geçti", "uyandıramıyor", "tepki vermiyor",
+    )),
+    "bleeding": ("şiddetli kanama", (
+        "şiddetli kanama", "kanama durmuyor", "kanaması durmuyor", "çok kan kaybet",
+        "kan kusuyor", "kan kustu", "kan kusma",
+    )),
+    "stroke": ("felç belirtisi", (
+        "felç", "yüzüm kaydı", "yüzünde kayma", "ağzım kaydı", "aniden konuşamı", "birden konuşamı",
+        "konuşmam bozul", "konuşması bozul", "dili dolaş", "kolumu kaldıramıyor", "bir tarafım uyuş",
+    )),
+    "seizure": ("nöbet", (
+        "nöbet geçiriyor", "nöbet geçirdi", "havale geçir", "kasılıp bayıl",
+    )),
+    "poisoning": ("zehirlenme", (
+        "zehirlendi", "zehirleniyor", "zehir içti", "zehir içmiş", "zehir yuttu", "zehir yutmuş",
+        "aşırı doz", "çok fazla ilaç iç", "kutu ilaç iç", "çamaşır suyu iç",
+    )),
+    "anaphylaxis": ("ağır alerjik reaksiyon", (
+        "dilim şişti", "boğazım şişti", "boğazım kapan", "anafilaksi",
+    )),
+    "self_harm": ("kendine zarar verme düşüncesi", (
+        "intihar", "kendimi öldür", "yaşamak istemiyorum", "canıma kıy", "kendime zarar ver",
+    )),
+}
+
+
+class PhraseMatcher:
+    """
+    Aho-Corasick çoklu ifade eşleyici: tüm ifadeler tek bir otomatta, metin tek geçişte taranır.
+    Eşleşme yalnızca kelime başında başlayan ifadeler için sayılır.
+    """
+
+    def __init__(self, phrases: Iterable[Tuple[str, str]]) -> None:
+        # Düğüm başına: geçişler, hata (fail) bağlantısı, biten ifadeler (uzunluk, etiket)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[Tuple[int, str], ...]] = [()]
+        for phrase, tag in phrases:
+            self._add(fold_text(phrase), tag)
+        self._link()
+
+    def _add(self, phrase: str, tag: str) -> None:
+        if not phrase:
+            return
+        node = 0
+        for ch in phrase:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            node = nxt
+        self._out[node] += ((len(phrase), tag),)
+
+    def _link(self) -> None:
+        """Hata bağlantılarını genişlik öncelikli kurar; çıktılar sonek düğümlerden devralınır"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] += self._out[self._fail[child]]
+
+    def scan(self, text: str) -> List[str]:
+        """Katlanmış metinde kelime başında eşleşen ifadelerin etiketleri (ilk görülme sırasıyla)"""
+        goto, fail, out = self._goto, self._fail, self._out
+        found: List[str] = []
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for length, tag in out[node]:
+                start = i - length + 1
+                if (start == 0 or text[start - 1] == " ") and tag not in found:
+                    found.append(tag)
+        return found
+
+
+_MATCHER = PhraseMatcher(
+    (phrase, category)
+    for category, (_, phrases) in EMERGENCY_PATTERNS.items()
+    for phrase in phrases
+)
+
+
+def detect_emergency(message: str) -> List[str]:
+    """Mesajdaki acil belirti kategorileri (yoksa boş liste)"""
+    return _MATCHER.scan(fold_text(message))
+
+
+def emergency_advice(categories: List[str]) -> str:
+    """Eşleşen kategoriler için hazır 112 uyarısı (LLM yanıtından önce gösterilir)"""
+    labels = ", ".join(EMERGENCY_PATTERNS[c][0] for c in categories)
+    text = (
+        f"⚠️ Yazdıklarınız acil bir durumu işaret ediyor olabilir ({labels}). "
+        "Bu belirtiler şu anda sürüyorsa lütfen hemen **112**'yi arayın veya en yakın acil "
+        "servise başvurun; mümkünse yanınızda biri olsun ve araç kullanmayın."
+    )
+    if "self_harm" in categories:
+        text += " Yalnız değilsiniz; şu an güvende değilseniz 112'yi aramaktan çekinmeyin."
+    return text
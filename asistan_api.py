@@ -7,17 +7,71 @@ Detaylı kullanım için README.md dosyasına bakın.
 """
 
 import os
+import json
 import uuid
+import asyncio
 import logging
-from typing import Dict, Optional
-from fastapi import FastAPI, HTTPException
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, nullcontext
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Sequence, Tuple, TypeVar
+from fastapi import (
+    BackgroundTasks,
+    FastAPI,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    WebSocket,
+    WebSocketDisconnect,
+)
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, field_validator
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, ValidationError, field_validator
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.memory import ConversationBufferMemory
-from langchain.chains import ConversationChain
-from langchain_core.messages import SystemMessage
+
+from asistan_acil import detect_emergency, emergency_advice
+from asistan_direnc import CircuitBreaker, CircuitOpenError, Upstream, is_retryable
+from asistan_hafiza import (
+    MEMORY_MAX_TOKENS,
+    MEMORY_MODE,
+    build_summary_prompt,
+    clip_summary,
+    get_summary,
+    get_tokenizer,
+    message_tokens,
+)
+from asistan_llm import ConversationRunner, message_text
+from asistan_onbellek import (
+    CHIP_PROMPTS,
+    IdempotencyConflictError,
+    IdempotencyStore,
+    ResponseCache,
+    SemanticCache,
+    SingleFlight,
+    normalize_text,
+    render_template,
+    to_template,
+)
+from asistan_depo import create_backend
+from asistan_metrik import FAST_BUCKETS, SIZE_BUCKETS, Registry, Timed
+from asistan_profil import Profiler, ProfilingMiddleware, annotate, mark, span
+from asistan_rota import ModelRouter
+from asistan_saglayici import create_llm
+from asistan_oturum import (
+    Session,
+    SessionBusyError,
+    SessionLocks,
+    SessionStore,
+    run_flusher,
+    run_janitor,
+    session_key_for,
+)
+from asistan_talimat import GENDERS, build_system_message, profile_key
+from asistan_yuk import ConcurrencyLimiter, OverloadedError, RateLimitedError, RateLimiter, Slot
 
 # Loglama: Üretimde ne olduğunu takip edebilmek için sade format
 logging.basicConfig(
@@ -29,10 +83,20 @@ logger = logging.getLogger("doctor-assistant-api")
 
 # Ortam değişkenleri: API anahtarları, model ve CORS ayarları
 load_dotenv()
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if not GOOGLE_API_KEY:
-    raise RuntimeError("GOOGLE_API_KEY bulunamadı. .env dosyanızı kontrol edin.")
+# LLM_PROVIDER: gemini (GOOGLE_API_KEY gerekir) veya fake (çevrimdışı yük testi, asistan_saglayici.py)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini").strip().lower()
 LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+# Model yönlendirme (asistan_rota.py): LLM_STRONG_MODEL verilirse uzun, çok belirtili veya derin
+# geçmişli turlar güçlü modele, diğerleri LLM_MODEL'e (hızlı) gider. Boş = tek model
+LLM_STRONG_MODEL = os.getenv("LLM_STRONG_MODEL", "").strip()
+ROUTE_LONG_MESSAGE_CHARS = int(os.getenv("ROUTE_LONG_MESSAGE_CHARS", "280"))
+ROUTE_SYMPTOM_THRESHOLD = int(os.getenv("ROUTE_SYMPTOM_THRESHOLD", "3"))
+ROUTE_HISTORY_TURNS = int(os.getenv("ROUTE_HISTORY_TURNS", "4"))
+# Güçlü model bu sürede yanıt (akışta ilk parça) vermezse tur hızlı modelle yanıtlanır (0 = bekle)
+ROUTE_STRONG_TIMEOUT_SECONDS = float(os.getenv("ROUTE_STRONG_TIMEOUT_SECONDS", "20"))
+# Maliyet metriği için yaklaşık fiyat: milyon token başına USD (girdi + çıktı tek fiyat)
+ROUTE_FAST_COST_PER_MTOK = float(os.getenv("ROUTE_FAST_COST_PER_MTOK", "0.30"))
+ROUTE_STRONG_COST_PER_MTOK = float(os.getenv("ROUTE_STRONG_COST_PER_MTOK", "2.50"))
 
 # CORS whitelist: Production'da yalnızca güvenilir istemcilere izin ver
 # Örn: ALLOWED_ORIGINS="https://*.streamlit.app,https://*.streamlit.io,http://localhost:8501"
@@ -45,8 +109,146 @@ ALLOWED_ORIGINS = [
     if o.strip()
 ]
 
-# Hafıza limiti: RAM şişmesin, sadece son N mesajı tut (system mesajı korunur)
+# Hafıza limiti: Birincil sınır tahmini token bütçesidir (MEMORY_MAX_TOKENS, asistan_hafiza.py);
+# mesaj sayısı ise ek güvenlik sınırı olarak kalır (0 = kapalı). System mesajı her zaman korunur.
 MAX_MEMORY_MESSAGES = int(os.getenv("MEMORY_MAX_MESSAGES", "20"))
+MAX_MEMORY_TOKENS = MEMORY_MAX_TOKENS
+
+# Özet modu (MEMORY_MODE=summary): budanan turlar arka planda kayan özete katlanır.
+# Özet başarısız olursa en fazla bu kadar mesaj bir sonraki denemeye saklanır.
+SUMMARY_MAX_PENDING = int(os.getenv("MEMORY_SUMMARY_MAX_PENDING", "40"))
+
+# LLM iş parçacığı havuzu: Native async desteği olmayan sağlayıcılar bu havuzda çalışır.
+# Event loop bloklanmaz; aynı anda en fazla LLM_MAX_WORKERS senkron çağrı yürütülür.
+LLM_MAX_WORKERS = int(os.getenv("LLM_MAX_WORKERS", "32"))
+
+# Oturum deposu sınırları: uzun süre çalışan instance'ta RAM sabit kalsın
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "5000"))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "3600"))
+SESSION_JANITOR_INTERVAL = float(os.getenv("SESSION_JANITOR_INTERVAL", "60"))
+# Aynı oturumda işlenen istek varken bekleyebilecek en fazla istek; fazlası 409 ile reddedilir
+SESSION_QUEUE_DEPTH = int(os.getenv("SESSION_QUEUE_DEPTH", "2"))
+# Kalıcı oturum arka ucu: memory (kalıcılık yok) veya sqlite (yeniden başlatmada oturumlar korunur)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+# Değişen oturumlar bu aralıkla tek işlemde diske yazılır
+SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", "1.0"))
+# Birden çok worker aynı veritabanını paylaşıyorsa: erişimde başka worker'ın yazdığını kontrol et
+SESSION_SHARED = os.getenv("SESSION_SHARED", "false").lower() == "true"
+
+# Geri basınç: aynı anda işlenen sohbet isteği sınırı (0 = sınırsız); fazlası sınırlı kuyrukta
+# en fazla CHAT_QUEUE_TIMEOUT_SECONDS bekler. Kuyruk doluysa/süre dolarsa 503 + Retry-After.
+CHAT_MAX_IN_FLIGHT = int(os.getenv("CHAT_MAX_IN_FLIGHT", "32"))
+CHAT_QUEUE_DEPTH = int(os.getenv("CHAT_QUEUE_DEPTH", "128"))
+CHAT_QUEUE_TIMEOUT_SECONDS = float(os.getenv("CHAT_QUEUE_TIMEOUT_SECONDS", "15"))
+# Oturum başına hız sınırı (jeton kovası): dakikada RATE_LIMIT_PER_MINUTE mesaj (0 = kapalı),
+# art arda en fazla RATE_LIMIT_BURST; aşımda 429 + Retry-After
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "0"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "5"))
+
+# İstemci son tarihi: X-Request-Timeout başlığı veya timeout_seconds alanı (saniye) verilmezse
+# kullanılan varsayılan (0 = yok). Süre dolunca LLM çağrısı iptal edilir ve tur geri alınır (504)
+CHAT_DEFAULT_TIMEOUT_SECONDS = float(os.getenv("CHAT_DEFAULT_TIMEOUT_SECONDS", "0"))
+
+# Acil belirti hızlı yolu (asistan_acil.py): mesajda göğüs ağrısı, nefes darlığı vb. varsa hazır
+# 112 uyarısı LLM beklenmeden verilir; acil istekler kuyrukta önceliklidir ve hız sınırına takılmaz.
+# EMERGENCY_LLM_FOLLOWUP=false: LLM yanıtı atlanır, yalnızca uyarı döner (/chat'te de anında)
+EMERGENCY_FAST_PATH = os.getenv("EMERGENCY_FAST_PATH", "true").lower() == "true"
+EMERGENCY_LLM_FOLLOWUP = os.getenv("EMERGENCY_LLM_FOLLOWUP", "true").lower() == "true"
+
+# Sağlayıcı dayanıklılığı (asistan_direnc.py): geçici hatalarda (503/429/zaman aşımı) en fazla
+# UPSTREAM_MAX_ATTEMPTS deneme, üstel geri çekilme + rastgele sapma. UPSTREAM_HEDGE=true: çağrı
+# p95 süresini aşarsa ikinci deneme başlatılır (LLM maliyetini artırır; varsayılan kapalı)
+UPSTREAM_MAX_ATTEMPTS = int(os.getenv("UPSTREAM_MAX_ATTEMPTS", "2"))
+UPSTREAM_BACKOFF_BASE_MS = float(os.getenv("UPSTREAM_BACKOFF_BASE_MS", "200"))
+UPSTREAM_BACKOFF_MAX_MS = float(os.getenv("UPSTREAM_BACKOFF_MAX_MS", "2000"))
+UPSTREAM_HEDGE = os.getenv("UPSTREAM_HEDGE", "false").lower() == "true"
+UPSTREAM_HEDGE_MIN_SAMPLES = int(os.getenv("UPSTREAM_HEDGE_MIN_SAMPLES", "20"))
+# Devre kesici: art arda CIRCUIT_FAILURE_THRESHOLD geçici hatada (0 = kapalı) devre açılır ve
+# CIRCUIT_RESET_SECONDS boyunca sağlayıcı çağrılmaz; bu sürede önbellekteki (bayat olsa da) yanıt
+# veya kısa bir "şu an yanıt veremiyorum" metni döner (degraded=true, tur hafızaya yazılmaz)
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+# İlk tur yanıt önbelleği: anahtar (normalize mesaj, cinsiyet, yaş grubu)
+# RESPONSE_CACHE_SCOPE: chips (sadece hızlı başlat soruları) veya first_turn (tüm ilk mesajlar)
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_SCOPE = os.getenv("RESPONSE_CACHE_SCOPE", "chips").strip().lower()
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2000"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", str(6 * 3600)))
+# Başlangıçta çip × profil yanıtlarını önceden üret (12 × 9 LLM çağrısı; varsayılan kapalı)
+RESPONSE_CACHE_PREWARM = os.getenv("RESPONSE_CACHE_PREWARM", "false").lower() == "true"
+
+# Anlamsal önbellek (opsiyonel): ilk tur sorularının farklı yazımlarını profil grubu içinde eşler.
+# Yalnızca kısa ve genel ilk sorular için kullanılır; uzun, kişisel anlatımlar LLM'e gider.
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.82"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+SEMANTIC_CACHE_MAX_CHARS = int(os.getenv("SEMANTIC_CACHE_MAX_CHARS", "160"))
+
+# Idempotency: aynı anahtarla tekrar gönderilen /chat istekleri LLM'i yeniden çağırmaz
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "600"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+
+# Toplu sohbet (POST /chat/batch): istek başına en fazla öğe ve aynı anda işlenen öğe sayısı.
+# Öğeler yine global yuva sınırından (CHAT_MAX_IN_FLIGHT) geçer: toplu iş diğer kullanıcıları ezmez
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+# WebSocket kanalı (/chat/ws): sunucu her WS_HEARTBEAT_SECONDS'ta {"type": "ping"} gönderir (bağlantı
+# ve Render örneği açık kalır); WS_IDLE_TIMEOUT_SECONDS boyunca istemciden çerçeve gelmezse kapatılır
+WS_HEARTBEAT_SECONDS = float(os.getenv("WS_HEARTBEAT_SECONDS", "25"))
+WS_IDLE_TIMEOUT_SECONDS = float(os.getenv("WS_IDLE_TIMEOUT_SECONDS", "900"))
+
+# /metrics (Prometheus metin formatı); sayaçlar her durumda tutulur, yalnızca endpoint kapatılabilir
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# İstek profili (varsayılan kapalı): örnekleme oranı ve bellekte tutulan son iz sayısı.
+# ADMIN_TOKEN ayarlıysa X-Debug-Profile: <token> başlığıyla tek bir istek de profillenebilir;
+# izler GET /admin/traces (X-Admin-Token başlığıyla) üzerinden okunur.
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_MAX_TRACES = int(os.getenv("PROFILE_MAX_TRACES", "100"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Hızlı başlat çip soruları (CHIP_PROMPTS, asistan_onbellek.py): "chips" kapsamının anahtarları
+CHIP_PROMPT_KEYS = frozenset(normalize_text(p) for p in CHIP_PROMPTS)
+# Ön ısıtmada her yaş grubunu temsil eden örnek profil
+PREWARM_NAME = "Deniz"
+PREWARM_AGES = {"child": 12, "adult": 30, "senior": 60}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Uygulama yaşam döngüsü: başlangıçta kaynakları hazırla, kapanışta serbest bırak"""
+    # LangChain'in senkron fallback'i (run_in_executor) loop'un varsayılan havuzunu kullanır
+    executor = ThreadPoolExecutor(max_workers=LLM_MAX_WORKERS, thread_name_prefix="llm")
+    asyncio.get_running_loop().set_default_executor(executor)
+    # Süresi dolan oturumları arka planda temizle
+    janitor = asyncio.create_task(run_janitor(user_to_memory, SESSION_JANITOR_INTERVAL))
+    # Kalıcı arka uç varsa değişen oturumları periyodik olarak toplu yaz
+    flusher = None
+    if user_to_memory.backend.persistent:
+        flusher = asyncio.create_task(run_flusher(user_to_memory, SESSION_FLUSH_INTERVAL))
+    # İsteğe bağlı: çip yanıtlarını arka planda önceden üret (başlangıcı bekletmez)
+    prewarm = None
+    if RESPONSE_CACHE_ENABLED and RESPONSE_CACHE_PREWARM:
+        prewarm = asyncio.create_task(prewarm_response_cache())
+    try:
+        yield
+    finally:
+        janitor.cancel()
+        if prewarm:
+            prewarm.cancel()
+        if flusher:
+            flusher.cancel()
+            await asyncio.gather(flusher, return_exceptions=True)
+            # Kapanışta bekleyen oturumları yaz: yeniden başlatmada sohbetler kaybolmasın
+            written = user_to_memory.flush()
+            logger.info("session store flushed=%s", written)
+        user_to_memory.backend.close()
+        executor.shutdown(wait=False, cancel_futures=True)
 
 
 # FastAPI uygulaması
@@ -54,6 +256,7 @@ app = FastAPI(
     title="Doktor Asistanı API",
     version="1.1.0",
     description="Gemini 2.x tabanlı, kişiselleştirilmiş ve hafızalı sohbet API'si",
+    lifespan=lifespan,
 )
 
 # CORS: Sadece belirlenen origin'lerden gelen web isteklerine izin ver
@@ -65,17 +268,182 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Profil: kapalıyken ara katman hiç eklenmez (istek yoluna ek maliyet yok)
+profiler = Profiler(PROFILE_SAMPLE_RATE, PROFILE_MAX_TRACES, header_token=ADMIN_TOKEN)
+if profiler.enabled:
+    app.add_middleware(
+        ProfilingMiddleware, profiler=profiler, paths=frozenset({"/chat", "/chat/stream", "/chat/batch"})
+    )
+
+
+# LLM istemcisi: LLM_PROVIDER'a göre (varsayılan Gemini)
+llm = create_llm(LLM_MODEL, LLM_PROVIDER)
+
+# Uzun ömürlü, durumsuz sohbet yürütücüsü: her istekte zincir kurulmaz
+runner = ConversationRunner(llm)
+
 
-# LLM (Gemini) istemcisi
-llm = ChatGoogleGenerativeAI(
-    model=LLM_MODEL,
-    temperature=0.7,
-    api_key=GOOGLE_API_KEY,
+def create_upstream() -> Upstream:
+    """Model başına deneme/devre kesici katmanı (bir modelin arızası diğerinin devresini açmaz)"""
+    return Upstream(
+        max_attempts=UPSTREAM_MAX_ATTEMPTS,
+        backoff_base=UPSTREAM_BACKOFF_BASE_MS / 1000,
+        backoff_max=UPSTREAM_BACKOFF_MAX_MS / 1000,
+        hedge=UPSTREAM_HEDGE,
+        hedge_min_samples=UPSTREAM_HEDGE_MIN_SAMPLES,
+        breaker=CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS),
+    )
+
+
+# Tüm LLM çağrıları (sohbet, akış, özet, ön ısıtma) aynı deneme/devre kesici katmanından geçer
+upstream = create_upstream()
+# Rota → (yürütücü, dayanıklılık katmanı); güçlü model yalnızca LLM_STRONG_MODEL verilirse kurulur
+ROUTE_TARGETS = {"fast": (runner, upstream)}
+ROUTE_MODELS = {"fast": LLM_MODEL, "strong": LLM_STRONG_MODEL}
+if LLM_STRONG_MODEL:
+    ROUTE_TARGETS["strong"] = (ConversationRunner(create_llm(LLM_STRONG_MODEL, LLM_PROVIDER)), create_upstream())
+model_router = ModelRouter(
+    long_message_chars=ROUTE_LONG_MESSAGE_CHARS,
+    symptom_threshold=ROUTE_SYMPTOM_THRESHOLD,
+    history_turns=ROUTE_HISTORY_TURNS,
 )
 
 
-# Kullanıcı bazlı konuşma hafızası: her kullanıcı/oturum için ayrı
-user_to_memory: Dict[str, ConversationBufferMemory] = {}
+# Oturum başına sıralama: aynı anahtara gelen istekler hafızayı sırayla okur/yazar
+session_locks = SessionLocks(max_queue=SESSION_QUEUE_DEPTH)
+# Kullanıcı bazlı konuşma hafızası: her kullanıcı/oturum için ayrı (LRU + TTL ile sınırlı);
+# turu süren oturum kapasite tahliyesinden korunur
+user_to_memory = SessionStore(
+    max_sessions=SESSION_MAX_COUNT,
+    max_bytes=SESSION_MAX_BYTES,
+    ttl_seconds=SESSION_TTL_SECONDS,
+    backend=create_backend(SESSION_BACKEND, SESSION_DB_PATH),
+    revalidate=SESSION_SHARED,
+    in_use=session_locks.busy,
+)
+# Global eşzamanlılık sınırı ve oturum başına hız sınırı (LLM sağlayıcısının önünde)
+chat_limiter = ConcurrencyLimiter(
+    max_in_flight=CHAT_MAX_IN_FLIGHT,
+    max_queue=CHAT_QUEUE_DEPTH,
+    queue_timeout=CHAT_QUEUE_TIMEOUT_SECONDS,
+)
+rate_limiter = RateLimiter(per_minute=RATE_LIMIT_PER_MINUTE, burst=RATE_LIMIT_BURST)
+
+
+# İlk tur yanıt önbelleği (isim/yaş yer tutuculu şablonlar)
+response_cache = ResponseCache(
+    max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+    max_bytes=RESPONSE_CACHE_MAX_BYTES,
+    ttl_seconds=RESPONSE_CACHE_TTL_SECONDS,
+)
+# Anlamsal ilk tur önbelleği: profil grubu başına yerel vektör indeksi
+semantic_cache = SemanticCache(
+    threshold=SEMANTIC_CACHE_THRESHOLD,
+    max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+    ttl_seconds=RESPONSE_CACHE_TTL_SECONDS,
+)
+# İstemci tekrarları için sonuç deposu (Idempotency-Key başlığı veya idempotency_key alanı)
+idempotency_store = IdempotencyStore(
+    max_entries=IDEMPOTENCY_MAX_ENTRIES,
+    ttl_seconds=IDEMPOTENCY_TTL_SECONDS,
+)
+# Eşzamanlı özdeş ilk tur istekleri (aynı çip + aynı profil grubu) tek LLM çağrısını paylaşır
+inflight = SingleFlight()
+
+
+# Metrikler: sıcak yolda yalnızca sayaç/kova güncellemesi (kilitsiz, kovalar önceden ayrılmış)
+metrics = Registry()
+REQUEST_LATENCY = metrics.histogram(
+    "doctor_request_duration_seconds", "Sohbet isteğinin toplam süresi", ("endpoint",))
+REQUESTS_IN_FLIGHT = metrics.gauge(
+    "doctor_requests_in_flight", "İşlenmekte olan sohbet istekleri", ("endpoint",))
+LLM_LATENCY = metrics.histogram(
+    "doctor_llm_duration_seconds", "LLM çağrı süresi (akışta son parçaya kadar)", ("kind",))
+LLM_IN_FLIGHT = metrics.gauge("doctor_llm_in_flight", "Devam eden LLM çağrıları")
+LLM_ERRORS = metrics.counter(
+    "doctor_llm_errors_total", "LLM (upstream) hataları, hata türüne göre", ("type",))
+MEMORY_LOOKUP = metrics.histogram(
+    "doctor_memory_lookup_seconds", "Oturum hafızasını bulma/oluşturma süresi", buckets=FAST_BUCKETS)
+MEMORY_TRIM = metrics.histogram(
+    "doctor_memory_trim_seconds", "Hafıza budama süresi", buckets=FAST_BUCKETS)
+SESSION_SIZE = metrics.histogram(
+    "doctor_session_size_bytes", "Tur sonunda oturumun yaklaşık bellek boyutu", buckets=SIZE_BUCKETS)
+REPLIES = metrics.counter(
+    "doctor_replies_total",
+    "Üretilen yanıtlar, kaynağa göre (llm/cache/semantic_cache/coalesced/emergency/stale_cache/degraded)",
+    ("source",))
+CHAT_ABORTED = metrics.counter(
+    "doctor_chat_aborted_total", "İstemci ayrıldığı veya son tarihi dolduğu için kesilen istekler",
+    ("reason",))
+BATCH_ITEMS = metrics.counter(
+    "doctor_batch_items_total", "Toplu istekteki öğeler, sonuç durum koduna göre", ("status",))
+EMERGENCIES = metrics.counter(
+    "doctor_emergency_matches_total", "Acil belirti eşleşmeleri, kategoriye göre", ("category",))
+metrics.callback("doctor_sessions_active", "Bellekteki oturum sayısı",
+                 lambda: [((), len(user_to_memory))])
+metrics.callback("doctor_sessions_bytes", "Bellekteki oturumların yaklaşık toplam boyutu",
+                 lambda: [((), user_to_memory.total_bytes)])
+metrics.callback("doctor_session_evictions_total", "Bellekten çıkarılan oturumlar",
+                 lambda: [((), user_to_memory.evictions)], kind="counter")
+metrics.callback("doctor_session_busy_rejections_total", "Oturum kuyruğu dolu olduğu için reddedilenler (409)",
+                 lambda: [((), session_locks.rejected)], kind="counter")
+metrics.callback("doctor_admission_queue_depth", "Yuva bekleyen sohbet istekleri",
+                 lambda: [((), chat_limiter.queued)])
+metrics.callback("doctor_admission_wait_seconds_total", "Kuyrukta beklenen toplam süre",
+                 lambda: [((), chat_limiter.wait_seconds)], kind="counter")
+metrics.callback("doctor_admission_rejections_total", "Yük nedeniyle reddedilen istekler (503/429)", lambda: [
+    (("queue_full",), chat_limiter.rejected["queue_full"]),
+    (("queue_timeout",), chat_limiter.rejected["queue_timeout"]),
+    (("rate_limited",), rate_limiter.limited),
+], ("reason",), kind="counter")
+ROUTE_DECISIONS = metrics.counter(
+    "doctor_route_decisions_total", "Model rotası seçimleri, rota ve nedene göre", ("route", "reason"))
+ROUTE_LATENCY = metrics.histogram(
+    "doctor_route_duration_seconds", "Yanıtı üreten rotanın LLM süresi (akışta son parçaya kadar)", ("route",))
+ROUTE_TOKENS = metrics.counter(
+    "doctor_route_tokens_total", "Rota başına tahmini token (prompt/completion)", ("route", "kind"))
+ROUTE_COST = metrics.counter(
+    "doctor_route_cost_usd_total", "Rota başına tahmini maliyet (ROUTE_*_COST_PER_MTOK ile)", ("route",))
+ROUTE_FALLBACKS = metrics.counter(
+    "doctor_route_fallbacks_total", "Güçlü model yanıt veremediği için hızlı modele düşen turlar", ("reason",))
+metrics.callback("doctor_upstream_retries_total", "Geçici sağlayıcı hatasından sonra yapılan yeniden denemeler",
+                 lambda: [((route,), u.retries) for route, (_, u) in ROUTE_TARGETS.items()],
+                 ("route",), kind="counter")
+metrics.callback("doctor_upstream_hedges_total", "p95 aşıldığı için başlatılan ikinci denemeler", lambda: [
+    item for route, (_, u) in ROUTE_TARGETS.items()
+    for item in (((route, "started"), u.hedges), ((route, "won"), u.hedge_wins))
+], ("route", "outcome"), kind="counter")
+metrics.callback("doctor_circuit_state", "Devre kesici durumu (0=kapalı, 1=yarı açık, 2=açık)",
+                 lambda: [((route,), CIRCUIT_STATES[u.breaker.state]) for route, (_, u) in ROUTE_TARGETS.items()],
+                 ("route",))
+metrics.callback("doctor_circuit_opens_total", "Devrenin açılma sayısı",
+                 lambda: [((route,), u.breaker.opens) for route, (_, u) in ROUTE_TARGETS.items()],
+                 ("route",), kind="counter")
+metrics.callback("doctor_circuit_short_circuited_total", "Devre açıkken sağlayıcıya gitmeden düşen çağrılar",
+                 lambda: [((route,), u.breaker.short_circuited) for route, (_, u) in ROUTE_TARGETS.items()],
+                 ("route",), kind="counter")
+metrics.callback("doctor_cache_hits_total", "Önbellek isabetleri", lambda: [
+    (("response",), response_cache.hits), (("semantic",), semantic_cache.hits),
+    (("coalesced",), inflight.shared), (("idempotency",), idempotency_store.replays),
+], ("cache",), kind="counter")
+metrics.callback("doctor_cache_misses_total", "Önbellek ıskalamaları", lambda: [
+    (("response",), response_cache.misses), (("semantic",), semantic_cache.misses),
+    (("coalesced",), inflight.leaders),
+], ("cache",), kind="counter")
+
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+# Sıcak yolda etiket araması olmasın: sık kullanılan seriler önceden çözülür
+_LLM_CALLS = {kind: LLM_LATENCY.labels(kind) for kind in ("chat", "stream", "summary")}
+_LLM_IN_FLIGHT = LLM_IN_FLIGHT.labels()
+_ROUTE_CALLS = {route: ROUTE_LATENCY.labels(route) for route in ROUTE_TARGETS}
+ROUTE_COST_PER_TOKEN = {"fast": ROUTE_FAST_COST_PER_MTOK / 1e6, "strong": ROUTE_STRONG_COST_PER_MTOK / 1e6}
+_tokenizer = get_tokenizer()
+
+
+def timed_llm(kind: str) -> Timed:
+    """LLM çağrısını süre, eşzamanlılık ve hata türüyle ölçen bağlam yöneticisi"""
+    return Timed(_LLM_CALLS[kind], _LLM_IN_FLIGHT, LLM_ERRORS)
 
 
 # İstek/Yanıt modelleri
@@ -86,6 +454,8 @@ class ChatRequest(BaseModel):
     gender: str         # Cinsiyet (female/male/other)
     message: str        # Kullanıcı mesajı
     session_id: Optional[str] = None  # Çoklu oturum için opsiyonel (istemci üretirse benzersiz olmalı)
+    idempotency_key: Optional[str] = None  # Tekrar denemelerde aynı kalmalı (Idempotency-Key başlığı da olur)
+    timeout_seconds: Optional[float] = None  # İstemcinin bekleme süresi (X-Request-Timeout başlığı da olur)
 
     @field_validator("name")
     @classmethod
@@ -101,6 +471,13 @@ class ChatRequest(BaseModel):
             raise ValueError("age 1-120 aralığında olmalıdır")
         return v
 
+    @field_validator("timeout_seconds")
+    @classmethod
+    def validate_timeout(cls, v: Optional[float]) -> Optional[float]:
+        if v is not None and v <= 0:
+            raise ValueError("timeout_seconds pozitif olmalıdır")
+        return v
+
     @field_validator("gender")
     @classmethod
     def validate_gender(cls, v: str) -> str:
@@ -116,74 +493,8 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     """Model yanıtı"""
     response: str
-
-
-# Sistem talimatı: modelin rolünü/tonunu/sınırlarını belirler
-def build_system_instruction(name: str, age: int, gender: str) -> str:
-    """
-    Cinsiyet ve yaşa göre kişiselleştirilmiş sistem talimatı oluşturur.
-    - Hitap tonu cinsiyete göre değişir
-    - Yaş ve cinsiyete özel sağlık önerileri eklenir
-    - Cinsiyete özel risk faktörleri vurgulanır
-    """
-    # Cinsiyete göre hitap ve ton
-    if gender == "female":
-        hitap_tonu = "Sayın" if age >= 18 else "Sevgili"
-        hitap_ozel = "Kadın sağlığı konularında (adet döngüsü, hamilelik, menopoz, meme sağlığı vb.) özel dikkat göster. "
-        risk_faktoru = "Kadınlarda özellikle dikkat edilmesi gereken konular: meme kanseri taraması, rahim ağzı kanseri, kemik sağlığı (osteoporoz), tiroid sorunları. "
-        hitap_stili = "nazik, empatik ve anlayışlı"
-    elif gender == "male":
-        hitap_tonu = "Sayın" if age >= 18 else "Sevgili"
-        hitap_ozel = "Erkek sağlığı konularında (prostat sağlığı, testosteron seviyeleri, kalp sağlığı vb.) özel dikkat göster. "
-        risk_faktoru = "Erkeklerde özellikle dikkat edilmesi gereken konular: prostat sağlığı, kalp-damar hastalıkları, testis kanseri, karaciğer sağlığı. "
-        hitap_stili = "nazik, empatik ve doğrudan"
-    else:  # other
-        hitap_tonu = "Sayın" if age >= 18 else "Sevgili"
-        hitap_ozel = "Sağlık konularında kapsayıcı ve hassas bir yaklaşım benimse. "
-        risk_faktoru = "Genel sağlık taramaları ve önleyici bakım konularında bilgilendir. "
-        hitap_stili = "kapsayıcı, empatik ve saygılı"
-
-    # Yaş grubuna göre ek yönlendirme
-    if age < 18:
-        yas_notu = "Genç/çocuk sağlığı konularında yaş grubuna uygun, anlaşılır dil kullan. "
-        yas_ozel = "Büyüme-gelişme, aşı takvimi, ergenlik dönemi sağlığı gibi konularda bilgilendir. "
-    elif age >= 50:
-        yas_notu = "Orta-ileri yaş grubuna özel sağlık konularını (kronik hastalıklar, taramalar, yaşam tarzı) vurgula. "
-        yas_ozel = "Düzenli sağlık kontrolleri, kanser taramaları, kalp sağlığı, diyabet riski gibi konularda öneriler sun. "
-    else:
-        yas_notu = "Genç erişkin sağlığı konularında (yaşam tarzı, önleyici bakım, mental sağlık) odaklan. "
-        yas_ozel = "Sağlıklı yaşam alışkanlıkları, düzenli egzersiz, beslenme, stres yönetimi konularında rehberlik et. "
-
-    return (
-        f"Rolün: Deneyimli ve empatik bir sağlık asistanısın. Danışanın adı {name}, {age} yaşında. "
-        f"Hitap: {hitap_tonu} {name} şeklinde hitap et; hitap tonunu {hitap_stili} tut. "
-        f"\n\n"
-        f"Kişiselleştirme: "
-        f"{hitap_ozel}"
-        f"{risk_faktoru}"
-        f"{yas_notu}"
-        f"{yas_ozel}"
-        f"\n\n"
-        f"Amaç: Sağlıkla ilgili sorulara nazik, sade ve {name}'in yaşına ({age}) uygun yanıtlar vermek; "
-        f"genel, güvenli ve uygulanabilir öneriler sunmak. "
-        f"\n\n"
-        f"Sınırlar: "
-        f"- Kesin tanı/ilaç/tedavi yazma; riskli veya acil belirtilerde profesyonel yardıma yönlendir. "
-        f"- Tıbbi jargondan kaçın, anlaşılır dil kullan. "
-        f"- {name}'in yaşı ({age}) ve cinsiyet ({gender}) bilgisini cevaplarında dikkate al. "
-        f"\n\n"
-        f"Sunum: "
-        f"- Kısa paragraflar; gerektiğinde madde işaretleri. "
-        f"- {name} ismini gerektiğinde kullan; sakin ve empatik bir ton benimse; paniğe sevk etme. "
-        f"- Gerektiğinde kullanıcıya sorularla netleştirme yap; belirsizliği dürüstçe belirt. "
-        f"\n\n"
-        f"Acil uyarılar: Hayati risk içeren belirtilerde (göğüs ağrısı, nefes darlığı, bilinç kaybı, şiddetli kanama vb.) "
-        f"hemen 112'yi veya en yakın acil servise gitmesini öner. "
-        f"\n\n"
-        f"Cinsiyet ve yaş özel bilgiler: "
-        f"{name} için cinsiyet ({gender}) ve yaş ({age}) bilgisini kullanarak "
-        f"uygun sağlık önerileri, risk faktörleri ve dikkat edilmesi gereken konuları belirt."
-    )
+    emergency: bool = False  # Mesajda acil belirti bulundu; yanıt 112 uyarısıyla başlar
+    degraded: bool = False   # Sağlayıcıya ulaşılamadı: önbellekten/yedek yanıt, tur hafızaya yazılmadı
 
 
 # Yardımcı endpoint'ler
@@ -192,7 +503,7 @@ def root():
     """Ana sayfa: kısa yönlendirme mesajı"""
     return {
         "status": "ok",
-        "message": "Doktor Asistanı API. Belgeler için /docs, sağlık kontrolü için /health, sohbet için /chat",
+        "message": "Doktor Asistanı API. Belgeler için /docs, sağlık kontrolü için /health, sohbet için /chat (akış: /chat/stream, WebSocket: /chat/ws)",
     }
 
 
@@ -202,21 +513,573 @@ def health():
     return {"ok": True}
 
 
-# Hafıza budama: Sistem mesajını koruyarak toplam mesaj sayısını sınırla
-def trim_memory(memory: ConversationBufferMemory) -> None:
-    msgs = memory.chat_memory.messages
-    if len(msgs) > MAX_MEMORY_MESSAGES:
-        if getattr(msgs[0], "type", "") == "system":
-            system_part = msgs[0:1]
-            rest = msgs[1:]
-            memory.chat_memory.messages = system_part + rest[-(MAX_MEMORY_MESSAGES - 1):]
-        else:
-            memory.chat_memory.messages = msgs[-MAX_MEMORY_MESSAGES:]
+if METRICS_ENABLED:
+    @app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+    def prometheus_metrics():
+        """Prometheus kazıma endpoint'i (metin formatı 0.0.4)"""
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/admin/traces", include_in_schema=False)
+def admin_traces(
+    limit: int = Query(default=20, ge=1, le=1000),
+    format: str = Query(default="json", pattern="^(json|collapsed)$"),
+    admin_token: Optional[str] = Header(default=None, alias="X-Admin-Token"),
+):
+    """Son profillenen istekler: JSON span'ler veya flamegraph için collapsed stack"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Yetkisiz.")
+    traces = profiler.recent(limit)
+    if format == "collapsed":
+        return PlainTextResponse("\n".join(line for t in traces for line in t.collapsed()) + "\n")
+    return {"sampled": profiler.sampled, "sample_rate": profiler.sample_rate,
+            "traces": [t.to_json() for t in traces]}
+
+
+@app.get("/session/stats")
+def session_stats(name: str, session_id: str):
+    """Oturumun boyut bilgisi: mesaj sayısı, tahmini token ve bellek (içerik döndürmez)"""
+    key = session_key_for(name, session_id)
+    session = user_to_memory.get(key) if key else None
+    if session is None:
+        raise HTTPException(status_code=404, detail="Oturum bulunamadı.")
+    return {
+        "messages": len(session.memory.chat_memory.messages),
+        "tokens": session.tokens.total,
+        "token_budget": MAX_MEMORY_TOKENS,
+        "approx_bytes": session.approx_bytes,
+    }
+
+
+# Hafıza budama: Sistem mesajını koruyarak token bütçesine (ve mesaj sınırına) sığdır
+def trim_memory(session: Session) -> None:
+    with Timed(MEMORY_TRIM.labels()), span("trim_memory"):
+        dropped = session.tokens.trim(session.memory, MAX_MEMORY_TOKENS, MAX_MEMORY_MESSAGES)
+    if dropped and MEMORY_MODE == "summary":
+        # Atılan turlar kaybolmasın: yanıt döndükten sonra özete katlanacak
+        session.pending_summary.extend(dropped)
+
+
+# Kayan özet: atılan turları LLM ile kısa bir klinik özete katla (istek yolunun dışında)
+async def summarize_session(session: Session, user_session_key: Optional[str] = None) -> None:
+    if session.summarizing or not session.pending_summary:
+        return
+    session.summarizing = True
+    try:
+        while session.pending_summary:
+            evicted, session.pending_summary = session.pending_summary, []
+            previous = get_summary(session.memory.chat_memory.messages)
+            try:
+                with timed_llm("summary"), span("summary_llm"):
+                    prompt = build_summary_prompt(previous, evicted)
+                    result = await upstream.call(lambda: runner.llm.ainvoke(prompt))
+            except Exception as exc:
+                # Bir sonraki turda tekrar denenecek; bekleyen liste sınırlı kalır
+                logger.warning("summary failed: %s", exc)
+                session.pending_summary = (evicted + session.pending_summary)[-SUMMARY_MAX_PENDING:]
+                return
+            session.tokens.set_summary(session.memory, clip_summary(message_text(result)))
+            if user_session_key:
+                user_to_memory.update_size(user_session_key)
+    finally:
+        session.summarizing = False
+
+
+# Oturum açma: hafızayı getir/oluştur, ilk mesajda sistem talimatını ekle
+def open_session(req: ChatRequest) -> Tuple[Optional[str], str, Session]:
+    """
+    İsteğe ait oturumu döndürür: (depo anahtarı, log için oturum etiketi, oturum).
+    session_id yoksa anahtar None olur ve oturum depoya yazılmaz (tek seferlik).
+    """
+    user_session_key = session_key_for(req.name, req.session_id)
+    if user_session_key:
+        sess = req.session_id.strip()
+        with Timed(MEMORY_LOOKUP.labels()), span("memory_lookup"):
+            session = user_to_memory.get_or_create(
+                user_session_key, lambda: ConversationBufferMemory(return_messages=True)
+            )
+    else:
+        # session_id yoksa anahtar bir daha kullanılamaz: hafızayı depoya yazma
+        sess = uuid.uuid4().hex[:8]  # sadece loglarda ayırt etmek için
+        session = Session(memory=ConversationBufferMemory(return_messages=True))
+
+    # İlk mesajda sistem talimatını ekle (kişiselleştirilmiş kurallar; profil gövdesi paylaşılır)
+    memory = session.memory
+    if len(memory.chat_memory.messages) == 0:
+        with span("system_instruction"):
+            memory.chat_memory.add_message(build_system_message(req.name, req.age, req.gender))
+    return user_session_key, sess, session
+
+
+# Oturum kilidi: aynı oturumdaki istekleri sıraya sok; kuyruk doluysa hızlıca 409 dön
+# (acil istekler reddedilmez)
+def reserve_session(user_session_key: Optional[str], urgent: bool = False):
+    if not user_session_key:
+        return nullcontext()  # tek seferlik oturum: paylaşılan hafıza yok, kilide gerek yok
+    try:
+        return session_locks.reserve(user_session_key, priority=urgent)
+    except SessionBusyError:
+        raise HTTPException(
+            status_code=409,
+            detail="Bu oturumda önceki mesaj hâlâ işleniyor. Lütfen yanıtı bekleyin.",
+        )
+
+
+def cancel_reservation(reservation) -> None:
+    """Akışta hiç girilmeyen oturum ayrımını bırakır (tek seferlik oturumun ayrımı yoktur)"""
+    cancel = getattr(reservation, "cancel", None)
+    if cancel is not None:
+        cancel()
+
+
+def request_scope(req: ChatRequest) -> str:
+    """Kullanıcı/oturum kapsamı: hız sınırı ve idempotency anahtarları bu kapsamda tutulur"""
+    return session_key_for(req.name, req.session_id) or req.name.strip().lower()
+
+
+# Yük kontrolü: önce oturumun hız sınırı, sonra global yuva (gerekirse kuyrukta bekler).
+# Aşımda iş yapılmadan hızlıca 429/503 + Retry-After döner (istemci geri çekilir).
+# Acil istek (urgent) hız sınırına takılmaz, öncelikli bekler ve reddedilmez: yuva alınamazsa
+# (veya LLM takibi kapalıysa) None döner ve yalnızca hazır uyarı verilir
+async def admit(req: ChatRequest, urgent: bool = False) -> Optional[Slot]:
+    if urgent and not EMERGENCY_LLM_FOLLOWUP:
+        return None
+    try:
+        if not urgent:
+            rate_limiter.check(request_scope(req))
+        with span("admission_wait"):
+            return await chat_limiter.acquire(priority=urgent)
+    except RateLimitedError as exc:
+        raise HTTPException(
+            status_code=429,
+            detail="Çok sık mesaj gönderiyorsunuz. Lütfen biraz bekleyip tekrar deneyin.",
+            headers={"Retry-After": str(exc.retry_after)},
+        )
+    except OverloadedError as exc:
+        if urgent:
+            return None
+        logger.warning(
+            "chat rejected reason=%s in_flight=%s queued=%s",
+            exc.reason, chat_limiter.in_flight, chat_limiter.queued,
+        )
+        raise HTTPException(
+            status_code=503,
+            detail="Sunucu şu anda yoğun. Lütfen biraz sonra tekrar deneyin.",
+            headers={"Retry-After": str(exc.retry_after)},
+        )
+
+
+def release_slots(slots: List[Slot]) -> None:
+    for slot in slots:
+        slot.release()
+
+
+def check_emergency(req: ChatRequest) -> Optional[str]:
+    """Mesajda acil belirti varsa hazır 112 uyarısı, yoksa None (tek geçişli tarama, µs mertebesi)"""
+    if not EMERGENCY_FAST_PATH:
+        return None
+    with span("emergency_match"):
+        categories = detect_emergency(req.message)
+    if not categories:
+        return None
+    for category in categories:
+        EMERGENCIES.labels(category).inc()
+    return emergency_advice(categories)
+
+
+# Tur geri alma: hafızaya yalnızca tur tamamlanınca yazılır; yarıda kalan turda (iptal, süre
+# aşımı, hata) geriye yalnızca bu turda açılan boş oturum kalır, o da silinir
+def rollback_turn(user_session_key: Optional[str], fresh: bool) -> None:
+    if fresh and user_session_key:
+        user_to_memory.delete(user_session_key)
+
+
+# Tur kapanışı: hafızayı sınırla, depo muhasebesini güncelle, meta bilgiyi logla
+def finish_turn(req: ChatRequest, user_session_key: Optional[str], sess: str,
+                session: Session, source: str = "llm", answered: Sequence[str] = ()) -> None:
+    # Hafızayı sınırla (RAM ve maliyet kontrolü), sistem mesajını koru
+    trim_memory(session)
+    if user_session_key:
+        with span("session_accounting"):
+            user_to_memory.update_size(user_session_key)
+        SESSION_SIZE.observe(session.approx_bytes)
+    REPLIES.labels(source).inc()
+
+    # Sade log: kişisel içerik yok, sadece meta bilgiler. model: yanıtı üreten model
+    # (önbellek/paylaşılan yanıtta "-"); answered, yönlendirmenin kaydettiği rotadır
+    logger.info(
+        "chat user=%s age=%s gender=%s session=%s model=%s tokens=%s source=%s",
+        req.name, req.age, req.gender, sess, answering_model(source, answered),
+        session.tokens.total, source
+    )
+
+
+def answering_model(source: str, answered: Sequence[str]) -> str:
+    if source != "llm":
+        return "-"
+    # Rota kaydı yoksa (acil takip) hızlı model yanıtlamıştır
+    return ROUTE_MODELS[answered[-1] if answered else "fast"]
+
+
+# İlk tur önbellek anahtarı: yalnızca geçmişi boş (sadece sistem mesajı olan) turlar için
+def first_turn_cache_key(req: ChatRequest, history: list) -> Optional[Tuple[str, str, str]]:
+    if not RESPONSE_CACHE_ENABLED or len(history) != 1:
+        return None
+    norm = normalize_text(req.message)
+    if RESPONSE_CACHE_SCOPE == "chips" and norm not in CHIP_PROMPT_KEYS:
+        return None
+    gender, bucket = profile_key(req.age, req.gender)
+    return (norm, gender, bucket)
+
+
+def semantic_cache_eligible(req: ChatRequest, history: list) -> bool:
+    return SEMANTIC_CACHE_ENABLED and len(history) == 1 and len(req.message) <= SEMANTIC_CACHE_MAX_CHARS
+
+
+def store_first_turn(cache_key: Tuple[str, str, str], reply: str, name: str, age: int) -> None:
+    """Yanıtı isim/yaş yer tutuculu şablon olarak önbelleğe yazar"""
+    template = to_template(reply, name, age)
+    if template:
+        response_cache.set(cache_key, template)
+
+
+def lookup_cached_reply(req: ChatRequest, history: list) -> Optional[Tuple[str, str]]:
+    """İlk turda önce birebir, sonra anlamsal önbelleğe bakar: (yanıt, kaynak) veya None"""
+    cache_key = first_turn_cache_key(req, history)
+    if cache_key:
+        template = response_cache.get(cache_key)
+        if template is not None:
+            return render_template(template, req.name, req.age), "cache"
+    if semantic_cache_eligible(req, history):
+        found = semantic_cache.lookup(profile_key(req.age, req.gender), req.message)
+        if found is not None:
+            return render_template(found[0], req.name, req.age), "semantic_cache"
+    return None
+
+
+def remember_reply(req: ChatRequest, history: list, reply: str) -> None:
+    """LLM'den gelen ilk tur yanıtını uygun önbelleklere şablon olarak yazar"""
+    cache_key = first_turn_cache_key(req, history)
+    if cache_key:
+        store_first_turn(cache_key, reply, req.name, req.age)
+    if semantic_cache_eligible(req, history):
+        template = to_template(reply, req.name, req.age)
+        if template:
+            semantic_cache.add(profile_key(req.age, req.gender), req.message, template)
+
+
+LLMCall = Callable[[], Awaitable[Tuple[str, str, int]]]
+
+
+def make_llm_call(req: ChatRequest, history: list, answered: List[str]) -> LLMCall:
+    """LLM çağrısı: yanıtı önbelleklere yazar, (yanıt, sahibinin adı, yaşı) döndürür"""
+    async def call_llm() -> Tuple[str, str, int]:
+        with timed_llm("chat"), span("llm"):
+            reply = await routed_reply(req, history, answered)
+        remember_reply(req, history, reply)
+        return reply, req.name, req.age
+    return call_llm
+
+
+# Model yönlendirme: tur başına rota seçimi, güçlü modelde zaman aşımı/arıza → hızlı model
+def choose_route(req: ChatRequest, history: list) -> str:
+    if "strong" not in ROUTE_TARGETS:
+        return "fast"
+    with span("route"):
+        decision = model_router.choose(req.message, history)
+    ROUTE_DECISIONS.labels(*decision).inc()
+    annotate(route=decision.route, route_reason=decision.reason)
+    return decision.route
+
+
+def strong_fallback(exc: BaseException) -> bool:
+    """Güçlü modelin hatası hızlı modele düşülerek kapatılabilir mi (zaman aşımı / erişilemez)"""
+    if isinstance(exc, TimeoutError) or upstream_unavailable(exc):
+        ROUTE_FALLBACKS.labels(type(exc).__name__).inc()
+        logger.warning("strong model unavailable (%s): falling back to fast model", type(exc).__name__)
+        return True
+    return False
+
+
+def record_route(route: str, history: list, message: str, reply: str, seconds: float) -> None:
+    """Rotanın süresini ve tahmini token/maliyetini kaydeder (tokenizer sezgisel tahmindir)"""
+    _ROUTE_CALLS[route].observe(seconds)
+    prompt = sum(message_tokens(m, _tokenizer) for m in history) + _tokenizer(message)
+    completion = _tokenizer(reply)
+    ROUTE_TOKENS.labels(route, "prompt").inc(prompt)
+    ROUTE_TOKENS.labels(route, "completion").inc(completion)
+    ROUTE_COST.labels(route).inc((prompt + completion) * ROUTE_COST_PER_TOKEN[route])
+
+
+async def call_route(route: str, req: ChatRequest, history: list, timeout: float = 0) -> str:
+    target, guard = ROUTE_TARGETS[route]
+    start = time.perf_counter()
+    async with asyncio.timeout(timeout or None):
+        reply = await guard.call(lambda: target.arun(history, req.message))
+    record_route(route, history, req.message, reply, time.perf_counter() - start)
+    return reply
+
+
+async def routed_reply(req: ChatRequest, history: list, answered: List[str]) -> str:
+    """Yönlendirilmiş yanıt; yanıtı üreten rota answered'a eklenir (log için)"""
+    if choose_route(req, history) == "strong":
+        try:
+            reply = await call_route("strong", req, history, ROUTE_STRONG_TIMEOUT_SECONDS)
+            answered.append("strong")
+            return reply
+        except Exception as exc:
+            if not strong_fallback(exc):
+                raise
+    reply = await call_route("fast", req, history)
+    answered.append("fast")
+    return reply
+
+
+async def stream_route(route: str, req: ChatRequest, history: list,
+                       first_chunk_timeout: float = 0) -> AsyncIterator[str]:
+    """Rotanın akışı; first_chunk_timeout yalnızca ilk parçanın beklenmesine uygulanır"""
+    target, guard = ROUTE_TARGETS[route]
+    chunks = guard.stream(lambda: target.astream(history, req.message))
+    try:
+        if first_chunk_timeout:
+            async with asyncio.timeout(first_chunk_timeout):
+                try:
+                    first = await chunks.__anext__()
+                except StopAsyncIteration:
+                    return
+            yield first
+        async for text in chunks:
+            yield text
+    finally:
+        await chunks.aclose()
+
+
+async def routed_stream(req: ChatRequest, history: list, answered: List[str]) -> AsyncIterator[str]:
+    """Akışlı rota: güçlü model ilk parçayı süresinde veremezse akış hızlı modelle başlar"""
+    parts: List[str] = []
+    start = time.perf_counter()
+    if choose_route(req, history) == "strong":
+        try:
+            async for text in stream_route("strong", req, history, ROUTE_STRONG_TIMEOUT_SECONDS):
+                parts.append(text)
+                yield text
+            record_route("strong", history, req.message, "".join(parts), time.perf_counter() - start)
+            answered.append("strong")
+            return
+        except Exception as exc:
+            if parts or not strong_fallback(exc):
+                raise
+        start = time.perf_counter()
+    async for text in stream_route("fast", req, history):
+        parts.append(text)
+        yield text
+    record_route("fast", history, req.message, "".join(parts), time.perf_counter() - start)
+    answered.append("fast")
+
+
+# Yanıt üretimi: önce ilk tur önbellekleri, yoksa LLM (özdeş eşzamanlı istekler birleşir).
+# Sağlayıcıya ulaşılamazsa yedek yanıt döner. (yanıt, kaynak) döner
+async def generate_reply(req: ChatRequest, history: list, answered: List[str]) -> Tuple[str, str]:
+    with span("cache_lookup"):
+        cached = lookup_cached_reply(req, history)
+    if cached is not None:
+        return cached
+
+    call_llm = make_llm_call(req, history, answered)
+    flight_key = first_turn_cache_key(req, history)
+    try:
+        if flight_key is None:
+            return (await call_llm())[0], "llm"
+        return await join_flight(req, flight_key, call_llm)
+    except Exception as exc:
+        if not upstream_unavailable(exc):
+            raise
+        return degraded_reply(req, history, exc)
+
+
+# Sağlayıcı erişilemez: devre açık veya geçici hata denemelere rağmen sürüyor
+DEGRADED_SOURCES = frozenset({"stale_cache", "degraded"})
+DEGRADED_REPLY = (
+    "Şu anda yanıt üretme servisine ulaşılamıyor; lütfen birkaç dakika sonra tekrar deneyin. "
+    "Belirtileriniz ağırlaşırsa veya acil bir durum olduğunu düşünüyorsanız 112'yi arayın."
+)
+
+
+def upstream_unavailable(exc: BaseException) -> bool:
+    return isinstance(exc, CircuitOpenError) or is_retryable(exc)
+
+
+def degraded_reply(req: ChatRequest, history: list, exc: BaseException) -> Tuple[str, str]:
+    """Sağlayıcı yokken: ilk turda süresi dolmuş olsa da önbellekteki yanıt, yoksa yedek metin"""
+    logger.warning("upstream unavailable (%s): serving degraded reply", type(exc).__name__)
+    cache_key = first_turn_cache_key(req, history)
+    if cache_key:
+        template = response_cache.get(cache_key, allow_stale=True)
+        if template is not None:
+            return render_template(template, req.name, req.age), "stale_cache"
+    return DEGRADED_REPLY, "degraded"
+
+
+async def join_flight(req: ChatRequest, flight_key: Tuple[str, str, str],
+                      call_llm: LLMCall) -> Tuple[str, str]:
+    """Aynı anahtarlı uçuş varsa onun sonucunu paylaş, yoksa uçuşu başlat"""
+    (reply, owner_name, owner_age), shared = await inflight.do(flight_key, call_llm)
+    if not shared:
+        return reply, "llm"
+    # Paylaşılan yanıt ilk isteği yapanın adını içerir: kendi adımızla yeniden oluştur
+    template = to_template(reply, owner_name, owner_age)
+    if template is None:
+        return (await call_llm())[0], "llm"
+    return render_template(template, req.name, req.age), "coalesced"
+
+
+async def emergency_reply(req: ChatRequest, history: list, advice: str,
+                          slot: Optional[Slot], deadline: Optional[float] = None) -> Tuple[str, str]:
+    """
+    Acil tur: hazır uyarı + (yuva alındıysa) LLM yanıtı. Önbellekler atlanır ve yazılmaz;
+    LLM başarısız olursa veya son tarih dolarsa yalnızca uyarı döner (acil kullanıcı hata görmez).
+    """
+    if slot is None:
+        return advice, "emergency"
+    try:
+        with timed_llm("chat"), span("llm"):
+            async with asyncio.timeout_at(deadline):
+                reply = await upstream.call(lambda: runner.arun(history, req.message))
+    except Exception as exc:
+        logger.warning("emergency follow-up failed: %s", exc)
+        return advice, "emergency"
+    return f"{advice}\n\n{reply}", "llm"
+
+
+async def prewarm_response_cache() -> None:
+    """Çip soruları × 9 profil için ilk tur yanıtlarını sırayla üretip önbelleğe koyar"""
+    warmed = 0
+    for prompt in CHIP_PROMPTS:
+        for gender in GENDERS:
+            for bucket, age in PREWARM_AGES.items():
+                cache_key = (normalize_text(prompt), gender, bucket)
+                if cache_key in response_cache:
+                    continue
+                history = [build_system_message(PREWARM_NAME, age, gender)]
+                try:
+                    reply = await upstream.call(lambda: runner.arun(history, prompt))
+                except Exception as exc:
+                    logger.warning("cache prewarm failed: %s", exc)
+                    continue
+                store_first_turn(cache_key, reply, PREWARM_NAME, age)
+                warmed += 1
+    logger.info("cache prewarm done entries=%s", warmed)
+
+
+# Tek bir sohbet turu: global yuva + oturum kilidi altında hafıza → LLM → hafıza.
+# deadline (event loop zamanı) dolarsa bekleme/LLM çağrısı iptal edilir, tur geri alınır: 504
+async def run_chat_turn(req: ChatRequest, background_tasks: BackgroundTasks,
+                        deadline: Optional[float] = None) -> ChatResponse:
+    advice = check_emergency(req)
+    # Acil turda son tarih yalnızca LLM takibine uygulanır: uyarı her durumda döner
+    limit = asyncio.timeout_at(deadline if advice is None else None)
+    try:
+        async with limit:
+            return await chat_turn(req, background_tasks, advice, deadline)
+    except TimeoutError:
+        if not limit.expired():
+            raise
+        CHAT_ABORTED.labels("deadline").inc()
+        raise HTTPException(
+            status_code=504,
+            detail="Yanıt istenen süre içinde hazırlanamadı. Lütfen tekrar deneyin.",
+        )
+
+
+async def chat_turn(req: ChatRequest, background_tasks: BackgroundTasks, advice: Optional[str],
+                    deadline: Optional[float]) -> ChatResponse:
+    slot = await admit(req, urgent=advice is not None)
+    with slot or nullcontext():
+        reservation = reserve_session(session_key_for(req.name, req.session_id), urgent=advice is not None)
+        async with reservation:
+            user_session_key, sess, session = open_session(req)
+
+            # LLM + hafıza ile sohbet (async: bekleme sırasında event loop diğer istekleri işler)
+            history = list(session.memory.chat_memory.messages)
+            answered: List[str] = []  # yanıtı üreten rota (log)
+            try:
+                if advice is None:
+                    reply, source = await generate_reply(req, history, answered)
+                else:
+                    reply, source = await emergency_reply(req, history, advice, slot, deadline)
+            except BaseException:
+                rollback_turn(user_session_key, fresh=len(history) == 1)
+                raise
+            if source in DEGRADED_SOURCES:
+                # Yedek yanıt sohbetin parçası değildir: tur hafızaya yazılmaz
+                rollback_turn(user_session_key, fresh=len(history) == 1)
+                REPLIES.labels(source).inc()
+                return ChatResponse(response=reply, degraded=True)
+            with span("save_context"):
+                session.memory.save_context({"input": req.message}, {"response": reply})
+
+            finish_turn(req, user_session_key, sess, session, source, answered)
+    if session.pending_summary:
+        background_tasks.add_task(summarize_session, session, user_session_key)
+    return ChatResponse(response=reply, emergency=advice is not None)
+
+
+def client_deadline(req: ChatRequest, header_timeout: Optional[float]) -> Optional[float]:
+    """İstemcinin son tarihi (event loop zamanı): başlık, alan veya sunucu varsayılanı; yoksa None"""
+    timeout = header_timeout or req.timeout_seconds or CHAT_DEFAULT_TIMEOUT_SECONDS
+    if not timeout or timeout <= 0:
+        return None
+    return asyncio.get_running_loop().time() + timeout
+
+
+async def wait_for_disconnect(request: Request) -> None:
+    """Gövde okunduktan sonra ASGI'den gelecek mesaj yalnızca http.disconnect'tir: onu bekler"""
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+
+T = TypeVar("T")
+
+
+async def cancel_on_disconnect(request: Request, work: Awaitable[T]) -> T:
+    """
+    İşi yürütürken bağlantıyı izler. İstemci ayrılırsa iş (kuyruk bekleme, LLM çağrısı) iptal
+    edilir, geri alma bitene kadar beklenir ve 499 fırlatılır: terk edilen istek kapasite tutmaz.
+    """
+    task = asyncio.ensure_future(work)
+    watcher = asyncio.ensure_future(wait_for_disconnect(request))
+    disconnected = False
+    try:
+        await asyncio.wait((task, watcher), return_when=asyncio.FIRST_COMPLETED)
+        disconnected = not task.done()
+    finally:
+        watcher.cancel()
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+    if disconnected:
+        CHAT_ABORTED.labels("disconnect").inc()
+        raise HTTPException(status_code=499, detail="İstemci bağlantıyı kapattı.")
+    return task.result()
+
+
+def request_fingerprint(req: ChatRequest) -> str:
+    """Aynı idempotency anahtarıyla gelen isteğin içeriği değişmiş mi kontrolü için"""
+    return f"{req.age}|{req.gender}|{req.message}"
 
 
 # Ana endpoint: POST /chat
 @app.post("/chat", response_model=ChatResponse)
-async def chat_with_doctor(req: ChatRequest) -> ChatResponse:
+async def chat_with_doctor(
+    req: ChatRequest,
+    background_tasks: BackgroundTasks,
+    response: Response,
+    request: Request,
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
+    request_timeout: Optional[float] = Header(default=None, alias="X-Request-Timeout"),
+) -> ChatResponse:
     """
     Kullanıcı mesajını alır, LLM ile yanıt üretir ve döner.
 
@@ -224,45 +1087,511 @@ async def chat_with_doctor(req: ChatRequest) -> ChatResponse:
     1) Kullanıcı+session hafızasını getir/yoksa oluştur
     2) İlk mesajda sistem talimatını (cinsiyet/yaş özel) hafızaya ekle
     3) Mesaj + hafıza → LLM; yanıt üret
-    4) Yanıtı döndür ve hafızayı sınırla
+    4) Yanıtı döndür ve hafızayı sınırla (özet modunda atılan turlar arka planda özetlenir)
+
+    Aynı oturuma eşzamanlı gelen istekler sırayla işlenir (çift tıklama, istemci tekrarı).
+    Sunucu doluysa istek kısa süre kuyrukta bekler; kuyruk dolu/süre aşıldıysa 503,
+    oturumun hız sınırı aşıldıysa 429 döner (ikisinde de Retry-After başlığı vardır).
+    Mesajda acil belirti varsa yanıt hazır 112 uyarısıyla başlar (emergency=true); bu istekler
+    kuyrukta önceliklidir ve yük nedeniyle reddedilmez (en kötü durumda yalnızca uyarı döner).
+    Idempotency anahtarı verilirse, süre içindeki tekrar saklanan yanıtı alır (veya süren
+    çağrıya bağlanır); LLM yeniden çağrılmaz, mesaj hafızaya iki kez yazılmaz.
+
+    İstemci son tarih verebilir (X-Request-Timeout başlığı veya timeout_seconds, saniye): süre
+    dolunca bekleme/LLM çağrısı iptal edilir, tur hafızaya yazılmaz ve 504 döner. İstemci
+    bağlantıyı keserse de iş iptal edilir; yalnızca idempotency anahtarlı istekte iş, tekrar
+    denemenin bağlanabilmesi için (son tarihe kadar) sürer.
+
+    Geçici sağlayıcı hataları kısa geri çekilmeyle yeniden denenir. Sağlayıcı erişilemezse
+    (devre açık) önbellekteki yanıt veya kısa bir yedek metin döner (degraded=true); bu tur
+    hafızaya yazılmaz.
     """
+    mark("parse_validate")  # profil açıksa: gövde ayrıştırma + pydantic doğrulama süresi
+    key = (idempotency_key or req.idempotency_key or "").strip()
+    deadline = client_deadline(req, request_timeout)
     try:
-        # Hafıza anahtarı: name + session_id; yoksa UUID ile çakışmayı önle
-        base_key = req.name.strip().lower()
-        sess = (req.session_id or "").strip()
-        if not sess:
-            sess = uuid.uuid4().hex[:8]  # kısa ve yeterince benzersiz
-        user_session_key = f"{base_key}:{sess}"
-
-        if user_session_key not in user_to_memory:
-            user_to_memory[user_session_key] = ConversationBufferMemory(return_messages=True)
-        memory = user_to_memory[user_session_key]
-
-        # İlk mesajda sistem talimatını ekle (kişiselleştirilmiş kurallar)
-        if len(memory.chat_memory.messages) == 0:
-            sys_msg = build_system_instruction(req.name, req.age, req.gender)
-            memory.chat_memory.add_message(SystemMessage(content=sys_msg))
-
-        # LLM + hafıza ile sohbet
-        conversation = ConversationChain(llm=llm, memory=memory, verbose=False)
-        reply = conversation.predict(input=req.message)
-
-        # Hafızayı sınırla (RAM ve maliyet kontrolü), sistem mesajını koru
-        trim_memory(memory)
-
-        # Sade log: kişisel içerik yok, sadece meta bilgiler
-        logger.info(
-            "chat user=%s age=%s gender=%s session=%s model=%s",
-            req.name, req.age, req.gender, sess, LLM_MODEL
+        with Timed(REQUEST_LATENCY.labels("/chat"), REQUESTS_IN_FLIGHT.labels("/chat")):
+            return await cancel_on_disconnect(
+                request, handle_chat(req, background_tasks, response, key, deadline)
+            )
+    except HTTPException:
+        raise
+    except IdempotencyConflictError:
+        raise HTTPException(
+            status_code=422,
+            detail="Bu Idempotency-Key farklı içerikli bir istek için kullanılmış.",
         )
-
-        return ChatResponse(response=reply)
     except Exception as exc:
         logger.exception("chat failed: %s", exc)
         raise HTTPException(status_code=500, detail="Beklenmeyen bir hata oluştu. Lütfen daha sonra tekrar deneyin.")
 
 
+async def handle_chat(req: ChatRequest, background_tasks: BackgroundTasks, response: Response,
+                      key: str, deadline: Optional[float] = None) -> ChatResponse:
+    """Idempotency anahtarı varsa tekrarları saklanan sonuca bağlar, yoksa turu doğrudan işler"""
+    if not key:
+        return await run_chat_turn(req, background_tasks, deadline)
+    # Anahtar kullanıcı/oturum kapsamındadır: farklı kullanıcıların anahtarları çakışmaz
+    scoped_key = (request_scope(req), key)
+    result, replayed = await idempotency_store.run(
+        scoped_key, request_fingerprint(req),
+        lambda: run_chat_turn(req, background_tasks, deadline),
+    )
+    if result.degraded:
+        # Yedek yanıt saklanmaz: sağlayıcı düzelince tekrar deneme gerçek yanıtı alır
+        idempotency_store.discard(scoped_key)
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+
+def past_deadline(deadline: Optional[float]) -> bool:
+    return deadline is not None and asyncio.get_running_loop().time() >= deadline
+
+
+async def stream_until(chunks: AsyncIterator[str], deadline: Optional[float]) -> AsyncIterator[str]:
+    """
+    Parçaları son tarihe kadar aktarır; süre dolunca TimeoutError (üretici kapatılır).
+    Süre sınırı her parça beklemesine ayrı uygulanır: yield'ler süre bağlamının dışında kalır.
+    """
+    try:
+        while True:
+            async with asyncio.timeout_at(deadline):
+                try:
+                    text = await chunks.__anext__()
+                except StopAsyncIteration:
+                    return
+            yield text
+    finally:
+        await chunks.aclose()
+
+
+# SSE yardımcı: tek bir Server-Sent Events olayını metne çevir
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    payload = json.dumps(data, ensure_ascii=False)
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {payload}\n\n"
+
+
+# Akışlı tur hazırlığı: yuva ve oturum sırası akış başlamadan alınır (dolu/meşgulse HTTPException).
+# Acil istekte yuva akış içinde alınır: uyarı hiçbir beklemeye takılmaz
+async def begin_stream_turn(req: ChatRequest, advice: Optional[str], deadline: Optional[float]):
+    held: List[Slot] = []  # akış boyunca tutulan yuva
+    if advice is None:
+        try:
+            async with asyncio.timeout_at(deadline):
+                held.append(await admit(req))
+        except TimeoutError:
+            CHAT_ABORTED.labels("deadline").inc()
+            raise HTTPException(
+                status_code=504,
+                detail="Yanıt istenen süre içinde hazırlanamadı. Lütfen tekrar deneyin.",
+            )
+    try:
+        reservation = reserve_session(session_key_for(req.name, req.session_id), urgent=advice is not None)
+    except HTTPException:
+        release_slots(held)
+        raise
+    return held, reservation
+
+
+async def stream_turn(req: ChatRequest, advice: Optional[str], reservation, held: List[Slot],
+                      opened: list, deadline: Optional[float]) -> AsyncIterator[Tuple[Optional[str], dict]]:
+    """
+    Akışlı turun olayları: (olay adı, veri). Olay adı None → metin parçası ({"delta": ...}),
+    "done" → tam yanıt, "error" → hata (tur hafızaya yazılmaz). SSE ve WebSocket aynı turu kullanır.
+    Acil istekte alınan yuva held'e, açılan oturum (arka plan özeti için) opened'a eklenir.
+    """
+    parts = []
+    source = "llm"
+    if advice is not None:
+        # Acil: uyarı kuyruk, kilit ve LLM beklenmeden gider
+        parts.append(advice)
+        yield None, {"delta": advice}
+    async with reservation:
+        user_session_key, fresh = None, False
+        try:
+            user_session_key, sess, session = open_session(req)
+            opened.append((session, user_session_key))
+            # Geçmişin o anki görüntüsü: prompt bu listeden kurulur
+            history = list(session.memory.chat_memory.messages)
+            fresh = len(history) == 1
+            answered: List[str] = []  # yanıtı üreten rota (log)
+            cached = None
+            if advice is None:
+                with span("cache_lookup"):
+                    cached = lookup_cached_reply(req, history)
+                flight_key = first_turn_cache_key(req, history)
+                if cached is None and flight_key in inflight:
+                    # Aynı soru şu anda başka bir istek için üretiliyor: onun sonucunu bekle
+                    async with asyncio.timeout_at(deadline):
+                        cached = await join_flight(req, flight_key, make_llm_call(req, history, answered))
+            else:
+                slot = await admit(req, urgent=True)
+                if slot is None:
+                    source = "emergency"  # yuva yok/takip kapalı: yalnızca uyarı
+                else:
+                    held.append(slot)
+                    parts.append("\n\n")
+                    yield None, {"delta": "\n\n"}
+            if cached is not None:
+                # Önbellekten/paylaşılan uçuştan: tüm yanıt tek parça halinde
+                parts.append(cached[0])
+                source = cached[1]
+                yield None, {"delta": parts[0]}
+            elif source == "llm":
+                streamed = len(parts)
+                try:
+                    with timed_llm("stream"), span("llm_stream"):
+                        # Acil takip yönlendirilmez: en düşük gecikme için hızlı model
+                        chunks = (routed_stream(req, history, answered) if advice is None
+                                  else stream_route("fast", req, history))
+                        async for text in stream_until(chunks, deadline):
+                            parts.append(text)
+                            yield None, {"delta": text}
+                except Exception as exc:
+                    # Yalnızca ilk parçadan önce: sağlayıcı yoksa yedek yanıta düş
+                    if len(parts) > streamed or past_deadline(deadline) or not upstream_unavailable(exc):
+                        raise
+                    if advice is not None:
+                        source = "emergency"  # uyarı zaten gönderildi
+                    else:
+                        text, source = degraded_reply(req, history, exc)
+                        parts.append(text)
+                        yield None, {"delta": text}
+        except Exception as exc:
+            rollback_turn(user_session_key, fresh)
+            if isinstance(exc, TimeoutError) and past_deadline(deadline):
+                CHAT_ABORTED.labels("deadline").inc()
+                detail = "Yanıt istenen süre içinde hazırlanamadı. Lütfen tekrar deneyin."
+            else:
+                logger.exception("chat stream failed: %s", exc)
+                detail = "Beklenmeyen bir hata oluştu. Lütfen daha sonra tekrar deneyin."
+            yield "error", {"detail": detail}
+            return
+        except BaseException:
+            # İstemci ayrıldı (SSE akışı iptal edildi / WebSocket kapandı): LLM çağrısı da burada kesilir
+            rollback_turn(user_session_key, fresh)
+            CHAT_ABORTED.labels("disconnect").inc()
+            raise
+
+        # Akış tamamlandı: turu ancak şimdi hafızaya yaz (yarım yanıt hafızayı kirletmez)
+        reply = "".join(parts)
+        if source in DEGRADED_SOURCES:
+            rollback_turn(user_session_key, fresh)
+            REPLIES.labels(source).inc()
+        else:
+            if source == "llm" and advice is None:
+                remember_reply(req, history, reply)
+            with span("save_context"):
+                session.memory.save_context({"input": req.message}, {"response": reply})
+            finish_turn(req, user_session_key, sess, session, source, answered)
+    done = {"response": reply}
+    if advice is not None:
+        done["emergency"] = True
+    if source in DEGRADED_SOURCES:
+        done["degraded"] = True
+    yield "done", done
+
+
+# Akış endpoint'i: POST /chat/stream (token token yanıt)
+@app.post("/chat/stream")
+async def chat_with_doctor_stream(
+    req: ChatRequest,
+    request_timeout: Optional[float] = Header(default=None, alias="X-Request-Timeout"),
+) -> StreamingResponse:
+    """
+    /chat ile aynı hafıza ve budama mantığını kullanır, yanıtı SSE olarak parça parça gönderir.
+
+    Olaylar:
+    - data: {"delta": "..."}            → yeni metin parçası
+    - event: done  / data: {"response": "..."} → tam yanıt (hafızaya bu anda yazılır)
+    - event: error / data: {"detail": "..."}   → hata; tur hafızaya yazılmaz
+
+    Sunucu doluysa akış başlamadan /chat ile aynı şekilde 503/429 (Retry-After) döner.
+    Acil belirtide hazır 112 uyarısı ilk olay olarak hemen gönderilir; LLM yanıtı ardından
+    akar (done olayında "emergency": true). Sağlayıcıya ilk parçadan önce ulaşılamazsa yedek
+    yanıt tek parça gönderilir (done olayında "degraded": true).
+
+    İstemci ayrılırsa akış (LLM çağrısı dahil) iptal edilir; son tarih (X-Request-Timeout veya
+    timeout_seconds) dolarsa error olayı gönderilir. İki durumda da tur hafızaya yazılmaz.
+    """
+    mark("parse_validate")
+    deadline = client_deadline(req, request_timeout)
+    advice = check_emergency(req)
+    held, reservation = await begin_stream_turn(req, advice, deadline)
+    opened = []  # akış içinde açılan oturum (arka plan özeti için)
+
+    async def event_source():
+        # Süre, istemcinin son olayı aldığı ana kadar ölçülür; yuva akış bitince bırakılır
+        try:
+            with Timed(REQUEST_LATENCY.labels("/chat/stream"), REQUESTS_IN_FLIGHT.labels("/chat/stream")):
+                async for event, data in stream_turn(req, advice, reservation, held, opened, deadline):
+                    yield sse_event(data, event)
+        finally:
+            release_slots(held)
+
+    async def summarize_after_stream():
+        # Akış bittikten sonra çalışır; bekleyen özet yoksa hiçbir şey yapmaz.
+        # Akış hiç başlamadıysa (istemci erken ayrıldı) yuva ve oturum ayrımı burada bırakılır
+        release_slots(held)
+        cancel_reservation(reservation)
+        if opened:
+            await summarize_session(*opened[0])
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(summarize_after_stream),
+    )
+
+
+# WebSocket kanalı: profil ve oturum bağlantıda bir kez doğrulanır; çerçeveler yalnızca mesaj taşır
+_background_tasks: set = set()  # bağlantıdan bağımsız süren işler (özet); referans tutulmazsa GC toplar
+
+
+def run_in_background(work: Awaitable) -> None:
+    task = asyncio.ensure_future(work)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def parse_ws_frame(frame: str) -> Tuple[Optional[str], Optional[float]]:
+    """
+    İstemci çerçevesi: düz metin (mesajın kendisi) veya JSON
+    {"message": "...", "timeout_seconds": 30} / {"type": "pong"}. (mesaj, süre) döner; mesaj yoksa None
+    """
+    if frame.startswith("{"):
+        try:
+            data = json.loads(frame)
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            message = data.get("message")
+            timeout = data.get("timeout_seconds")
+            if not isinstance(timeout, (int, float)) or timeout <= 0:
+                timeout = None
+            if not isinstance(message, str):
+                return None, None
+            return message.strip() or None, timeout
+    return frame.strip() or None, None
+
+
+def error_frame(exc: HTTPException) -> dict:
+    frame = {"type": "error", "status": exc.status_code, "detail": exc.detail}
+    retry_after = (exc.headers or {}).get("Retry-After")
+    if retry_after:
+        frame["retry_after"] = int(retry_after)
+    return frame
+
+
+async def ws_turn(websocket: WebSocket, profile: ChatRequest, message: str, timeout: Optional[float]) -> None:
+    """Tek mesajlık tur: /chat/stream ile aynı akış, olaylar JSON çerçeve olarak gönderilir"""
+    req = profile.model_copy(update={"message": message, "timeout_seconds": timeout})
+    deadline = client_deadline(req, None)
+    advice = check_emergency(req)
+    try:
+        held, reservation = await begin_stream_turn(req, advice, deadline)
+    except HTTPException as exc:
+        await websocket.send_json(error_frame(exc))
+        return
+    opened = []
+    events = stream_turn(req, advice, reservation, held, opened, deadline)
+    try:
+        with Timed(REQUEST_LATENCY.labels("/chat/ws"), REQUESTS_IN_FLIGHT.labels("/chat/ws")):
+            async for event, data in events:
+                await websocket.send_json({"type": event or "delta", **data})
+    finally:
+        # Gönderim hatası/iptalde tur üreteci kapatılır: yarım tur geri alınır, yuva ve ayrım bırakılır
+        await events.aclose()
+        release_slots(held)
+        cancel_reservation(reservation)
+    if opened:
+        run_in_background(summarize_session(*opened[0]))
+
+
+@app.websocket("/chat/ws")
+async def chat_ws(
+    websocket: WebSocket,
+    name: str = Query(default=""),
+    age: int = Query(default=0),
+    gender: str = Query(default=""),
+    session_id: Optional[str] = Query(default=None),
+) -> None:
+    """
+    Kalıcı sohbet kanalı: /chat/ws?name=...&age=...&gender=...&session_id=...
+
+    Profil bağlantıda bir kez doğrulanır; session_id verilmezse sunucu üretir ve "ready" çerçevesinde
+    döner (bağlantı boyunca aynı oturum). Sonraki her çerçeve yalnızca mesajdır (düz metin veya
+    {"message": "...", "timeout_seconds": 30}). Sunucu çerçeveleri (JSON):
+    - {"type": "ready", "session_id": "..."}
+    - {"type": "delta", "delta": "..."}           → yanıt parçası
+    - {"type": "done", "response": "...", ...}     → tam yanıt (emergency/degraded /chat/stream ile aynı)
+    - {"type": "error", "status": 503, "detail": "...", "retry_after": 2} → tur işlenmedi, kanal açık
+    - {"type": "ping"}                             → kalp atışı (istemci {"type": "pong"} gönderebilir)
+
+    Mesajlar sırayla işlenir; tur sürerken gelen mesaj kuyrukta bekler. Bağlantı koparsa süren tur
+    iptal edilir ve hafızaya yazılmaz.
+    """
+    try:
+        profile = ChatRequest(
+            name=name, age=age, gender=gender, message="",
+            session_id=session_id or uuid.uuid4().hex,
+        )
+    except ValidationError as exc:
+        await websocket.accept()
+        detail = "; ".join(err["msg"] for err in exc.errors())
+        await websocket.send_json({"type": "error", "status": 422, "detail": detail})
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    await websocket.send_json({"type": "ready", "session_id": profile.session_id})
+
+    inbox: asyncio.Queue = asyncio.Queue()
+    closed = asyncio.Event()
+
+    async def receive() -> None:
+        # Tur sürerken de okunur: bağlantı kopması hemen fark edilir, yeni mesajlar sıraya girer
+        try:
+            while True:
+                frame = await websocket.receive()
+                if frame["type"] == "websocket.disconnect":
+                    break
+                text = frame.get("text")
+                if text is None and frame.get("bytes") is not None:
+                    text = frame["bytes"].decode("utf-8", "replace")
+                if text is not None:
+                    await inbox.put(text)
+        finally:
+            closed.set()
+            await inbox.put(None)
+
+    async def heartbeat() -> None:
+        while True:
+            await asyncio.sleep(WS_HEARTBEAT_SECONDS)
+            await websocket.send_json({"type": "ping"})
+
+    tasks = [asyncio.ensure_future(receive())]
+    if WS_HEARTBEAT_SECONDS > 0:
+        tasks.append(asyncio.ensure_future(heartbeat()))
+    disconnected = asyncio.ensure_future(closed.wait())
+    tasks.append(disconnected)
+    try:
+        while True:
+            try:
+                frame = await asyncio.wait_for(inbox.get(), WS_IDLE_TIMEOUT_SECONDS or None)
+            except TimeoutError:
+                await websocket.close(code=1000, reason="idle")
+                break
+            if frame is None:
+                break
+            message, timeout = parse_ws_frame(frame)
+            if message is None:
+                continue  # pong / boş çerçeve
+            # Tur, bağlantının kopmasıyla yarışır: kopunca LLM çağrısı beklenmeden iptal edilir
+            turn = asyncio.ensure_future(ws_turn(websocket, profile, message, timeout))
+            tasks.append(turn)
+            await asyncio.wait((turn, disconnected), return_when=asyncio.FIRST_COMPLETED)
+            if not turn.done():
+                break
+            tasks.pop()
+            turn.result()
+    except (WebSocketDisconnect, RuntimeError):
+        pass  # istemci gönderim sırasında ayrıldı
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+# Toplu endpoint: POST /chat/batch (bağımsız istekler, NDJSON olarak bitiş sırasıyla)
+async def batch_item(index: int, req: ChatRequest, background_tasks: BackgroundTasks) -> dict:
+    """Tek öğeyi /chat ile aynı yoldan işler; hata da bir sonuç satırıdır (toplu iş kesilmez)"""
+    response = Response()  # yalnızca Idempotent-Replayed başlığını okumak için
+    key = (req.idempotency_key or "").strip()
+    try:
+        result = await handle_chat(req, background_tasks, response, key, client_deadline(req, None))
+    except HTTPException as exc:
+        line = {"index": index, "status": exc.status_code, "detail": exc.detail}
+        retry_after = (exc.headers or {}).get("Retry-After")
+        if retry_after:
+            line["retry_after"] = int(retry_after)
+    except IdempotencyConflictError:
+        line = {"index": index, "status": 422,
+                "detail": "Bu Idempotency-Key farklı içerikli bir istek için kullanılmış."}
+    except Exception as exc:
+        logger.exception("batch item failed: %s", exc)
+        line = {"index": index, "status": 500,
+                "detail": "Beklenmeyen bir hata oluştu. Lütfen daha sonra tekrar deneyin."}
+    else:
+        line = {"index": index, "status": 200, **result.model_dump()}
+        if "Idempotent-Replayed" in response.headers:
+            line["replayed"] = True
+    BATCH_ITEMS.labels(str(line["status"])).inc()
+    return line
+
+
+@app.post("/chat/batch")
+async def chat_batch(items: List[ChatRequest]) -> StreamingResponse:
+    """
+    ChatRequest dizisini sınırlı paralellikle (BATCH_CONCURRENCY) işler; sonuçlar bittikçe
+    NDJSON satırı olarak akar (satır sırası = bitiş sırası, "index" istekteki sıradır):
+
+    {"index": 3, "status": 200, "response": "...", "emergency": false, "degraded": false}
+    {"index": 0, "status": 503, "detail": "...", "retry_after": 2}
+
+    Her öğe /chat'in yolundan geçer: önbellekler, özdeş ilk tur sorularının birleştirilmesi,
+    global yuva sınırı, hız sınırı, acil hızlı yolu ve idempotency_key alanı aynen geçerlidir.
+    İstemci bağlantıyı keserse bekleyen öğeler iptal edilir.
+    """
+    mark("parse_validate")
+    if not items:
+        raise HTTPException(status_code=422, detail="En az bir öğe gönderilmelidir.")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413, detail=f"Tek istekte en fazla {BATCH_MAX_ITEMS} öğe gönderilebilir."
+        )
+    background_tasks = BackgroundTasks()  # öğelerin arka plan özetleri akış bitince çalışır
+
+    async def lines():
+        results: asyncio.Queue = asyncio.Queue()
+        pending = iter(enumerate(items))
+
+        async def worker() -> None:
+            # Sabit sayıda işçi ortak sıradan öğe çeker: öğe başına görev/semafor gerekmez
+            for index, req in pending:
+                await results.put(await batch_item(index, req, background_tasks))
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(min(BATCH_CONCURRENCY, len(items)))]
+        remaining = len(items)
+        try:
+            with Timed(REQUEST_LATENCY.labels("/chat/batch"), REQUESTS_IN_FLIGHT.labels("/chat/batch")):
+                while remaining:
+                    line = await results.get()
+                    remaining -= 1
+                    yield json.dumps(line, ensure_ascii=False) + "\n"
+        finally:
+            if remaining:
+                CHAT_ABORTED.labels("disconnect").inc()
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=background_tasks,
+    )
+
+
 # Uygulama giriş noktası
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # API_WORKERS > 1: oturum bağlı yönlendirici + N worker süreci (asistan_yonlendirici.py)
+    API_WORKERS = int(os.getenv("API_WORKERS", "1"))
+    if API_WORKERS > 1:
+        from asistan_yonlendirici import serve
+        serve(workers=API_WORKERS, host="0.0.0.0", port=8000)
+    else:
+        import uvicorn
+        uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,448 @@
+"""
+asistan_bench.py — Performans ölçüm araçları
+
+Ağ ve API anahtarı gerektirmez; sahte (fake) LLM ile tekrarlanabilir sonuç üretir.
+
+Alt komutlar:
+- overhead: Tur başına sohbet kurulum maliyeti (LLM süresi hariç).
+  Eski yol (her istekte ConversationChain) ile ConversationRunner karşılaştırılır.
+- scale: Yönlendirici + 1..N worker (asistan_yonlendirici.py) ile verim ölçeklenmesi.
+  Worker'lar sahte LLM ile çalışır (LLM_PROVIDER=fake, asistan_saglayici.py).
+- load: Çok turlu sohbetleri (çip sorusu + takip soruları) verilen eşzamanlılık ve/veya
+  varış hızıyla /chat veya /chat/stream'e oynatır. p50/p95/p99 gecikme, ilk byte süresi,
+  verim, hata oranı ve sunucunun RSS büyümesini JSON olarak raporlar. --url verilmezse
+  sahte LLM'li bir sunucu kendisi başlatılır (tekrarlanabilir sonuç).
+
+Kullanım:
+    python asistan_bench.py overhead --iterations 2000 --history 10
+    python asistan_bench.py scale --workers 1,2,4 --users 64 --turns 10
+    python asistan_bench.py load --conversations 200 --concurrency 32 --output sonuc.json
+    python asistan_bench.py load --rate 20 --duration 60 --stream
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import warnings
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from asistan_llm import ConversationRunner
+from asistan_onbellek import CHIP_PROMPTS
+from asistan_talimat import build_system_message
+
+warnings.filterwarnings("ignore")
+
+
+def _new_memory(history_turns: int):
+    """Sistem mesajı + N tur geçmişi olan örnek hafıza"""
+    from langchain.memory import ConversationBufferMemory
+
+    memory = ConversationBufferMemory(return_messages=True)
+    memory.chat_memory.add_message(build_system_message("Ayşe", 34, "female"))
+    for i in range(history_turns):
+        memory.save_context({"input": f"Soru {i}: başım ağrıyor"}, {"response": f"Yanıt {i}: dinlenin"})
+    return memory
+
+
+async def _time_async(fn: Callable, iterations: int) -> float:
+    """Ortalama süre (mikrosaniye); ilk 50 tur ısınma olarak sayılmaz"""
+    for _ in range(min(50, iterations)):
+        await fn()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+async def bench_overhead(iterations: int, history_turns: int) -> Dict[str, float]:
+    """Anında yanıt veren sahte LLM ile tur başına yükü ölçer (hafıza yazımı dahil)"""
+    from langchain.chains import ConversationChain
+
+    llm = FakeListChatModel(responses=["Tamam."])
+    runner = ConversationRunner(llm)
+    base = _new_memory(history_turns)
+    snapshot = list(base.chat_memory.messages)
+
+    async def chain_turn():
+        # Eski yol: her istekte zincir kurulumu + şablon doğrulaması
+        base.chat_memory.messages = list(snapshot)
+        conversation = ConversationChain(llm=llm, memory=base, verbose=False)
+        await conversation.apredict(input="Ateşim var")
+
+    async def runner_turn():
+        # Yeni yol: tek yürütücü, mesaj listesi doğrudan LLM'e
+        base.chat_memory.messages = list(snapshot)
+        reply = await runner.arun(base.chat_memory.messages, "Ateşim var")
+        base.save_context({"input": "Ateşim var"}, {"response": reply})
+
+    async def llm_only():
+        # Alt sınır: sadece sahte LLM çağrısı
+        await llm.ainvoke(snapshot)
+
+    chain_us = await _time_async(chain_turn, iterations)
+    runner_us = await _time_async(runner_turn, iterations)
+    llm_us = await _time_async(llm_only, iterations)
+    return {
+        "iterations": iterations,
+        "history_turns": history_turns,
+        "conversation_chain_us": round(chain_us, 1),
+        "runner_us": round(runner_us, 1),
+        "fake_llm_only_us": round(llm_us, 1),
+        "speedup": round(chain_us / runner_us, 2) if runner_us else None,
+    }
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def _drive(url: str, users: int, turns: int) -> Dict[str, float]:
+    """Her sanal kullanıcı kendi oturumunda sırayla `turns` mesaj gönderir"""
+    import httpx
+
+    latencies: List[float] = []
+    errors = 0
+
+    async def user(i: int, client) -> None:
+        nonlocal errors
+        for t in range(turns):
+            payload = {"name": f"u{i}", "age": 30, "gender": "other",
+                       "message": f"Mesaj {t}: başım ağrıyor", "session_id": "bench"}
+            start = time.perf_counter()
+            try:
+                resp = await client.post(f"{url}/chat", json=payload)
+                ok = resp.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(timeout=60, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(user(i, client) for i in range(users)))
+        elapsed = time.perf_counter() - start
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 1),
+    }
+
+
+async def _wait_http(url: str, timeout: float = 60.0) -> None:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=1.0) as client:
+        while True:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"sunucu başlamadı: {url}")
+            await asyncio.sleep(0.2)
+
+
+def bench_scale(worker_counts: List[int], users: int, turns: int, port: int,
+                latency_ms: float) -> List[Dict[str, float]]:
+    """Her worker sayısı için yönlendiriciyi ayrı süreçte başlatır ve aynı yükü uygular"""
+    results = []
+    for n in worker_counts:
+        env = dict(os.environ, LLM_PROVIDER="fake", FAKE_LLM_TTFT_MS=str(latency_ms),
+                   FAKE_LLM_TOKENS_PER_SEC="0", RESPONSE_CACHE_PREWARM="false")
+        router = subprocess.Popen(
+            [sys.executable, "asistan_yonlendirici.py", "--workers", str(n), "--host", "127.0.0.1",
+             "--port", str(port), "--worker-base-port", str(port + 100)],
+            env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        try:
+            url = f"http://127.0.0.1:{port}"
+            asyncio.run(_wait_http(f"{url}/router/stats"))
+            stats = asyncio.run(_drive(url, users, turns))
+        finally:
+            router.terminate()
+            router.wait(timeout=30)
+        results.append({"workers": n, **stats})
+    base = results[0]["throughput_rps"] if results else 0
+    for r in results:
+        r["speedup"] = round(r["throughput_rps"] / base, 2) if base else None
+    return results
+
+
+# Çip sorusundan sonra gelen takip soruları (sohbet başına sırayla kullanılır)
+FOLLOW_UPS = (
+    "Ne kadar süredir devam ederse doktora gitmeliyim?",
+    "Evde kullanabileceğim bir yöntem var mı?",
+    "Ağrı kesici almam uygun olur mu?",
+    "Beslenmemde neye dikkat etmeliyim?",
+    "Bu durum uykumu da etkiliyor, ne önerirsin?",
+    "Peki çocuklarda da aynı şeyler geçerli mi?",
+)
+
+
+def _rss_bytes(pid: int) -> Optional[int]:
+    """Sürecin yerleşik bellek (RSS) miktarı; Linux /proc, yoksa psutil"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+
+        return psutil.Process(pid).memory_info().rss
+    except Exception:
+        return None
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+class _LoadStats:
+    """İstek sonuçlarının toplayıcısı"""
+
+    def __init__(self) -> None:
+        self.latencies: List[float] = []
+        self.ttfb: List[float] = []
+        self.errors: Counter = Counter()
+        self.requests = 0
+
+    def summary(self, elapsed: float) -> Dict[str, object]:
+        ok = len(self.latencies)
+        ms = lambda values, q: round(_percentile(values, q) * 1000, 1)  # noqa: E731
+        return {
+            "requests": self.requests,
+            "ok": ok,
+            "error_rate": round(sum(self.errors.values()) / self.requests, 4) if self.requests else 0.0,
+            "errors": dict(self.errors),
+            "seconds": round(elapsed, 3),
+            "throughput_rps": round(ok / elapsed, 2) if elapsed else 0.0,
+            "latency_ms": {"p50": ms(self.latencies, 0.50), "p95": ms(self.latencies, 0.95),
+                           "p99": ms(self.latencies, 0.99)},
+            "ttfb_ms": {"p50": ms(self.ttfb, 0.50), "p95": ms(self.ttfb, 0.95),
+                        "p99": ms(self.ttfb, 0.99)},
+        }
+
+
+async def _send_turn(client, url: str, payload: dict, stream: bool, stats: _LoadStats) -> None:
+    """Tek mesaj: gecikme = yanıtın tamamı, TTFB = yanıt gövdesinin ilk byte'ı (akışta ilk SSE satırı)"""
+    import httpx
+
+    stats.requests += 1
+    start = time.perf_counter()
+    ttfb = None
+    try:
+        async with client.stream("POST", f"{url}/chat/stream" if stream else f"{url}/chat",
+                                 json=payload) as resp:
+            failed = resp.status_code != 200
+            # Akışta hata HTTP 200 içinde "event: error" satırı olarak gelir: parça sınırından
+            # bağımsız olması için satır satır okunur
+            body = resp.aiter_lines() if stream else resp.aiter_bytes()
+            async for item in body:
+                if ttfb is None:
+                    ttfb = time.perf_counter() - start
+                if stream and item.strip() == "event: error":
+                    failed = True
+        if failed:
+            stats.errors[f"http_{resp.status_code}" if resp.status_code != 200 else "stream_error"] += 1
+            return
+    except httpx.HTTPError as exc:
+        stats.errors[type(exc).__name__] += 1
+        return
+    stats.latencies.append(time.perf_counter() - start)
+    if ttfb is not None:
+        stats.ttfb.append(ttfb)
+
+
+async def _conversation(client, url: str, conv_id: int, turns: int, stream: bool,
+                        think_time: float, stats: _LoadStats, rng: random.Random) -> None:
+    """Çip sorusuyla başlayan, takip sorularıyla süren tek sohbet (aynı oturumda sırayla)"""
+    profile = {"name": f"yuk{conv_id}", "age": rng.choice((12, 30, 45, 67)),
+               "gender": rng.choice(("female", "male", "other")), "session_id": f"bench-{conv_id}"}
+    messages = [rng.choice(CHIP_PROMPTS)] + [FOLLOW_UPS[(conv_id + i) % len(FOLLOW_UPS)]
+                                             for i in range(turns - 1)]
+    for message in messages:
+        await _send_turn(client, url, {**profile, "message": message}, stream, stats)
+        if think_time:
+            await asyncio.sleep(think_time)
+
+
+async def _sample_rss(pid: int, samples: List[int], interval: float = 0.5) -> None:
+    while True:
+        rss = _rss_bytes(pid)
+        if rss is not None:
+            samples.append(rss)
+        await asyncio.sleep(interval)
+
+
+async def bench_load(url: str, conversations: int, turns: int, concurrency: int, rate: float,
+                     duration: float, stream: bool, think_time: float, seed: int,
+                     server_pid: Optional[int]) -> Dict[str, object]:
+    """
+    Kapalı döngü (rate=0): en fazla `concurrency` sohbet aynı anda; biten yerine yenisi başlar.
+    Açık döngü (rate>0): sohbetler Poisson süreciyle saniyede `rate` hızında gelir
+    (eşzamanlı sohbet sayısı yine `concurrency` ile sınırlı; duration>0 ise süre dolunca yeni sohbet başlamaz).
+    """
+    import httpx
+
+    rng = random.Random(seed)
+    stats = _LoadStats()
+    rss_samples: List[int] = []
+    rss_start = _rss_bytes(server_pid) if server_pid else None
+    sampler = asyncio.create_task(_sample_rss(server_pid, rss_samples)) if server_pid else None
+    slots = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+
+        async def run(conv_id: int) -> None:
+            try:
+                await _conversation(client, url, conv_id, turns, stream, think_time, stats, rng)
+            finally:
+                slots.release()
+
+        start = time.perf_counter()
+        tasks = []
+        for conv_id in range(conversations or sys.maxsize):
+            if duration and time.perf_counter() - start >= duration:
+                break
+            if rate > 0:
+                await asyncio.sleep(rng.expovariate(rate))
+            await slots.acquire()
+            tasks.append(asyncio.create_task(run(conv_id)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    if sampler:
+        sampler.cancel()
+    result = {
+        "config": {"url": url, "conversations": len(tasks), "turns": turns, "concurrency": concurrency,
+                   "rate": rate, "duration": duration, "stream": stream, "think_time": think_time,
+                   "seed": seed},
+        "commit": _git_commit(),
+        **stats.summary(elapsed),
+    }
+    if server_pid:
+        rss_end = _rss_bytes(server_pid)
+        mb = lambda b: round(b / (1024 * 1024), 1) if b is not None else None  # noqa: E731
+        result["server_rss_mb"] = {
+            "start": mb(rss_start),
+            "end": mb(rss_end),
+            "peak": mb(max(rss_samples)) if rss_samples else None,
+            "growth": mb(rss_end - rss_start) if rss_start is not None and rss_end is not None else None,
+        }
+    return result
+
+
+def _spawn_fake_server(port: int, ttft_ms: float, tokens_per_sec: float,
+                       error_rate: float) -> subprocess.Popen:
+    """Sahte LLM ile tek süreçli API (ölçülen RSS bu sürecindir)"""
+    env = dict(os.environ, LLM_PROVIDER="fake", FAKE_LLM_TTFT_MS=str(ttft_ms),
+               FAKE_LLM_TOKENS_PER_SEC=str(tokens_per_sec), FAKE_LLM_ERROR_RATE=str(error_rate),
+               RESPONSE_CACHE_PREWARM="false")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "asistan_api:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+
+
+def run_load(args) -> Dict[str, object]:
+    server = None
+    url = args.url
+    pid = args.server_pid
+    if not url:
+        server = _spawn_fake_server(args.port, args.ttft_ms, args.tokens_per_sec, args.error_rate)
+        url, pid = f"http://127.0.0.1:{args.port}", server.pid
+    try:
+        asyncio.run(_wait_http(f"{url}/health"))
+        result = asyncio.run(bench_load(
+            url, args.conversations, args.turns, args.concurrency, args.rate, args.duration,
+            args.stream, args.think_time, args.seed, pid,
+        ))
+        if server:
+            result["config"]["fake_llm"] = {"ttft_ms": args.ttft_ms, "tokens_per_sec": args.tokens_per_sec,
+                                            "error_rate": args.error_rate}
+        return result
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=30)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Doktor Asistanı performans ölçümleri")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_over = sub.add_parser("overhead", help="Tur başına sohbet kurulum yükü (zincir vs yürütücü)")
+    p_over.add_argument("--iterations", type=int, default=2000)
+    p_over.add_argument("--history", type=int, default=10, help="Geçmişteki tur sayısı")
+
+    p_scale = sub.add_parser("scale", help="Yönlendirici ile 1..N worker verim ölçeklenmesi")
+    p_scale.add_argument("--workers", default=",".join(str(n) for n in (1, 2, 4)),
+                         help="Virgülle ayrılmış worker sayıları (örn. 1,2,4,8)")
+    p_scale.add_argument("--users", type=int, default=64, help="Eşzamanlı sanal kullanıcı (oturum)")
+    p_scale.add_argument("--turns", type=int, default=10, help="Kullanıcı başına mesaj")
+    p_scale.add_argument("--port", type=int, default=8900)
+    p_scale.add_argument("--latency-ms", type=float, default=50, help="Sahte LLM ilk token süresi (medyan)")
+
+    p_load = sub.add_parser("load", help="Çok turlu sohbetlerle /chat yük testi (JSON rapor)")
+    p_load.add_argument("--url", help="Hedef API (verilmezse sahte LLM'li sunucu başlatılır)")
+    p_load.add_argument("--server-pid", type=int, help="--url ile: RSS'i ölçülecek sunucu süreci")
+    p_load.add_argument("--conversations", type=int, default=100, help="Toplam sohbet (0 = süre dolana kadar)")
+    p_load.add_argument("--turns", type=int, default=4, help="Sohbet başına mesaj (çip + takip)")
+    p_load.add_argument("--concurrency", type=int, default=16, help="Aynı anda en fazla sohbet")
+    p_load.add_argument("--rate", type=float, default=0.0, help="Yeni sohbet/sn (0 = kapalı döngü)")
+    p_load.add_argument("--duration", type=float, default=0.0, help="Yeni sohbet başlatma süresi (sn)")
+    p_load.add_argument("--think-time", type=float, default=0.0, help="Mesajlar arası bekleme (sn)")
+    p_load.add_argument("--stream", action="store_true", help="/chat/stream kullan")
+    p_load.add_argument("--seed", type=int, default=42)
+    p_load.add_argument("--port", type=int, default=8950)
+    p_load.add_argument("--ttft-ms", type=float, default=300, help="Sahte LLM ilk token süresi")
+    p_load.add_argument("--tokens-per-sec", type=float, default=80, help="Sahte LLM üretim hızı")
+    p_load.add_argument("--error-rate", type=float, default=0.0, help="Sahte LLM hata oranı")
+    p_load.add_argument("--output", help="Sonucu ayrıca bu JSON dosyasına yaz")
+
+    args = parser.parse_args()
+    if args.command == "overhead":
+        result = asyncio.run(bench_overhead(args.iterations, args.history))
+    elif args.command == "scale":
+        counts = [int(n) for n in args.workers.split(",") if n.strip()]
+        result = bench_scale(counts, args.users, args.turns, args.port, args.latency_ms)
+    elif args.command == "load":
+        if not args.conversations and not args.duration:
+            parser.error("--conversations 0 için --duration gerekli")
+        result = run_load(args)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
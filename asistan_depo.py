@@ -0,0 +1,147 @@
+"""
+asistan_depo.py — Oturumlar için kalıcı depolama arka uçları
+
+SessionStore (asistan_oturum.py) sıcak oturumları bellekte tutar; arka uç ise oturumların
+yeniden başlatmadan (deploy, uyku) sağ çıkmasını sağlar:
+- MemoryBackend: Kalıcılık yok (varsayılan); oturumlar yalnızca süreç belleğinde yaşar
+- SQLiteBackend: WAL modunda tek dosya; yazmalar toplu (batch) yapılır, okumalar tek satırdır
+
+Arka uç senkron ve iş parçacığı güvenlidir; toplu yazma event loop dışında (executor'da) çalışır.
+Kayıt biçimi: {"messages": [...], "pending_summary": [...], "updated_at": float, "version": int}
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
+
+from asistan_talimat import shared_text
+
+SessionRecord = Dict[str, Any]
+
+
+def dump_messages(messages: List[BaseMessage]) -> List[dict]:
+    """Mesajları JSON'a yazılabilir sözlüklere çevirir (rol + içerik + ek alanlar)"""
+    return messages_to_dict(messages)
+
+
+def load_messages(data: List[dict]) -> List[BaseMessage]:
+    """Sözlüklerden mesajları kurar; profil gövdeleri paylaşılan (intern) nesneye bağlanır"""
+    messages = messages_from_dict(data)
+    for m in messages:
+        if isinstance(m.content, list):
+            m.content = [shared_text(p) if isinstance(p, str) else p for p in m.content]
+    return messages
+
+
+class MemoryBackend:
+    """Kalıcılık olmadan çalışma: tüm çağrılar boştur, oturumlar yeniden başlatmada kaybolur"""
+
+    persistent = False
+
+    def load(self, key: str) -> Optional[SessionRecord]:
+        return None
+
+    def version(self, key: str) -> Optional[int]:
+        return None
+
+    def write_batch(self, batch: Dict[str, Optional[SessionRecord]]) -> None:
+        pass
+
+    def purge_expired(self, ttl_seconds: float) -> int:
+        return 0
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteBackend:
+    """
+    SQLite oturum arka ucu (WAL).
+
+    - WAL: okuyucular yazarı, yazar okuyucuları bekletmez; birden çok worker aynı dosyayı açabilir
+    - write_batch: biriken oturumlar tek işlemde (transaction) yazılır/silinir
+    - synchronous=NORMAL: WAL ile güvenli; her işlemde fsync beklenmez
+    """
+
+    persistent = True
+
+    def __init__(self, path: str, busy_timeout_ms: int = 5000) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " key TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " version INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions(updated_at)")
+
+    def load(self, key: str) -> Optional[SessionRecord]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM sessions WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def version(self, key: str) -> Optional[int]:
+        """Kaydın sürümü (tam kaydı okumadan); başka worker'ın yazıp yazmadığını anlamak için"""
+        with self._lock:
+            row = self._conn.execute("SELECT version FROM sessions WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def write_batch(self, batch: Dict[str, Optional[SessionRecord]]) -> None:
+        """Anahtar → kayıt (None: sil) eşlemesini tek işlemde uygular"""
+        if not batch:
+            return
+        upserts = [
+            (key, json.dumps(rec, ensure_ascii=False), rec["updated_at"], rec["version"])
+            for key, rec in batch.items() if rec is not None
+        ]
+        deletes = [(key,) for key, rec in batch.items() if rec is None]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if upserts:
+                    self._conn.executemany(
+                        "INSERT INTO sessions (key, data, updated_at, version) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT(key) DO UPDATE SET data = excluded.data, "
+                        "updated_at = excluded.updated_at, version = excluded.version",
+                        upserts,
+                    )
+                if deletes:
+                    self._conn.executemany("DELETE FROM sessions WHERE key = ?", deletes)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def purge_expired(self, ttl_seconds: float) -> int:
+        """Son yazımından bu yana ttl_seconds geçmiş kayıtları siler"""
+        if not ttl_seconds:
+            return 0
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM sessions WHERE updated_at < ?", (time.time() - ttl_seconds,)
+            )
+        return cur.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def create_backend(kind: str, path: str):
+    """SESSION_BACKEND değerine göre arka ucu kurar: memory | sqlite"""
+    kind = (kind or "memory").strip().lower()
+    if kind == "sqlite":
+        return SQLiteBackend(path)
+    if kind != "memory":
+        raise ValueError(f"Bilinmeyen SESSION_BACKEND: {kind}")
+    return MemoryBackend()
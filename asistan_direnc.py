@@ -0,0 +1,261 @@
+"""
+asistan_direnc.py — LLM sağlayıcısı önünde dayanıklı çağrı katmanı
+
+Geçici bir sağlayıcı hatası (503, kota, zaman aşımı) tek başına kullanıcıya 500 olarak
+yansımamalı; yavaşlayan sağlayıcı da tüm istekleri peşinden sürüklememeli. Bu modül:
+- Yeniden deneme: yalnızca geçici hatalarda, üstel geri çekilme + tam rastgele sapma (full jitter)
+  ile sınırlı sayıda deneme; istemci hataları (geçersiz istek vb.) hemen yukarı çıkar
+- Hedging (opsiyonel): çağrı son başarılı çağrıların p95 süresini aşarsa ikinci bir deneme
+  başlatılır; önce biten kazanır, diğeri iptal edilir (kuyruk gecikmesini kırpar)
+- Devre kesici (circuit breaker): art arda hatalarda devre açılır ve çağrılar sağlayıcıya hiç
+  gitmeden CircuitOpenError ile hızlıca düşer; süre dolunca tek bir deneme çağrısı (half-open)
+  sağlayıcının düzelip düzelmediğini yoklar
+
+Devre açıkken ne sunulacağı (önbellekten yanıt veya kısa bir "şu an yanıt veremiyorum" metni)
+çağırana aittir (asistan_api.py). Sahte model (LLM_PROVIDER=fake, FAKE_LLM_ERROR_RATE) aynı hata
+türlerini ürettiği için katman çevrimdışı test edilebilir.
+"""
+
+import asyncio
+import math
+import random
+import time
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Deque, Optional, TypeVar
+
+from google.api_core import exceptions as upstream_errors
+
+T = TypeVar("T")
+
+# Yeniden denenebilir (geçici) sağlayıcı hataları: 429, 500, 503, 504 ve bağlantı/zaman aşımı
+RETRYABLE_ERRORS = (
+    upstream_errors.TooManyRequests,        # ResourceExhausted dahil (kota)
+    upstream_errors.InternalServerError,
+    upstream_errors.ServiceUnavailable,
+    upstream_errors.GatewayTimeout,         # DeadlineExceeded dahil
+    ConnectionError,
+    TimeoutError,
+)
+
+
+def is_retryable(exc: BaseException) -> bool:
+    return isinstance(exc, RETRYABLE_ERRORS)
+
+
+class CircuitOpenError(Exception):
+    """Devre açık: sağlayıcı sağlıksız, çağrı yapılmadan reddedildi"""
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__("circuit_open")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Art arda hata sayan devre kesici: closed → (failure_threshold hata) → open →
+    (reset_seconds sonra) half_open → tek deneme başarılıysa closed, değilse tekrar open.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self.short_circuited = 0
+        # Deneme çağrısının başlangıcı (0 = deneme yok); iptal edilen deneme devreyi kilitlemesin
+        # diye reset_seconds sonra yeni bir denemeye izin verilir
+        self._probe_started = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.failure_threshold > 0
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.reset_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        """Çağrı yapılabilir mi? Açık devrede süre dolduysa tek bir deneme çağrısına izin verir"""
+        if self.state == "closed" or not self.enabled:
+            return True
+        now = time.monotonic()
+        if self.state == "open" and now - self.opened_at >= self.reset_seconds:
+            self.state = "half_open"
+            self._probe_started = 0.0
+        if self.state == "half_open" and now - self._probe_started >= self.reset_seconds:
+            self._probe_started = now
+            return True
+        self.short_circuited += 1
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.state = "closed"
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or (self.enabled and self.failures >= self.failure_threshold):
+            if self.state != "open":
+                self.opens += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+class LatencyWindow:
+    """Son başarılı çağrı sürelerinin kayan penceresi; p95 sıralı kopyadan hesaplanır ve önbelleğe alınır"""
+
+    def __init__(self, size: int = 200) -> None:
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._cached: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self._cached = None
+
+    def quantile(self, q: float = 0.95) -> Optional[float]:
+        if not self._samples:
+            return None
+        if self._cached is None:
+            ordered = sorted(self._samples)
+            self._cached = ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+        return self._cached
+
+
+class Upstream:
+    """
+    LLM çağrılarını saran dayanıklılık katmanı.
+
+    Parametreler:
+    - max_attempts: Toplam deneme sayısı (1 = yeniden deneme yok)
+    - backoff_base / backoff_max: Geri çekilme tabanı ve üst sınırı (saniye); n. bekleme
+      uniform(0, min(backoff_max, backoff_base * 2**n)) — eşzamanlı istemciler aynı anda dönmez
+    - hedge: p95 süresinden sonra ikinci deneme başlatılsın mı
+    - hedge_min_samples: p95 güvenilir sayılmadan önce gereken başarılı çağrı sayısı
+    - breaker: Devre kesici (failure_threshold=0 ise kapalı)
+    """
+
+    def __init__(self, max_attempts: int, backoff_base: float, backoff_max: float,
+                 hedge: bool, breaker: CircuitBreaker, hedge_min_samples: int = 20,
+                 hedge_min_delay: float = 0.05) -> None:
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.breaker = breaker
+        self.latency = LatencyWindow()
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0.0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def hedge_delay(self) -> Optional[float]:
+        """İkinci denemeden önce beklenecek süre (p95); yeterli örnek yoksa None (hedging yok)"""
+        if not self.hedge or len(self.latency) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, self.latency.quantile(0.95))
+
+    def _admit(self) -> None:
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.breaker.retry_after())
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """fn()'i yeniden deneme, hedging ve devre kesici ile çağırır"""
+        attempt = 0
+        while True:
+            self._admit()
+            start = time.monotonic()
+            try:
+                result = await self._hedged(fn)
+            except Exception as exc:
+                if not is_retryable(exc):
+                    # Sağlayıcı yanıt verdi (istek hatalı): devre açısından sağlıklı sayılır
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                attempt += 1
+                if attempt >= self.max_attempts or self.breaker.state == "open":
+                    raise
+                self.retries += 1
+                await asyncio.sleep(self.backoff(attempt - 1))
+                continue
+            self.latency.observe(time.monotonic() - start)
+            self.breaker.record_success()
+            return result
+
+    async def _hedged(self, fn: Callable[[], Awaitable[T]]) -> T:
+        delay = self.hedge_delay()
+        if delay is None:
+            return await fn()
+        first = asyncio.ensure_future(fn())
+        pending = {first}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return first.result()
+            # İlk deneme p95'i aştı: ikinci deneme başlat, önce başarıyla biten kazanır
+            self.hedges += 1
+            second = asyncio.ensure_future(fn())
+            pending = {first, second}
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def stream(self, open_stream: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """
+        Akışlı çağrı: yeniden deneme ve devre kesici yalnızca ilk parçaya kadar uygulanır
+        (kullanıcıya parça gönderildikten sonra deneme tekrarlanamaz). Akışta hedging yoktur.
+        """
+        attempt = 0
+        while True:
+            self._admit()
+            start = time.monotonic()
+            chunks = open_stream()
+            try:
+                first = await chunks.__anext__()
+            except StopAsyncIteration:
+                self.breaker.record_success()
+                return
+            except Exception as exc:
+                await chunks.aclose()
+                if not is_retryable(exc):
+                    # call() ile aynı: sağlayıcı yanıt verdi, deneme çağrısı yuvası da boşalır
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                attempt += 1
+                if attempt >= self.max_attempts or self.breaker.state == "open":
+                    raise
+                self.retries += 1
+                await asyncio.sleep(self.backoff(attempt - 1))
+                continue
+            break
+        try:
+            yield first
+            async for text in chunks:
+                yield text
+        except Exception as exc:
+            if is_retryable(exc):
+                self.breaker.record_failure()
+            raise
+        finally:
+            await chunks.aclose()
+        self.latency.observe(time.monotonic() - start)
+        self.breaker.record_success()
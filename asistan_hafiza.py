@@ -0,0 +1,213 @@
+"""
+asistan_hafiza.py — Token bütçesine göre hafıza budama
+
+Mesaj sayısı yerine tahmini token bütçesiyle budama yapar:
+- Sistem mesajı her zaman korunur
+- Eski turlar (kullanıcı + asistan çifti) bütçe aşıldıkça baştan atılır
+- Token sayımı artımlıdır: her mesaj yalnızca hafızaya eklendiğinde bir kez sayılır
+- Tokenizer takılabilir; varsayılanı ağ gerektirmeyen hızlı bir sezgisel tahmindir
+- Opsiyonel özet modu: atılan turlar, sistem mesajının yanında tutulan kısa bir
+  "kayan özete" katlanır; böylece erken bahsedilen belirtiler unutulmaz
+
+API (asistan_api.py) ve terminal uygulaması (asistan_terminal.py) aynı mantığı kullanır.
+"""
+
+import os
+from typing import Callable, Dict, List, Optional
+
+from langchain.memory import ConversationBufferMemory
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+# Tokenizer imzası: metin → tahmini token sayısı
+Tokenizer = Callable[[str], int]
+
+# Ortam değişkenleri: bütçe ve tokenizer seçimi
+MEMORY_MAX_TOKENS = int(os.getenv("MEMORY_MAX_TOKENS", "4000"))
+MEMORY_TOKENIZER = os.getenv("MEMORY_TOKENIZER", "heuristic")
+
+# Hafıza modu: buffer (atılan turlar unutulur) veya summary (atılan turlar özete katlanır)
+MEMORY_MODE = os.getenv("MEMORY_MODE", "buffer").strip().lower()
+MEMORY_SUMMARY_MAX_TOKENS = int(os.getenv("MEMORY_SUMMARY_MAX_TOKENS", "300"))
+
+# Her mesajın rol/ayraç gibi biçim maliyeti (içerikten bağımsız)
+MESSAGE_TOKEN_OVERHEAD = 4
+
+
+def heuristic_tokens(text: str) -> int:
+    """
+    Hızlı yerel tahmin: ~4 karakter ≈ 1 token.
+    Türkçe gibi eklemeli dillerde kelime sayısı da hesaba katılır (hangisi büyükse).
+    """
+    if not text:
+        return 0
+    by_chars = (len(text) + 3) // 4
+    by_words = len(text.split()) * 4 // 3
+    return max(by_chars, by_words)
+
+
+def char_tokens(text: str) -> int:
+    """Kötümser tahmin: her 3 karakter bir token (bütçeyi garantiye almak için)"""
+    return (len(text) + 2) // 3 if text else 0
+
+
+# Kayıtlı tokenizer'lar: MEMORY_TOKENIZER ile seçilir, register_tokenizer ile genişletilir
+TOKENIZERS: Dict[str, Tokenizer] = {
+    "heuristic": heuristic_tokens,
+    "chars": char_tokens,
+}
+
+
+def register_tokenizer(name: str, fn: Tokenizer) -> None:
+    """Yeni bir tokenizer kaydeder (örn. sağlayıcının gerçek sayacı)"""
+    TOKENIZERS[name] = fn
+
+
+def get_tokenizer(name: Optional[str] = None) -> Tokenizer:
+    """İsimle tokenizer döndürür; bilinmeyen isimde sezgisel tahmine düşer"""
+    return TOKENIZERS.get(name or MEMORY_TOKENIZER, heuristic_tokens)
+
+
+def message_tokens(message, tokenizer: Tokenizer) -> int:
+    """Tek bir mesajın token maliyeti (içerik + biçim yükü)"""
+    content = getattr(message, "content", "")
+    if isinstance(content, list):
+        # Parçalı içerik (örn. isim başlığı + paylaşılan profil gövdesi)
+        return sum(tokenizer(p if isinstance(p, str) else str(p.get("text", "")))
+                   for p in content) + MESSAGE_TOKEN_OVERHEAD
+    if not isinstance(content, str):
+        content = str(content)
+    return tokenizer(content) + MESSAGE_TOKEN_OVERHEAD
+
+
+class TokenLedger:
+    """
+    Hafızadaki mesajların token sayılarını mesajlarla hizalı tutan defter.
+
+    - sync(): Sadece yeni eklenen mesajları sayar (artımlı)
+    - trim(): Bütçe aşılıyorsa en eski turları atar, sayıları da aynı anda düşer
+    - total: Oturumun güncel tahmini token toplamı
+    """
+
+    __slots__ = ("tokenizer", "counts", "total")
+
+    def __init__(self, tokenizer: Optional[Tokenizer] = None) -> None:
+        self.tokenizer = tokenizer or get_tokenizer()
+        self.counts: List[int] = []
+        self.total = 0
+
+    def sync(self, messages: list) -> int:
+        """Defteri mesaj listesiyle hizalar; yalnızca yeni mesajlar sayılır"""
+        if len(messages) < len(self.counts):
+            # Liste dışarıdan kısaltılmış (örn. elle temizlik): baştan say
+            self.counts = []
+            self.total = 0
+        for m in messages[len(self.counts):]:
+            c = message_tokens(m, self.tokenizer)
+            self.counts.append(c)
+            self.total += c
+        return self.total
+
+    def trim(self, memory: ConversationBufferMemory, max_tokens: int,
+             max_messages: int = 0) -> List[BaseMessage]:
+        """
+        Sistem mesajını (ve varsa kayan özeti) koruyarak en eski turları bütçeye sığana kadar atar.
+        Son tur her zaman korunur. Atılan mesajları (eskiden yeniye) döndürür.
+        """
+        msgs = memory.chat_memory.messages
+        self.sync(msgs)
+        head = leading_system_count(msgs)
+
+        def over_budget(n_rest: int) -> bool:
+            if max_tokens and self.total > max_tokens:
+                return True
+            return bool(max_messages) and head + n_rest > max_messages
+
+        drop = 0
+        rest = len(msgs) - head
+        # Son kullanıcı+asistan çiftine dokunma
+        while rest - drop > 2 and over_budget(rest - drop):
+            drop += 1
+            self.total -= self.counts[head + drop - 1]
+            # Geçmiş her zaman kullanıcı mesajıyla başlasın (yarım tur bırakma)
+            while rest - drop > 2 and getattr(msgs[head + drop], "type", "") != "human":
+                drop += 1
+                self.total -= self.counts[head + drop - 1]
+
+        if not drop:
+            return []
+        dropped = msgs[head:head + drop]
+        memory.chat_memory.messages = msgs[:head] + msgs[head + drop:]
+        self.counts = self.counts[:head] + self.counts[head + drop:]
+        return dropped
+
+    def set_summary(self, memory: ConversationBufferMemory, text: str) -> None:
+        """Kayan özeti sistem mesajının hemen arkasına yazar (varsa günceller); defteri hizalı tutar"""
+        msgs = memory.chat_memory.messages
+        self.sync(msgs)
+        summary = SystemMessage(content=f"{SUMMARY_PREFIX}{text}", additional_kwargs={SUMMARY_FLAG: True})
+        cost = message_tokens(summary, self.tokenizer)
+        idx = 1 if msgs and getattr(msgs[0], "type", "") == "system" else 0
+        if len(msgs) > idx and is_summary(msgs[idx]):
+            self.total += cost - self.counts[idx]
+            msgs[idx] = summary
+            self.counts[idx] = cost
+        else:
+            msgs.insert(idx, summary)
+            self.counts.insert(idx, cost)
+            self.total += cost
+
+
+# Kayan özet mesajı: ikinci bir SystemMessage olarak işaretlenir ve budamada korunur
+SUMMARY_FLAG = "rolling_summary"
+SUMMARY_PREFIX = "Önceki konuşmanın özeti (klinik bağlam): "
+
+
+def is_summary(message) -> bool:
+    return bool(getattr(message, "additional_kwargs", {}).get(SUMMARY_FLAG))
+
+
+def get_summary(messages: list) -> str:
+    """Hafızadaki kayan özetin metnini döndürür (yoksa boş)"""
+    for m in messages[:2]:
+        if is_summary(m):
+            return m.content[len(SUMMARY_PREFIX):]
+    return ""
+
+
+def leading_system_count(messages: list) -> int:
+    """Budamada korunan baştaki sistem mesajı sayısı (talimat + varsa özet)"""
+    head = 0
+    while head < len(messages) and head < 2 and getattr(messages[head], "type", "") == "system":
+        head += 1
+    return head
+
+
+def build_summary_prompt(previous: str, evicted: List[BaseMessage],
+                         max_tokens: int = MEMORY_SUMMARY_MAX_TOKENS) -> List[BaseMessage]:
+    """Önceki özet + hafızadan atılan turlar → yeni özet isteyen prompt"""
+    lines = []
+    for m in evicted:
+        role = "Danışan" if getattr(m, "type", "") == "human" else "Asistan"
+        lines.append(f"{role}: {m.content}")
+    max_words = max(40, max_tokens * 3 // 4)
+    return [
+        SystemMessage(content=(
+            "Bir sağlık danışmanlığı sohbetinin eski kısmını özetliyorsun. "
+            "Belirtileri ve sürelerini, kullanılan ilaçları, alerjileri, kronik durumları, "
+            "yaşam tarzı bilgilerini ve verilen önemli önerileri koru; selamlaşma ve tekrarları at. "
+            f"Yanıt olarak yalnızca en fazla {max_words} kelimelik, tek paragraf Türkçe özet yaz."
+        )),
+        HumanMessage(content=(
+            f"Önceki özet:\n{previous or '(yok)'}\n\n"
+            f"Özete eklenecek eski mesajlar:\n" + "\n".join(lines)
+        )),
+    ]
+
+
+def clip_summary(text: str, max_tokens: int = MEMORY_SUMMARY_MAX_TOKENS) -> str:
+    """Model sınırı aşarsa özeti kabaca kırp: prompt boyutu sabit kalsın"""
+    text = " ".join(text.split())
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0] + "…"
@@ -8,6 +8,8 @@ Detaylı kullanım için README.md dosyasına bakın.
 
 import requests
 import os
+import time
+import uuid
 from dotenv import load_dotenv
 # API sunucu adresi
 API_URL = "http://127.0.0.1:8000/chat"
@@ -35,6 +37,10 @@ def send_message(name: str, age: int, gender: str, message: str, session_id: str
     - session_id: Opsiyonel oturum kimliği (çoklu sohbet için)
     
     Döner: Sunucunun yanıt metni veya hata mesajı
+
+    Zaman aşımında (sunucunun 504'ü veya istemci zaman aşımı) istek aynı Idempotency-Key
+    ile bir kez tekrarlanır; sunucu tekrarı tanır ve mesaj hafızaya iki kez yazılmaz.
+    Sunucu yoğunsa (503) Retry-After kadar beklenip bir kez daha denenir.
     """
     payload = {
         "name": name,
@@ -45,8 +51,21 @@ def send_message(name: str, age: int, gender: str, message: str, session_id: str
     if session_id:
         payload["session_id"] = session_id
     
+    # Sunucu, istemci zaman aşımından önce vazgeçsin: LLM çağrısı iptal edilir, tur yazılmaz
+    headers = {"Idempotency-Key": uuid.uuid4().hex, "X-Request-Timeout": "28"}
+
     try:
-        response = requests.post(API_URL, json=payload, timeout=30)
+        # Sunucu 28 sn'de 504 döner (tur yazılmaz); istemci zaman aşımı yalnızca ağ takılırsa devreye girer
+        try:
+            response = requests.post(API_URL, json=payload, headers=headers, timeout=30)
+        except requests.exceptions.Timeout:
+            response = None
+        if response is None or response.status_code == 504:
+            response = requests.post(API_URL, json=payload, headers=headers, timeout=30)
+        if response.status_code == 503:
+            wait = min(int(response.headers.get("Retry-After", "1")), 10)
+            time.sleep(wait)
+            response = requests.post(API_URL, json=payload, headers=headers, timeout=30)
         if response.status_code == 200:
             data = response.json()
             return data.get("response", "")
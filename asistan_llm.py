@@ -0,0 +1,52 @@
+"""
+asistan_llm.py — LLM ile konuşma yürütücüsü
+
+ConversationRunner, uygulama boyunca tek örnek olarak yaşayan ve durum tutmayan bir yürütücüdür:
+- Her turda zincir (ConversationChain) kurmaz; prompt doğrudan mesaj listesi olarak hazırlanır
+- Geçmiş (sistem mesajı + özet + turlar) parametre olarak gelir; hafızaya yazmak çağırana aittir
+- Tek seferlik yanıt (arun/run) ve parça parça akış (astream) aynı prompt'u kullanır
+"""
+
+from typing import AsyncIterator, List, Sequence
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage, HumanMessage
+
+
+def message_text(message) -> str:
+    """LLM çıktısının metnini döndürür (parçalı içerikleri birleştirir)"""
+    content = getattr(message, "content", message)
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(p if isinstance(p, str) else str(p.get("text", "")) for p in content)
+    return str(content)
+
+
+class ConversationRunner:
+    """Durumsuz sohbet yürütücüsü: geçmiş + kullanıcı mesajı → LLM yanıtı"""
+
+    __slots__ = ("llm",)
+
+    def __init__(self, llm: BaseChatModel) -> None:
+        self.llm = llm
+
+    @staticmethod
+    def build_messages(history: Sequence[BaseMessage], user_input: str) -> List[BaseMessage]:
+        """Prompt'u doğrudan mesaj listesi olarak kurar (şablon/zincir doğrulaması yok)"""
+        messages = list(history)
+        messages.append(HumanMessage(content=user_input))
+        return messages
+
+    def run(self, history: Sequence[BaseMessage], user_input: str) -> str:
+        return message_text(self.llm.invoke(self.build_messages(history, user_input)))
+
+    async def arun(self, history: Sequence[BaseMessage], user_input: str) -> str:
+        result = await self.llm.ainvoke(self.build_messages(history, user_input))
+        return message_text(result)
+
+    async def astream(self, history: Sequence[BaseMessage], user_input: str) -> AsyncIterator[str]:
+        async for chunk in self.llm.astream(self.build_messages(history, user_input)):
+            text = message_text(chunk)
+            if text:
+                yield text
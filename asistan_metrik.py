@@ -0,0 +1,241 @@
+"""
+asistan_metrik.py — Prometheus metin formatında hafif metrikler
+
+Üretimde açık bırakılabilecek kadar ucuz olacak şekilde tasarlanmıştır:
+- Sayaçlar ve histogramlar düz int/float alanlardır; güncellemeler event loop içinde yapılır,
+  kilit gerekmez (tek iş parçacığı)
+- Histogram kovaları (bucket) tanımda bir kez ayrılır; gözlem = bisect + iki toplama
+- Etiketli seriler ilk kullanımda oluşturulup önbelleğe alınır (sıcak yolda sözlük araması)
+- Mevcut nesnelerin sayaçları (önbellek isabeti, oturum sayısı...) kopyalanmaz: kazıma (scrape)
+  anında geri çağırma (callback) ile okunur
+
+Dış bağımlılık yoktur (prometheus_client gerekmez); /metrics çıktısı standart metin formatıdır.
+"""
+
+import bisect
+import math
+import time
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Varsayılan gecikme kovaları (saniye): milisaniye altı iç işlerden dakikalık LLM çağrılarına
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# İç işlemler (hafıza okuma/budama) için ince kovalar
+FAST_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+                0.005, 0.01, 0.05)
+# Oturum boyutu kovaları (byte)
+SIZE_BUCKETS = (2048, 4096, 8192, 16384, 32768, 65536, 131072, 262144, 524288, 1048576)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values: str):
+        """Etiket değerlerine ait seri (ilk çağrıda oluşturulur, sonra önbellekten döner)"""
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    """Yalnızca artan sayaç (örn. toplam hata)"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.value += amount
+
+    def _samples(self) -> Iterable[str]:
+        for values, child in self._children.items():
+            yield f"{self.name}{_labels(self.labelnames, values)} {_fmt(child.value)}"
+
+
+class Gauge(Counter):
+    """Artıp azalabilen anlık değer (örn. işlenen istek sayısı)"""
+
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._default.value -= amount
+
+    def set(self, value: float) -> None:
+        self._default.value = value
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # son kova: +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    """Sabit kovalı histogram; kova dizisi seri oluşturulurken bir kez ayrılır"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default.observe(value)
+
+    def _samples(self) -> Iterable[str]:
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), child.counts):
+                cumulative += count
+                le = f'le="{_fmt(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, values)} {_fmt(child.sum)}"
+            yield f"{self.name}_count{_labels(self.labelnames, values)} {cumulative}"
+
+
+class GaugeCallback(_Metric):
+    """Değeri kazıma anında hesaplanan ölçü: fn() → [(etiket değerleri, değer), ...]"""
+
+    def __init__(self, name: str, documentation: str, fn: Callable[[], Iterable[Tuple[Sequence[str], float]]],
+                 labelnames: Sequence[str] = (), kind: str = "gauge") -> None:
+        super().__init__(name, documentation, labelnames)
+        self.fn = fn
+        self.kind = kind
+
+    def _samples(self) -> Iterable[str]:
+        for values, value in self.fn():
+            yield f"{self.name}{_labels(self.labelnames, values)} {_fmt(value)}"
+
+
+class Registry:
+    """Metriklerin kaydı ve metin çıktısı"""
+
+    def __init__(self) -> None:
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name: str, documentation: str, fn, labelnames: Sequence[str] = (),
+                 kind: str = "gauge") -> GaugeCallback:
+        return self.register(GaugeCallback(name, documentation, fn, labelnames, kind))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as exc:  # tek bir geri çağırmanın hatası tüm çıktıyı bozmasın
+                lines.append(f"# {metric.name} render failed: {type(exc).__name__}")
+        return "\n".join(lines) + "\n"
+
+
+class Timed:
+    """
+    Süre ölçer bağlam yöneticisi: 'with Timed(hist):' (async kodda await'i sarabilir).
+    in_flight verilirse süre boyunca artırılır; errors verilirse hata türüne göre sayılır.
+    """
+
+    __slots__ = ("hist", "in_flight", "errors", "start")
+
+    def __init__(self, hist: _HistogramChild, in_flight: _Value = None, errors: Counter = None) -> None:
+        self.hist = hist
+        self.in_flight = in_flight
+        self.errors = errors
+
+    def __enter__(self) -> "Timed":
+        if self.in_flight is not None:
+            self.in_flight.value += 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.hist.observe(time.perf_counter() - self.start)
+        if self.in_flight is not None:
+            self.in_flight.value -= 1
+        # İptal (istemci ayrıldı) hata sayılmaz: yalnızca Exception türleri
+        if exc_type is not None and self.errors is not None and issubclass(exc_type, Exception):
+            self.errors.labels(exc_type.__name__).inc()
@@ -0,0 +1,385 @@
+"""
+asistan_onbellek.py — İlk tur yanıt önbelleği
+
+Hızlı başlat çiplerindeki sorular ("Başım ağrıyor; ne yapmalıyım?" vb.) en sık gelen ilk
+mesajlardır ve ilk turda yanıt yalnızca cinsiyet + yaş grubuna bağlıdır. Bu yüzden:
+- Anahtar: (normalize edilmiş mesaj, cinsiyet, yaş grubu)
+- Değer: İsim/yaş yer tutucuya çevrilmiş yanıt şablonu; sunarken kullanıcının adı yerleştirilir
+- TTL ve kayıt/byte sınırı olan LRU; isabet/ıskalama sayaçları tutulur
+
+Aynı anda gelen özdeş istekler için SingleFlight: yalnızca biri LLM'e gider, diğerleri
+aynı sonucu bekler (popüler çiplerde trafik patlamalarında tekrar eden çağrıları keser).
+
+Opsiyonel anlamsal önbellek (SemanticCache), aynı sorunun farklı yazımlarını
+("başım ağrıyor", "baş ağrım var ne yapayım") yakalar. Dış servis/model gerektirmez:
+hash'lenmiş karakter n-gram gömmeleri ve profil grubu başına ters indeks kullanılır.
+"""
+
+import re
+import sys
+import math
+import time
+import zlib
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+# Yanıt şablonundaki yer tutucular
+NAME_TOKEN = "\x00AD\x00"
+AGE_TOKEN = "\x00YAS\x00"
+
+# Hızlı başlat çip soruları (streamlit_ui.py içindeki chip_data ile aynı tutulmalı).
+# API önbelleğin kapsamını, asistan_bench.py yük senaryolarını bunlardan kurar.
+CHIP_PROMPTS = (
+    "Başım ağrıyor; ne yapmalıyım?",
+    "Ateşim var; evde neler yapabilirim?",
+    "Mide bulantım var; önerin nedir?",
+    "Boğazım ağrıyor; nasıl rahatlarım?",
+    "Öksürüyorum; ne önerirsin?",
+    "Kas ağrılarım var; nasıl hafifletebilirim?",
+    "Sürekli yorgun hissediyorum; önerin?",
+    "Uyuyamıyorum; tavsiyen ne?",
+    "Karın ağrım var; doktora gitmeli miyim?",
+    "Belim ağrıyor; neler iyi gelir?",
+    "Alerji belirtilerim var; evde ne yapabilirim?",
+    "Soğuk algınlığı yaşıyorum; nasıl toparlanırım?",
+)
+
+_TR_UPPER = str.maketrans({"İ": "i", "I": "ı"})
+# Aksan katlama (ş→s, ğ→g ...): yazarken Türkçe karakter kullanmayanlarla eşleşmek için
+_ASCII_FOLD = str.maketrans("çğıöşüâîû", "cgiosuaiu")
+_PUNCT = re.compile(r"[^\w\s]", re.UNICODE)
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Türkçe'ye uygun küçük harf, noktalama temizliği ve boşluk sadeleştirme"""
+    text = text.translate(_TR_UPPER).lower()
+    text = _PUNCT.sub(" ", text)
+    return _SPACES.sub(" ", text).strip()
+
+
+def fold_text(text: str) -> str:
+    """normalize_text + aksan katlama: büyük/küçük harf ve aksandan bağımsız karşılaştırma için"""
+    return normalize_text(text).translate(_ASCII_FOLD)
+
+
+# Şablona çevrilebilecek en kısa isim: "Su", "Ay" gibi isimler sıradan kelimelerle çakışır
+MIN_TEMPLATE_NAME_CHARS = 3
+
+
+def to_template(reply: str, name: str, age: int) -> Optional[str]:
+    """
+    Yanıttaki kişiye özel kısımları yer tutucuya çevirir; güvenli değilse None döner.
+    İsim yalnızca tam kelime olarak değiştirilir ("Can" → "Canım", "Cana" değişmez). İsim
+    yanıtta sıradan kelime olarak da geçiyorsa ("Deniz" / "deniz suyu") şablon başka
+    kullanıcılara yanlış isim taşıyacağı için önbelleğe alınmaz.
+    """
+    name = name.strip()
+    if len(name) < MIN_TEMPLATE_NAME_CHARS:
+        return None
+    word = re.compile(rf"(?<!\w){re.escape(name)}(?!\w)")
+    folded = re.compile(rf"(?<!\w){re.escape(fold_text(name))}(?!\w)")
+    if len(folded.findall(fold_text(reply))) != len(word.findall(reply)):
+        return None  # isim büyük/küçük harf veya aksan farkıyla sıradan kelime olarak da geçiyor
+    template = word.sub(NAME_TOKEN, reply)
+    return re.sub(rf"(?<!\d){age} yaş", f"{AGE_TOKEN} yaş", template)
+
+
+def render_template(template: str, name: str, age: int) -> str:
+    """Şablona kullanıcının adını ve yaşını yerleştirir"""
+    return template.replace(NAME_TOKEN, name.strip()).replace(AGE_TOKEN, str(age))
+
+
+class ResponseCache:
+    """
+    TTL'li, kayıt ve byte sınırlı LRU yanıt önbelleği.
+
+    Parametreler:
+    - max_entries: En fazla kayıt sayısı
+    - max_bytes: Değerlerin yaklaşık toplam boyut sınırı
+    - ttl_seconds: Kaydın geçerlilik süresi (0 = süresiz)
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Hashable, Tuple[float, str]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """İsabet sayaçlarını etkilemeden geçerli kayıt var mı kontrol eder"""
+        item = self._data.get(key)
+        return item is not None and not (
+            self.ttl_seconds and time.monotonic() - item[0] > self.ttl_seconds
+        )
+
+    @property
+    def total_bytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: Hashable, allow_stale: bool = False) -> Optional[str]:
+        """
+        Geçerli kaydı döndürür. Süresi dolan kayıt hemen silinmez (LRU sınırıyla çıkar):
+        sağlayıcıya ulaşılamazken allow_stale=True ile bayat yanıt olarak sunulabilir.
+        """
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        stored_at, value = item
+        if not allow_stale and self.ttl_seconds and time.monotonic() - stored_at > self.ttl_seconds:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: str) -> None:
+        if key in self._data:
+            self._pop(key)
+        size = sys.getsizeof(value)
+        if size > self.max_bytes:
+            return
+        self._data[key] = (time.monotonic(), value)
+        self._bytes += size
+        while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+            self._pop(next(iter(self._data)))
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._bytes = 0
+
+    def _pop(self, key: Hashable) -> None:
+        _, value = self._data.pop(key)
+        self._bytes -= sys.getsizeof(value)
+
+
+class SingleFlight:
+    """
+    Özdeş anahtarlı eşzamanlı çağrıları tek bir uçuşta birleştirir.
+
+    - İlk gelen çağrı işi ayrı bir görev olarak başlatır; sonrakiler aynı görevi bekler
+    - Bekleyenlerden biri iptal edilirse (istemci gitti) diğerleri etkilenmez
+    - Bekleyen kalmazsa iş iptal edilir (boşuna LLM kotası harcanmaz)
+    """
+
+    def __init__(self) -> None:
+        self._flights: Dict[Hashable, list] = {}  # anahtar → [görev, bekleyen sayısı]
+        self.leaders = 0
+        self.shared = 0
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._flights
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """fn() sonucunu döndürür; ikinci değer sonucun başka bir çağrıdan paylaşılıp paylaşılmadığıdır"""
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if shared:
+            self.shared += 1
+        else:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            flight = self._flights[key] = [task, 0]
+            task.add_done_callback(lambda _t, k=key, f=flight: self._done(k, f))
+        flight[1] += 1
+        try:
+            return await asyncio.shield(flight[0]), shared
+        finally:
+            flight[1] -= 1
+            if flight[1] == 0 and not flight[0].done():
+                flight[0].cancel()
+
+    def _done(self, key: Hashable, flight: list) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        task = flight[0]
+        if not task.cancelled():
+            task.exception()  # bekleyen kalmadıysa "never retrieved" uyarısını önle
+
+
+class IdempotencyConflictError(Exception):
+    """Aynı idempotency anahtarı farklı içerikli bir istekle kullanıldı"""
+
+
+class IdempotencyStore:
+    """
+    Idempotency anahtarı → sonuç deposu (TTL + kayıt sınırlı LRU).
+
+    - İlk istek işi ayrı bir görev olarak başlatır; istemci bağlantıyı koparsa iş sürer
+    - Süre içinde gelen tekrar, iş sürüyorsa ona bağlanır, bittiyse saklanan sonucu alır
+    - Başarısız işler saklanmaz: tekrar deneme işi yeniden çalıştırır
+    - Anahtar farklı içerikle tekrar kullanılırsa IdempotencyConflictError fırlatılır
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # anahtar → (oluşturma zamanı, içerik parmak izi, görev)
+        self._entries: "OrderedDict[Hashable, Tuple[float, str, asyncio.Future]]" = OrderedDict()
+        self.replays = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def run(self, key: Hashable, fingerprint: str,
+                  fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """fn() sonucunu döndürür; ikinci değer sonucun tekrar (replay) olup olmadığıdır"""
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and self.ttl_seconds and now - entry[0] > self.ttl_seconds:
+            del self._entries[key]
+            entry = None
+        if entry is not None:
+            if entry[1] != fingerprint:
+                raise IdempotencyConflictError(key)
+            self.replays += 1
+            return await asyncio.shield(entry[2]), True
+
+        task = asyncio.ensure_future(fn())
+        self._entries[key] = (now, fingerprint, task)
+        task.add_done_callback(lambda t, k=key: self._settle(k, t))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return await asyncio.shield(task), False
+
+    def discard(self, key: Hashable) -> None:
+        """Saklanan sonucu unutur (örn. geçici yedek yanıt): sonraki tekrar işi yeniden çalıştırır"""
+        self._entries.pop(key, None)
+
+    def _settle(self, key: Hashable, task: asyncio.Future) -> None:
+        # Hata/iptal sonucu saklanmaz: aynı anahtarla tekrar deneme işi yeniden çalıştırır
+        if task.cancelled() or task.exception() is not None:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is task:
+                del self._entries[key]
+
+
+# ---------------------------------------------------------------------------
+# Anlamsal önbellek: hash'lenmiş karakter n-gram gömmeleri
+# ---------------------------------------------------------------------------
+
+# Anlam taşımayan soru kalıpları ve bağlaçlar (gömmeye katılmaz)
+_STOPWORDS = frozenset({
+    "ne", "neler", "nedir", "var", "mi", "mı", "mu", "mü", "ve", "ile", "bir", "bu", "çok",
+    "da", "de", "ki", "için", "nasıl", "ben", "benim", "evde", "iyi", "gelir", "olur",
+    "lazım", "gerek", "yapmalıyım", "yapayım", "yapabilirim", "önerin", "önerirsin",
+    "tavsiyen", "tavsiye", "öneri", "lütfen",
+})
+# Çok sık geçen kökler (örn. "ağrı"): ayırt edici değil, ağırlığı düşürülür
+_COMMON_STEMS = frozenset({"agr", "sur", "his"})
+_EMBED_DIM = 1 << 18
+
+SparseVector = Dict[int, float]
+
+
+def _feature_id(feature: str) -> int:
+    return zlib.crc32(feature.encode("utf-8")) % _EMBED_DIM
+
+
+def embed_text(text: str) -> SparseVector:
+    """
+    Hafif yerel gömme: kelime başına 3 harflik kök + sınır işaretli karakter 3-gram'ları.
+    Aksan katlanır (ş→s, ğ→g ...), sonuç L2-normalize seyrek vektördür.
+    """
+    vec: SparseVector = {}
+    for word in normalize_text(text).split():
+        if word in _STOPWORDS:
+            continue
+        w = word.translate(_ASCII_FOLD)
+        weight = 0.35 if w[:3] in _COMMON_STEMS else 1.0
+        fid = _feature_id("s:" + w[:3])
+        vec[fid] = vec.get(fid, 0.0) + weight
+        padded = f"<{w}>"
+        for i in range(len(padded) - 2):
+            fid = _feature_id(padded[i:i + 3])
+            vec[fid] = vec.get(fid, 0.0) + 0.25 * weight
+    norm = math.sqrt(sum(x * x for x in vec.values()))
+    if not norm:
+        return {}
+    return {k: x / norm for k, x in vec.items()}
+
+
+class SemanticCache:
+    """
+    Profil grubu başına ters indeksli, kosinüs benzerliği eşikli yanıt önbelleği.
+
+    Parametreler:
+    - threshold: Bu benzerliğin altındaki en iyi eşleşme ıskalama sayılır
+    - max_entries: Toplam kayıt sınırı (LRU ile tahliye)
+    - ttl_seconds: Kaydın geçerlilik süresi (0 = süresiz)
+    """
+
+    def __init__(self, threshold: float, max_entries: int, ttl_seconds: float) -> None:
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # kayıt no → (grup, vektör, şablon, kayıt zamanı)
+        self._entries: "OrderedDict[int, Tuple[Hashable, SparseVector, str, float]]" = OrderedDict()
+        # (grup, özellik) → {kayıt no: ağırlık}
+        self._postings: Dict[Tuple[Hashable, int], Dict[int, float]] = {}
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, group: Hashable, text: str) -> Optional[Tuple[str, float]]:
+        """En benzer kaydın şablonunu ve benzerliğini döndürür; eşik altıysa None"""
+        vec = embed_text(text)
+        scores: Dict[int, float] = {}
+        for fid, weight in vec.items():
+            posting = self._postings.get((group, fid))
+            if not posting:
+                continue
+            for entry_id, w in posting.items():
+                scores[entry_id] = scores.get(entry_id, 0.0) + weight * w
+        best_id, best = None, 0.0
+        for entry_id, score in scores.items():
+            if score > best:
+                best_id, best = entry_id, score
+        if best_id is None or best < self.threshold:
+            self.misses += 1
+            return None
+        _, _, template, stored_at = self._entries[best_id]
+        if self.ttl_seconds and time.monotonic() - stored_at > self.ttl_seconds:
+            self._remove(best_id)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(best_id)
+        self.hits += 1
+        return template, best
+
+    def add(self, group: Hashable, text: str, template: str) -> None:
+        vec = embed_text(text)
+        if not vec:
+            return
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = (group, vec, template, time.monotonic())
+        for fid, weight in vec.items():
+            self._postings.setdefault((group, fid), {})[entry_id] = weight
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, entry_id: int) -> None:
+        group, vec, _, _ = self._entries.pop(entry_id)
+        for fid in vec:
+            posting = self._postings.get((group, fid))
+            if posting is not None:
+                posting.pop(entry_id, None)
+                if not posting:
+                    del self._postings[(group, fid)]
+        self.evictions += 1
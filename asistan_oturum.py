@@ -0,0 +1,447 @@
+"""
+asistan_oturum.py — Sınırlı ve kendini temizleyen oturum deposu
+
+API'deki kullanıcı/oturum hafızalarını tutar. Sözlük sınırsız büyümez:
+- LRU: Kapasite dolunca en uzun süredir kullanılmayan oturum atılır
+- TTL: Belirli süre boyunca dokunulmayan oturumlar temizlenir
+- Oturum sayısı ve yaklaşık bellek (byte) için sert üst sınır vardır
+- Arka planda çalışan bir temizlikçi (janitor) süresi dolanları periyodik olarak siler
+- SessionLocks: Aynı oturuma gelen eşzamanlı istekleri sıraya sokar (hafıza bozulmasın)
+- Opsiyonel kalıcı arka uç (asistan_depo.py): oturumlar ilk erişimde tembel yüklenir,
+  değişenler periyodik olarak toplu yazılır; kapasiteden atılan oturum diskte kalır
+
+Not: Depo event loop içinden kullanılmak üzere tasarlanmıştır (kilit gerektirmez).
+"""
+
+import sys
+import time
+import asyncio
+import logging
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from langchain.memory import ConversationBufferMemory
+from langchain_core.messages import BaseMessage
+
+from asistan_depo import MemoryBackend, SessionRecord, dump_messages, load_messages
+from asistan_hafiza import TokenLedger
+from asistan_talimat import is_shared_text
+
+logger = logging.getLogger("doctor-assistant-api")
+
+# Mesaj nesnesi başına (içerik hariç) yaklaşık sabit maliyet: pydantic nesnesi + alanlar
+MESSAGE_OVERHEAD_BYTES = 400
+# Oturum başına sabit maliyet: bellek nesnesi, sözlük girdisi, anahtar
+SESSION_OVERHEAD_BYTES = 1200
+
+
+def estimate_memory_bytes(memory: ConversationBufferMemory) -> int:
+    """
+    Hafızadaki mesajların yaklaşık RAM maliyetini hesaplar (içerik + nesne yükü).
+    Profil tablosundan paylaşılan sistem gövdesi oturuma ait sayılmaz.
+    """
+    total = SESSION_OVERHEAD_BYTES
+    for m in memory.chat_memory.messages:
+        content = getattr(m, "content", "")
+        total += MESSAGE_OVERHEAD_BYTES + sys.getsizeof(content)
+        if isinstance(content, list):
+            total += sum(sys.getsizeof(p) for p in content if not is_shared_text(p))
+    return total
+
+
+@dataclass
+class Session:
+    """Tek bir kullanıcı/oturuma ait hafıza ve muhasebe bilgileri"""
+    memory: ConversationBufferMemory
+    tokens: TokenLedger = field(default_factory=TokenLedger)
+    created_at: float = field(default_factory=time.monotonic)
+    last_access: float = field(default_factory=time.monotonic)
+    approx_bytes: int = SESSION_OVERHEAD_BYTES
+    # Özet modu: budamada atılıp henüz özete katlanmamış mesajlar
+    pending_summary: List[BaseMessage] = field(default_factory=list)
+    summarizing: bool = False
+    # Kalıcı kaydın sürümü (son yükleme/yazma); başka worker'ın yazdığını anlamak için
+    version: int = 0
+
+
+def session_key_for(name: str, session_id: Optional[str]) -> Optional[str]:
+    """Hafıza anahtarı: name + session_id (session_id yoksa None)"""
+    sess = (session_id or "").strip()
+    return f"{name.strip().lower()}:{sess}" if sess else None
+
+
+def session_to_record(sess: Session) -> SessionRecord:
+    """Oturumu arka uca yazılacak kayda çevirir ve sürümünü ilerletir"""
+    sess.version = max(time.time_ns(), sess.version + 1)
+    return {
+        "messages": dump_messages(sess.memory.chat_memory.messages),
+        "pending_summary": dump_messages(sess.pending_summary),
+        "updated_at": time.time(),
+        "version": sess.version,
+    }
+
+
+def session_from_record(record: SessionRecord) -> Session:
+    """Arka uçtan okunan kayıttan oturum kurar (token defteri yeniden sayılır)"""
+    memory = ConversationBufferMemory(return_messages=True)
+    memory.chat_memory.messages = load_messages(record["messages"])
+    sess = Session(
+        memory=memory,
+        pending_summary=load_messages(record.get("pending_summary", [])),
+        version=record.get("version", 0),
+    )
+    sess.tokens.sync(memory.chat_memory.messages)
+    sess.approx_bytes = estimate_memory_bytes(memory)
+    return sess
+
+
+class SessionStore:
+    """
+    LRU + TTL tahliyeli, sayı ve byte sınırlı oturum deposu.
+
+    Parametreler:
+    - max_sessions: Aynı anda bellekte tutulabilecek en fazla oturum sayısı
+    - max_bytes: Bellekteki oturumların yaklaşık toplam bellek üst sınırı
+    - ttl_seconds: Bu süre boyunca erişilmeyen oturum silinir (0 = kapalı)
+    - backend: Kalıcı arka uç (varsayılan MemoryBackend: kalıcılık yok)
+    - revalidate: Birden çok worker aynı arka ucu paylaşıyorsa, bellekteki oturumun
+      başka bir worker tarafından güncellenip güncellenmediğini her erişimde kontrol et
+    - in_use: Anahtarın turu sürüyor mu (ör. SessionLocks.busy); sürüyorsa kapasite tahliyesi
+      o oturumu atlar, aksi halde tur sonunda hafızaya yazılanlar kaybolurdu. Sınır bu sırada
+      geçici olarak aşılabilir; tur bitince sonraki tahliyelerle geri iner
+    """
+
+    def __init__(self, max_sessions: int, max_bytes: int, ttl_seconds: float,
+                 backend=None, revalidate: bool = False,
+                 in_use: Optional[Callable[[str], bool]] = None) -> None:
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.backend = backend or MemoryBackend()
+        self.revalidate = revalidate and self.backend.persistent
+        self.in_use = in_use or (lambda key: False)
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._total_bytes = 0
+        # Kalıcılık: değişen anahtarlar ve yazılmayı bekleyen kayıtlar (None: sil)
+        self._dirty: set = set()
+        self._pending: Dict[str, Optional[SessionRecord]] = {}
+        self._flushing: Dict[str, Optional[SessionRecord]] = {}
+        self.evictions = 0
+        self.hydrations = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._sessions
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def items(self) -> Iterator[Tuple[str, Session]]:
+        return iter(list(self._sessions.items()))
+
+    def get(self, key: str) -> Optional[Session]:
+        """
+        Oturumu döndürür ve LRU sırasında en sona taşır; süresi dolmuşsa siler.
+        Bellekte yoksa arka uçtan yüklenir (tembel yükleme).
+        """
+        sess = self._sessions.get(key)
+        if sess is None:
+            return self._hydrate(key)
+        now = time.monotonic()
+        if self.ttl_seconds and now - sess.last_access > self.ttl_seconds:
+            self._remove(key, persist=False)
+            return None
+        if self.revalidate and self._is_stale(key, sess):
+            self._remove(key, persist=False, forget=False)
+            return self._hydrate(key)
+        sess.last_access = now
+        self._sessions.move_to_end(key)
+        return sess
+
+    def get_or_create(self, key: str, factory: Callable[[], ConversationBufferMemory]) -> Session:
+        """Varsa oturumu getirir, yoksa oluşturup sınırları uygular"""
+        sess = self.get(key)
+        if sess is not None:
+            return sess
+        sess = Session(memory=factory())
+        self._insert(key, sess)
+        return sess
+
+    def update_size(self, key: str) -> None:
+        """
+        Tur sonunda oturumun byte tahminini yeniler ve byte sınırını uygular.
+        Kalıcı arka uç varsa oturum bir sonraki toplu yazmaya eklenir.
+        """
+        sess = self._sessions.get(key)
+        if sess is None:
+            return
+        new_size = estimate_memory_bytes(sess.memory)
+        self._total_bytes += new_size - sess.approx_bytes
+        sess.approx_bytes = new_size
+        if self.backend.persistent:
+            self._dirty.add(key)
+        self._enforce_limits(protect=key)
+
+    def delete(self, key: str) -> bool:
+        if key not in self._sessions:
+            if self._lookup_record(key) is None:
+                return False
+            self._pending[key] = None
+            return True
+        self._remove(key, persist=False)
+        return True
+
+    def evict_expired(self) -> int:
+        """Süresi dolan oturumları siler; silinen sayıyı döndürür"""
+        if not self.ttl_seconds:
+            return 0
+        cutoff = time.monotonic() - self.ttl_seconds
+        removed = 0
+        # OrderedDict LRU sırasında: en eski başta, ilk taze oturumda dur
+        while self._sessions:
+            key, sess = next(iter(self._sessions.items()))
+            if sess.last_access > cutoff:
+                break
+            self._remove(key, persist=False)
+            removed += 1
+        return removed
+
+    # --- Kalıcılık ---------------------------------------------------------
+
+    def take_batch(self) -> Dict[str, Optional[SessionRecord]]:
+        """
+        Yazılmayı bekleyen kayıtları toplar (event loop'ta çağrılır; kayıtlar burada
+        serileştirilir). Dönen toplu iş write_batch ile executor'da yazılmalıdır.
+        """
+        for key in self._dirty:
+            sess = self._sessions.get(key)
+            if sess is not None:
+                self._pending[key] = session_to_record(sess)
+        self._dirty.clear()
+        batch, self._pending = self._pending, {}
+        self._flushing = batch
+        return batch
+
+    def batch_written(self, ok: bool = True) -> None:
+        """Toplu yazma bitti: okuma yolunda artık arka uca bakılabilir. Hata varsa tekrar kuyruğa al"""
+        if not ok:
+            for key, rec in self._flushing.items():
+                self._pending.setdefault(key, rec)
+        self._flushing = {}
+
+    def flush(self) -> int:
+        """Bekleyen her şeyi senkron yazar (kapanışta); yazılan kayıt sayısını döndürür"""
+        batch = self.take_batch()
+        try:
+            self.backend.write_batch(batch)
+        except BaseException:
+            self.batch_written(ok=False)
+            raise
+        self.batch_written()
+        return len(batch)
+
+    def _lookup_record(self, key: str) -> Optional[SessionRecord]:
+        # Henüz diske ulaşmamış yazmalar öncelikli (tahliye edilmiş ama yazılmamış oturum)
+        for pending in (self._pending, self._flushing):
+            if key in pending:
+                return pending[key]
+        return self.backend.load(key)
+
+    def _hydrate(self, key: str) -> Optional[Session]:
+        if not self.backend.persistent:
+            return None
+        record = self._lookup_record(key)
+        if record is None:
+            return None
+        if self.ttl_seconds and time.time() - record["updated_at"] > self.ttl_seconds:
+            self._pending[key] = None
+            return None
+        sess = session_from_record(record)
+        self._insert(key, sess)
+        self.hydrations += 1
+        return sess
+
+    def _is_stale(self, key: str, sess: Session) -> bool:
+        # Kendi yazmamız henüz diskte değilse diskteki sürüm eski kalır: yeniden yükleme
+        if key in self._dirty or key in self._pending or key in self._flushing:
+            return False
+        version = self.backend.version(key)
+        if version is None:
+            # Diske yazılmış oturumun kaydı yok: başka bir worker silmiş
+            return sess.version > 0
+        return version > sess.version
+
+    def _insert(self, key: str, sess: Session) -> None:
+        self._sessions[key] = sess
+        self._total_bytes += sess.approx_bytes
+        self._enforce_limits(protect=key)
+
+    def _remove(self, key: str, persist: bool = True, forget: bool = True) -> None:
+        """
+        Oturumu bellekten çıkarır.
+        persist=True: kapasite tahliyesi; değişmişse diske yazılmak üzere kaydedilir.
+        persist=False ve forget=True: oturum tamamen silinir (TTL, açık silme).
+        """
+        sess = self._sessions.pop(key)
+        self._total_bytes -= sess.approx_bytes
+        self.evictions += 1
+        if not self.backend.persistent:
+            return
+        if persist:
+            if key in self._dirty:
+                self._pending[key] = session_to_record(sess)
+        elif forget:
+            self._pending[key] = None
+        self._dirty.discard(key)
+
+    def _enforce_limits(self, protect: Optional[str] = None) -> None:
+        """
+        Sayı ve byte sınırları aşıldıkça en eski (LRU) oturumları at; aktif oturuma ve turu
+        süren oturumlara dokunma (yalnızca onlar kaldıysa sınır geçici olarak aşılır)
+        """
+        count, size = len(self._sessions), self._total_bytes
+        victims = []
+        for key, sess in self._sessions.items():
+            if count <= self.max_sessions and size <= self.max_bytes:
+                break
+            if key == protect or self.in_use(key):
+                continue
+            victims.append(key)
+            count -= 1
+            size -= sess.approx_bytes
+        for key in victims:
+            self._remove(key)
+
+
+class SessionBusyError(Exception):
+    """Oturumun bekleme kuyruğu dolu: istek hızlıca reddedilmeli (HTTP 409)"""
+
+
+class _KeyLock:
+    """Tek bir oturum anahtarının kilidi ve (çalışan + bekleyen) istek sayısı"""
+    __slots__ = ("lock", "pending", "__weakref__")
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.pending = 0
+
+
+class _Reservation:
+    """
+    Kuyrukta ayrılmış yer: 'async with' ile kilidi alır, çıkışta bırakır. Hiç girilmeyecekse
+    (ör. akış başlamadan istemci ayrıldı) cancel() ile bırakılmalıdır; aksi halde bekleyen sayısı
+    düşmez ve oturum yersiz 409 döner
+    """
+    __slots__ = ("_entry", "_entered", "_released")
+
+    def __init__(self, entry: _KeyLock) -> None:
+        self._entry = entry
+        self._entered = False
+        self._released = False
+
+    async def __aenter__(self) -> "_Reservation":
+        self._entered = True
+        try:
+            await self._entry.lock.acquire()
+        except BaseException:
+            self._release(locked=False)
+            raise
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._release(locked=True)
+
+    def cancel(self) -> None:
+        """Girilmemiş ayrımı bırakır; girilmiş (veya bırakılmış) ayrımda etkisizdir"""
+        if not self._entered:
+            self._release(locked=False)
+
+    def _release(self, locked: bool) -> None:
+        if self._released:
+            return
+        self._released = True
+        self._entry.pending -= 1
+        if locked:
+            self._entry.lock.release()
+
+
+class SessionLocks:
+    """
+    Oturum başına async kilit tablosu.
+
+    Kilitler zayıf referansla tutulur: kullanan istek kalmayınca tablodan kendiliğinden düşer
+    (oturum sayısı kadar kilit birikmez). Bir oturumda işlenen istek varken en fazla
+    max_queue istek bekleyebilir; fazlası SessionBusyError ile hemen reddedilir.
+    Öncelikli (acil) istekler kuyruk sınırına takılmaz.
+    """
+
+    def __init__(self, max_queue: int) -> None:
+        self.max_queue = max_queue
+        self._locks: "weakref.WeakValueDictionary[str, _KeyLock]" = weakref.WeakValueDictionary()
+        self.rejected = 0
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    def busy(self, key: str) -> bool:
+        """Anahtarda işlenen veya bekleyen istek var mı"""
+        entry = self._locks.get(key)
+        return entry is not None and entry.pending > 0
+
+    def reserve(self, key: str, priority: bool = False) -> _Reservation:
+        """Kuyrukta yer ayırır (beklemeden); kuyruk doluysa SessionBusyError fırlatır"""
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = _KeyLock()
+            self._locks[key] = entry
+        if not priority and entry.pending > self.max_queue:
+            self.rejected += 1
+            raise SessionBusyError(key)
+        entry.pending += 1
+        return _Reservation(entry)
+
+
+async def run_janitor(store: SessionStore, interval: float) -> None:
+    """Süresi dolan oturumları periyodik olarak temizleyen arka plan görevi"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            removed = store.evict_expired()
+            if store.backend.persistent:
+                removed += await loop.run_in_executor(
+                    None, store.backend.purge_expired, store.ttl_seconds
+                )
+            if removed:
+                logger.info(
+                    "janitor evicted=%s sessions=%s approx_bytes=%s",
+                    removed, len(store), store.total_bytes,
+                )
+        except Exception as exc:  # temizlikçi asla ölmemeli
+            logger.exception("janitor failed: %s", exc)
+
+
+async def run_flusher(store: SessionStore, interval: float) -> None:
+    """Değişen oturumları periyodik olarak tek işlemde arka uca yazan görev"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        batch = store.take_batch()
+        ok = True
+        try:
+            if batch:
+                await loop.run_in_executor(None, store.backend.write_batch, batch)
+        except asyncio.CancelledError:
+            # Kapanış: kalan yazmalar lifespan'deki son flush() ile yapılır
+            ok = False
+            raise
+        except Exception as exc:  # yazılamayan kayıtlar bir sonraki turda tekrar denenir
+            ok = False
+            logger.exception("session flush failed: %s", exc)
+        finally:
+            store.batch_written(ok)
@@ -0,0 +1,204 @@
+"""
+asistan_profil.py — İsteğe bağlı istek profili (JSON span'ler / collapsed stack)
+
+Gecikme arttığında sürenin nereye gittiğini görmek için:
+- Örneklenen isteklerde (PROFILE_SAMPLE_RATE oranı veya X-Debug-Profile başlığı) bir iz (trace)
+  açılır; kod içindeki span("...") blokları bu ize süre kaydı ekler
+- Son N iz bellekte tutulur; admin endpoint'i JSON span ya da flamegraph uyumlu
+  collapsed stack ("request;llm 41230") olarak döndürür
+- Kapalıyken ara katman (middleware) hiç eklenmez; span() yalnızca bir ContextVar okuması yapar
+  ve paylaşılan boş bağlamı döndürür
+
+İz, contextvars ile isteğin görevlerine (akış gövdesi, arka plan özeti dahil) taşınır. Açık
+span'in yolu da bir ContextVar'dadır: her asyncio görevi kendi kopyasını görür, aynı istekte
+eşzamanlı çalışan görevler (ör. /chat/batch öğeleri) birbirinin span'ine iç içe yazılmaz.
+"""
+
+import random
+import time
+import uuid
+from collections import deque
+from contextvars import ContextVar
+from typing import Deque, Dict, List, Optional
+
+_current: "ContextVar[Optional[Trace]]" = ContextVar("doctor_trace", default=None)
+# Açık span'in yolu ("POST /chat;llm"); None → izin kökü
+_path: "ContextVar[Optional[str]]" = ContextVar("doctor_span_path", default=None)
+
+
+class Trace:
+    """Tek bir isteğin izi: başlangıca göre göreli span'ler (ms)"""
+
+    __slots__ = ("id", "name", "start", "start_wall", "duration_ms", "spans", "meta")
+
+    def __init__(self, name: str) -> None:
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.start = time.perf_counter()
+        self.start_wall = time.time()
+        self.duration_ms: Optional[float] = None
+        self.spans: List[Dict[str, object]] = []
+        self.meta: Dict[str, object] = {}
+
+    def finish(self) -> None:
+        self.duration_ms = round((time.perf_counter() - self.start) * 1000, 3)
+
+    def to_json(self) -> Dict[str, object]:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "started_at": self.start_wall,
+            "duration_ms": self.duration_ms,
+            "meta": self.meta,
+            "spans": self.spans,
+        }
+
+    def collapsed(self) -> List[str]:
+        """Flamegraph formatı: 'yol;alt_yol öz_süre_µs' (öz süre = alt span'ler hariç)"""
+        totals: Dict[str, float] = {}
+        for s in self.spans:
+            totals[s["path"]] = totals.get(s["path"], 0.0) + s["duration_ms"]
+        children: Dict[str, float] = {}
+        for path, total in totals.items():
+            parent = path.rsplit(";", 1)[0]
+            children[parent] = children.get(parent, 0.0) + total
+
+        def us(ms: float) -> int:
+            return max(0, int(ms * 1000))
+
+        lines = [f"{self.name} {us((self.duration_ms or 0.0) - children.get(self.name, 0.0))}"]
+        lines += [f"{path} {us(total - children.get(path, 0.0))}" for path, total in totals.items()]
+        return lines
+
+
+class _Span:
+    __slots__ = ("trace", "name", "start", "path", "parent")
+
+    def __init__(self, trace: Trace, name: str) -> None:
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self) -> "_Span":
+        self.parent = _path.get()
+        self.path = f"{self.parent or self.trace.name};{self.name}"
+        _path.set(self.path)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        end = time.perf_counter()
+        trace = self.trace
+        # Token yerine üst yol geri yazılır: çıkış başka bir Context'te olsa da hata vermez
+        _path.set(self.parent)
+        span = {
+            "name": self.name,
+            "path": self.path,
+            "offset_ms": round((self.start - trace.start) * 1000, 3),
+            "duration_ms": round((end - self.start) * 1000, 3),
+        }
+        if exc_type is not None:
+            span["error"] = exc_type.__name__
+        trace.spans.append(span)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str):
+    """Aktif iz varsa süre kaydeden, yoksa hiçbir şey yapmayan bağlam yöneticisi"""
+    trace = _current.get()
+    if trace is None:
+        return _NOOP
+    return _Span(trace, name)
+
+
+def mark(name: str) -> None:
+    """İzin başından bu ana kadarki süreyi span olarak ekler (örn. gövde ayrıştırma + doğrulama)"""
+    trace = _current.get()
+    if trace is None:
+        return
+    trace.spans.append({
+        "name": name,
+        "path": f"{trace.name};{name}",
+        "offset_ms": 0.0,
+        "duration_ms": round((time.perf_counter() - trace.start) * 1000, 3),
+    })
+
+
+def annotate(**meta: object) -> None:
+    """Aktif ize meta bilgi ekler (kişisel içerik yazılmamalı)"""
+    trace = _current.get()
+    if trace is not None:
+        trace.meta.update(meta)
+
+
+class Profiler:
+    """Örnekleme kararı ve son N izin halka tamponu"""
+
+    def __init__(self, sample_rate: float, max_traces: int, header_token: str = "") -> None:
+        self.sample_rate = sample_rate
+        self.header_token = header_token
+        self.traces: Deque[Trace] = deque(maxlen=max_traces)
+        self.sampled = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 or bool(self.header_token)
+
+    def should_sample(self, headers: Dict[bytes, bytes]) -> bool:
+        if self.header_token:
+            value = headers.get(b"x-debug-profile")
+            if value is not None and value.decode("latin-1") == self.header_token:
+                return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def recent(self, limit: int) -> List[Trace]:
+        return list(self.traces)[-limit:][::-1]
+
+
+class ProfilingMiddleware:
+    """
+    ASGI ara katmanı: örneklenen istekte izi açar, yanıt (akış dahil) bitince tampona yazar.
+    Yanıta X-Trace-Id başlığı eklenir.
+    """
+
+    def __init__(self, app, profiler: Profiler, paths: frozenset) -> None:
+        self.app = app
+        self.profiler = profiler
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+        if not self.profiler.should_sample(dict(scope["headers"])):
+            return await self.app(scope, receive, send)
+
+        trace = Trace(f"{scope['method']} {scope['path']}")
+        token = _current.set(trace)
+        path_token = _path.set(None)
+
+        async def send_with_trace_id(message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-trace-id", trace.id.encode("ascii"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        finally:
+            trace.finish()
+            _path.reset(path_token)
+            _current.reset(token)
+            self.profiler.sampled += 1
+            self.profiler.traces.append(trace)
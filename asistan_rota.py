@@ -0,0 +1,87 @@
+"""
+asistan_rota.py — Hızlı / güçlü model yönlendirme
+
+Tek bir LLM_MODEL her mesaja aynı modeli kullanır: kısa bir "başım ağrıyor" sorusu için güçlü
+(yavaş, pahalı) model gereksizdir; çok belirtili, uzun veya derinleşmiş bir konuşmada ise hızlı
+model yetersiz kalabilir. Bu modül her tur için ucuz yerel özelliklerle rota seçer:
+- Mesaj uzunluğu (karakter)
+- Farklı belirti türü sayısı (ağrı, ateş, bulantı, döküntü ...): asistan_acil'deki Aho-Corasick
+  eşleyicisiyle tek geçişte, Türkçe karakterden bağımsız sayılır
+- Geçmiş derinliği (önceki kullanıcı turu sayısı)
+
+Eşiklerden biri aşılırsa tur güçlü modele gider; aksi halde hızlı model. Güçlü modelin zaman
+aşımında hızlı modele düşme ve rota bazlı metrikler asistan_api.py'dedir.
+"""
+
+from typing import Dict, NamedTuple, Sequence, Tuple
+
+from asistan_acil import PhraseMatcher
+from asistan_onbellek import fold_text
+
+# Belirti türü → ifadeler (kök olarak; kelime başında eşleşir). Aynı türden birden çok ifade
+# tek belirti sayılır: "baş ağrısı ve karın ağrısı" = 1 (ağrı)
+SYMPTOM_TERMS: Dict[str, Tuple[str, ...]] = {
+    "pain": ("ağrı", "ağrıyor", "sızı", "sancı", "kramp"),
+    "fever": ("ateş", "titreme", "üşüme"),
+    "cough": ("öksürük", "öksürüyor", "balgam", "hırıltı"),
+    "nasal": ("burun akıntı", "burnum akıyor", "burnum tıkan", "hapşır", "nezle"),
+    "throat": ("boğaz", "yutkun", "ses kısık"),
+    "nausea": ("bulantı", "bulanıyor", "kusma", "kusuyor", "kustum"),
+    "bowel": ("ishal", "kabız", "şişkinlik", "hazımsız"),
+    "reflux": ("mide yanma", "reflü", "ekşime"),
+    "skin": ("kaşıntı", "kaşın", "döküntü", "kızarıklık", "sivilce", "egzama"),
+    "swelling": ("şişlik", "şişti", "ödem"),
+    "numbness": ("uyuşma", "uyuşuyor", "karıncalan"),
+    "dizziness": ("baş dönme", "başım dön", "sersem", "denge"),
+    "fatigue": ("halsiz", "yorgun", "bitkin", "güçsüz"),
+    "palpitation": ("çarpıntı", "kalbim hızlı", "tansiyon"),
+    "breathing": ("nefes", "soluk"),
+    "sweating": ("terleme", "terliyor", "gece terle"),
+    "appetite": ("iştahsız", "iştahım", "kilo kayb", "kilo ver"),
+    "sleep": ("uykusuz", "uyuyamıyor", "uyku"),
+    "urinary": ("idrar", "sık tuvalet", "yanarak"),
+    "bleeding": ("kanama", "kanıyor", "morluk", "morarma"),
+    "vision": ("bulanık gör", "çift gör", "gözüm"),
+    "hearing": ("kulak çınla", "kulağım", "işitme"),
+    "joint": ("eklem", "kas ağrı", "tutulma"),
+}
+
+_MATCHER = PhraseMatcher(
+    (phrase, kind) for kind, phrases in SYMPTOM_TERMS.items() for phrase in phrases
+)
+
+
+class RouteDecision(NamedTuple):
+    route: str   # fast | strong
+    reason: str  # short | long_message | symptoms | history
+
+
+class ModelRouter:
+    """
+    Eşik tabanlı rota seçici (durumsuz; tur başına bir tarama).
+
+    Parametreler:
+    - long_message_chars: Bu uzunluktaki (ve üstü) mesaj güçlü modele gider (0 = kapalı)
+    - symptom_threshold: Bu sayıda (ve üstü) farklı belirti türü güçlü modele gider (0 = kapalı)
+    - history_turns: Bu sayıda (ve üstü) önceki kullanıcı turu varsa güçlü model (0 = kapalı)
+    """
+
+    def __init__(self, long_message_chars: int, symptom_threshold: int, history_turns: int) -> None:
+        self.long_message_chars = long_message_chars
+        self.symptom_threshold = symptom_threshold
+        self.history_turns = history_turns
+
+    @staticmethod
+    def count_symptoms(message: str) -> int:
+        return len(_MATCHER.scan(fold_text(message)))
+
+    def choose(self, message: str, history: Sequence) -> RouteDecision:
+        if self.long_message_chars and len(message) >= self.long_message_chars:
+            return RouteDecision("strong", "long_message")
+        if self.symptom_threshold and self.count_symptoms(message) >= self.symptom_threshold:
+            return RouteDecision("strong", "symptoms")
+        if self.history_turns:
+            turns = sum(1 for m in history if getattr(m, "type", "") == "human")
+            if turns >= self.history_turns:
+                return RouteDecision("strong", "history")
+        return RouteDecision("fast", "short")
@@ -0,0 +1,201 @@
+"""
+asistan_saglayici.py — LLM sağlayıcı seçimi ve çevrimdışı sahte (fake) model
+
+LLM_PROVIDER ortam değişkeni hangi sohbet modelinin kurulacağını belirler:
+- gemini: Google Gemini (GOOGLE_API_KEY gerekir; varsayılan)
+- fake:   Ağ ve anahtar gerektirmeyen, tekrarlanabilir sahte model (yük testi, profil, CI)
+
+Sahte model gerçek bir sağlayıcı gibi davranır:
+- İlk token süresi (TTFT) log-normal dağılımdan çekilir (medyan + yayılım)
+- Yanıt, saniyedeki token hızıyla parça parça üretilir (akışta gerçekçi aralıklar)
+- Verilen oranda gerçek istemcinin fırlattığı türden hatalar üretilir (503/429/zaman aşımı)
+- Yanıt metni girdiden türetilir; gecikme/hata dizisi sabit tohumla (seed) belirlenir
+
+API (asistan_api.py) ve terminal uygulaması (asistan_terminal.py) aynı fabrikayı kullanır.
+Yeni sağlayıcılar register_provider ile eklenir.
+"""
+
+import asyncio
+import os
+import random
+import time
+import zlib
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from google.api_core import exceptions as upstream_errors
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+from asistan_llm import message_text
+
+# Sağlayıcı fabrikası imzası: model adı → sohbet modeli
+ProviderFactory = Callable[[str], BaseChatModel]
+
+# Sahte yanıtların kelime havuzu (Türkçe, sağlık danışmanlığı tonunda)
+_FAKE_WORDS = (
+    "dinlenmeye", "özen", "gösterin", "bol", "sıvı", "tüketin", "belirtiler", "devam", "ederse",
+    "bir", "sağlık", "kuruluşuna", "başvurun", "düzenli", "uyku", "hafif", "beslenme", "ve",
+    "günlük", "hareket", "faydalı", "olabilir", "ağrı", "artarsa", "doktorunuza", "danışın",
+    "kendinizi", "yormayın", "ılık", "duş", "rahatlatıcı", "gelebilir", "stres", "yönetimi",
+)
+
+
+def _fake_errors() -> tuple:
+    """Gemini istemcisinin fırlattığı gerçek hata türleri (hata işleme kodu iki modda da aynı çalışır)"""
+    return (
+        upstream_errors.ServiceUnavailable("fake: model aşırı yüklü"),
+        upstream_errors.ResourceExhausted("fake: kota aşıldı"),
+        upstream_errors.DeadlineExceeded("fake: zaman aşımı"),
+    )
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Gecikme, akış hızı ve hata oranı ayarlanabilir sahte sohbet modeli.
+
+    - ttft_ms / ttft_sigma: İlk token süresinin medyanı ve log-normal yayılımı (0 = sabit)
+    - tokens_per_second: Üretim hızı (0 = ilk tokenden sonra tüm yanıt anında)
+    - response_tokens: Yanıt uzunluğu (kelime)
+    - error_rate: Çağrı başına hata olasılığı (0-1)
+    - seed: Gecikme/hata dizisinin tohumu (aynı tohum → aynı dizi)
+    """
+
+    ttft_ms: float = 300.0
+    ttft_sigma: float = 0.3
+    tokens_per_second: float = 80.0
+    response_tokens: int = 120
+    error_rate: float = 0.0
+    seed: int = 42
+    _rng: random.Random = PrivateAttr()
+    calls: int = 0
+    errors: int = 0
+
+    def model_post_init(self, __context: Any) -> None:
+        self._rng = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _plan(self, messages: List[BaseMessage]) -> tuple:
+        """Tek çağrının planı: (ilk token süresi sn, hata veya None, yanıt kelimeleri)"""
+        self.calls += 1
+        rng = self._rng
+        ttft = self.ttft_ms / 1000
+        if self.ttft_sigma > 0:
+            ttft *= rng.lognormvariate(0.0, self.ttft_sigma)
+        error = None
+        if self.error_rate > 0 and rng.random() < self.error_rate:
+            self.errors += 1
+            error = rng.choice(_fake_errors())
+        # Yanıt metni yalnızca girdiye bağlıdır: aynı soru → aynı yanıt
+        prompt = message_text(messages[-1]) if messages else ""
+        h = zlib.crc32(prompt.encode("utf-8"))
+        words = [_FAKE_WORDS[(h + i * 7919) % len(_FAKE_WORDS)] for i in range(self.response_tokens)]
+        if words:
+            words[0] = words[0].capitalize()
+        return ttft, error, words
+
+    def _chunks(self, words: List[str]) -> Iterator[tuple]:
+        """(metin parçası, parçadan önce beklenecek süre) — saniyede ~50 parça"""
+        if self.tokens_per_second <= 0:
+            yield " ".join(words) + ".", 0.0
+            return
+        per_chunk = max(1, round(self.tokens_per_second / 50))
+        for i in range(0, len(words), per_chunk):
+            part = words[i:i + per_chunk]
+            text = (" " if i else "") + " ".join(part)
+            if i + per_chunk >= len(words):
+                text += "."
+            yield text, len(part) / self.tokens_per_second
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        ttft, error, words = self._plan(messages)
+        time.sleep(ttft)
+        if error is not None:
+            raise error
+        text = ""
+        for part, delay in self._chunks(words):
+            time.sleep(delay)
+            text += part
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs: Any) -> ChatResult:
+        ttft, error, words = self._plan(messages)
+        await asyncio.sleep(ttft)
+        if error is not None:
+            raise error
+        # Tek seferlik yanıtta üretim süresi toplu beklenir (parça başına uyanmadan)
+        text = "".join(part for part, _ in self._chunks(words))
+        if self.tokens_per_second > 0:
+            await asyncio.sleep(len(words) / self.tokens_per_second)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        ttft, error, words = self._plan(messages)
+        time.sleep(ttft)
+        if error is not None:
+            raise error
+        for i, (part, delay) in enumerate(self._chunks(words)):
+            if i:
+                time.sleep(delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=part))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        ttft, error, words = self._plan(messages)
+        await asyncio.sleep(ttft)
+        if error is not None:
+            raise error
+        for i, (part, delay) in enumerate(self._chunks(words)):
+            if i:
+                await asyncio.sleep(delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=part))
+
+
+def _gemini(model: str) -> BaseChatModel:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise RuntimeError("GOOGLE_API_KEY bulunamadı. .env dosyanızı kontrol edin.")
+    return ChatGoogleGenerativeAI(model=model, temperature=0.7, api_key=api_key)
+
+
+def _fake(model: str) -> BaseChatModel:
+    return FakeChatModel(
+        ttft_ms=float(os.getenv("FAKE_LLM_TTFT_MS", "300")),
+        ttft_sigma=float(os.getenv("FAKE_LLM_TTFT_SIGMA", "0.3")),
+        tokens_per_second=float(os.getenv("FAKE_LLM_TOKENS_PER_SEC", "80")),
+        response_tokens=int(os.getenv("FAKE_LLM_RESPONSE_TOKENS", "120")),
+        error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+        seed=int(os.getenv("FAKE_LLM_SEED", "42")),
+    )
+
+
+# Kayıtlı sağlayıcılar: LLM_PROVIDER ile seçilir, register_provider ile genişletilir
+PROVIDERS: Dict[str, ProviderFactory] = {
+    "gemini": _gemini,
+    "fake": _fake,
+}
+
+
+def register_provider(name: str, factory: ProviderFactory) -> None:
+    """Yeni bir sağlayıcı kaydeder (örn. başka bir bulut modeli)"""
+    PROVIDERS[name] = factory
+
+
+def create_llm(model: str, provider: Optional[str] = None) -> BaseChatModel:
+    """Seçili sağlayıcının (varsayılan: LLM_PROVIDER) sohbet modelini kurar"""
+    name = (provider or os.getenv("LLM_PROVIDER", "gemini")).strip().lower()
+    factory = PROVIDERS.get(name)
+    if factory is None:
+        raise RuntimeError(
+            f"Bilinmeyen LLM_PROVIDER: {name} (seçenekler: {', '.join(sorted(PROVIDERS))})"
+        )
+    return factory(model)
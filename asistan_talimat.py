@@ -0,0 +1,155 @@
+"""
+asistan_talimat.py — Profil bazlı, önceden hesaplanmış sistem talimatları
+
+Sistem talimatı yalnızca isim/yaş ve 3 cinsiyet × 3 yaş grubu profiline göre değişir.
+Bu yüzden:
+- 9 profilin isimden bağımsız gövdesi uygulama başlarken bir kez üretilir ve intern edilir
+- Oturum başına sadece kısa, isme bağlı başlık (ad, yaş, hitap) oluşturulur
+- SystemMessage içeriği [başlık, ortak gövde] parçalarından oluşur; gövde tüm oturumlarda
+  aynı nesnedir, böylece boşta bekleyen oturumların belleği gerçek sohbet içeriğine harcanır
+
+API (asistan_api.py) ve terminal uygulaması (asistan_terminal.py) aynı tabloyu kullanır.
+"""
+
+import sys
+from typing import Dict, List, Tuple
+
+from langchain_core.messages import SystemMessage
+
+GENDERS = ("female", "male", "other")
+AGE_BUCKETS = ("child", "adult", "senior")
+
+
+def age_bucket(age: int) -> str:
+    """Yaş grubu: child (<18), adult (18-49), senior (50+)"""
+    if age < 18:
+        return "child"
+    if age >= 50:
+        return "senior"
+    return "adult"
+
+
+# Cinsiyete göre hitap stili ve odak alanları
+_GENDER_PARTS = {
+    "female": {
+        "hitap_ozel": "Kadın sağlığı konularında (adet döngüsü, hamilelik, menopoz, meme sağlığı vb.) özel dikkat göster. ",
+        "risk_faktoru": "Kadınlarda özellikle dikkat edilmesi gereken konular: meme kanseri taraması, rahim ağzı kanseri, kemik sağlığı (osteoporoz), tiroid sorunları. ",
+        "hitap_stili": "nazik, empatik ve anlayışlı",
+    },
+    "male": {
+        "hitap_ozel": "Erkek sağlığı konularında (prostat sağlığı, testosteron seviyeleri, kalp sağlığı vb.) özel dikkat göster. ",
+        "risk_faktoru": "Erkeklerde özellikle dikkat edilmesi gereken konular: prostat sağlığı, kalp-damar hastalıkları, testis kanseri, karaciğer sağlığı. ",
+        "hitap_stili": "nazik, empatik ve doğrudan",
+    },
+    "other": {
+        "hitap_ozel": "Sağlık konularında kapsayıcı ve hassas bir yaklaşım benimse. ",
+        "risk_faktoru": "Genel sağlık taramaları ve önleyici bakım konularında bilgilendir. ",
+        "hitap_stili": "kapsayıcı, empatik ve saygılı",
+    },
+}
+
+# Yaş grubuna göre ek yönlendirme
+_AGE_PARTS = {
+    "child": {
+        "hitap_tonu": "Sevgili",
+        "yas_notu": "Genç/çocuk sağlığı konularında yaş grubuna uygun, anlaşılır dil kullan. ",
+        "yas_ozel": "Büyüme-gelişme, aşı takvimi, ergenlik dönemi sağlığı gibi konularda bilgilendir. ",
+    },
+    "adult": {
+        "hitap_tonu": "Sayın",
+        "yas_notu": "Genç erişkin sağlığı konularında (yaşam tarzı, önleyici bakım, mental sağlık) odaklan. ",
+        "yas_ozel": "Sağlıklı yaşam alışkanlıkları, düzenli egzersiz, beslenme, stres yönetimi konularında rehberlik et. ",
+    },
+    "senior": {
+        "hitap_tonu": "Sayın",
+        "yas_notu": "Orta-ileri yaş grubuna özel sağlık konularını (kronik hastalıklar, taramalar, yaşam tarzı) vurgula. ",
+        "yas_ozel": "Düzenli sağlık kontrolleri, kanser taramaları, kalp sağlığı, diyabet riski gibi konularda öneriler sun. ",
+    },
+}
+
+
+def _render_body(gender: str, bucket: str) -> str:
+    """Profilin isimden bağımsız gövdesi (rol sınırları, sunum, acil uyarılar)"""
+    g = _GENDER_PARTS[gender]
+    a = _AGE_PARTS[bucket]
+    return (
+        f"Kişiselleştirme: "
+        f"{g['hitap_ozel']}"
+        f"{g['risk_faktoru']}"
+        f"{a['yas_notu']}"
+        f"{a['yas_ozel']}"
+        f"\n\n"
+        f"Amaç: Sağlıkla ilgili sorulara nazik, sade ve danışanın yaşına uygun yanıtlar vermek; "
+        f"genel, güvenli ve uygulanabilir öneriler sunmak. "
+        f"\n\n"
+        f"Sınırlar: "
+        f"- Kesin tanı/ilaç/tedavi yazma; riskli veya acil belirtilerde profesyonel yardıma yönlendir. "
+        f"- Tıbbi jargondan kaçın, anlaşılır dil kullan. "
+        f"- Danışanın yaşı ve cinsiyet ({gender}) bilgisini cevaplarında dikkate al. "
+        f"\n\n"
+        f"Sunum: "
+        f"- Kısa paragraflar; gerektiğinde madde işaretleri. "
+        f"- Danışanın ismini gerektiğinde kullan; sakin ve empatik bir ton benimse; paniğe sevk etme. "
+        f"- Gerektiğinde kullanıcıya sorularla netleştirme yap; belirsizliği dürüstçe belirt. "
+        f"\n\n"
+        f"Acil uyarılar: Hayati risk içeren belirtilerde (göğüs ağrısı, nefes darlığı, bilinç kaybı, şiddetli kanama vb.) "
+        f"hemen 112'yi veya en yakın acil servise gitmesini öner. "
+        f"\n\n"
+        f"Cinsiyet ve yaş özel bilgiler: "
+        f"Danışanın cinsiyet ({gender}) ve yaş bilgisini kullanarak "
+        f"uygun sağlık önerileri, risk faktörleri ve dikkat edilmesi gereken konuları belirt."
+    )
+
+
+def _render_header_template(gender: str, bucket: str) -> str:
+    """İsme bağlı başlığın şablonu: {name} ve {age} oturum başına doldurulur"""
+    hitap_tonu = _AGE_PARTS[bucket]["hitap_tonu"]
+    hitap_stili = _GENDER_PARTS[gender]["hitap_stili"]
+    return (
+        "Rolün: Deneyimli ve empatik bir sağlık asistanısın. Danışanın adı {name}, {age} yaşında. "
+        f"Hitap: {hitap_tonu} {{name}} şeklinde hitap et; hitap tonunu {hitap_stili} tut. "
+        "\n\n"
+    )
+
+
+# Uygulama başlarken 9 profil bir kez hesaplanır; gövdeler intern edilip paylaşılır
+PROFILE_BODIES: Dict[Tuple[str, str], str] = {
+    (g, b): sys.intern(_render_body(g, b)) for g in GENDERS for b in AGE_BUCKETS
+}
+PROFILE_HEADERS: Dict[Tuple[str, str], str] = {
+    (g, b): _render_header_template(g, b) for g in GENDERS for b in AGE_BUCKETS
+}
+_SHARED_IDS = frozenset(id(body) for body in PROFILE_BODIES.values())
+_SHARED_BY_TEXT = {body: body for body in PROFILE_BODIES.values()}
+
+
+def profile_key(age: int, gender: str) -> Tuple[str, str]:
+    """(cinsiyet, yaş grubu) profil anahtarı; bilinmeyen cinsiyet 'other' sayılır"""
+    return (gender if gender in _GENDER_PARTS else "other", age_bucket(age))
+
+
+def is_shared_text(text) -> bool:
+    """Metin, profil tablosundaki paylaşılan gövdelerden biri mi? (bellek hesabı için)"""
+    return id(text) in _SHARED_IDS
+
+
+def shared_text(text: str) -> str:
+    """Metin bir profil gövdesine eşitse paylaşılan nesneyi döndürür (diskten okunan oturumlar için)"""
+    return _SHARED_BY_TEXT.get(text, text)
+
+
+def build_system_content(name: str, age: int, gender: str) -> List[str]:
+    """SystemMessage içerik parçaları: [isme bağlı başlık, paylaşılan profil gövdesi]"""
+    key = profile_key(age, gender)
+    header = PROFILE_HEADERS[key].format(name=name, age=age)
+    return [header, PROFILE_BODIES[key]]
+
+
+def build_system_message(name: str, age: int, gender: str) -> SystemMessage:
+    """Kişiselleştirilmiş sistem mesajı; gövde tüm oturumlarla paylaşılır (kopyalanmaz)"""
+    return SystemMessage(content=build_system_content(name, age, gender))
+
+
+def build_system_instruction(name: str, age: int, gender: str) -> str:
+    """Sistem talimatının düz metin hali (log/hata ayıklama ve metin tabanlı prompt'lar için)"""
+    return "".join(build_system_content(name, age, gender))
@@ -0,0 +1,455 @@
+"""
+asistan_yonlendirici.py — Çok süreçli (multi-worker) çalışma için oturum bağlı yönlendirici
+
+Tek uvicorn süreci tek çekirdek kullanır. Bu modül:
+- N adet API worker'ı (asistan_api:app) ayrı süreçler olarak yerel portlarda başlatır
+- Önde duran küçük bir vekil (proxy) olarak istekleri worker'lara iletir
+- Oturumlu istekleri name:session_id anahtarının tutarlı hash'ine (consistent hashing) göre
+  hep aynı worker'a gönderir: hafıza worker'da yerel ve sıcak kalır, kilit gerekmez
+- Oturumsuz istekleri sırayla (round-robin) dağıtır
+- Toplu istekleri (/chat/batch) öğelerin sahibi olan worker'lara böler (oturumlu öğe oturumunun
+  worker'ına, oturumsuz öğe sırayla); alt toplu isteklerin NDJSON akışları, her satır öğenin
+  asıl sırasını ("index") koruyarak tek akışta birleştirilir
+- İstemci ayrılırsa worker bağlantısını kapatır: worker kopmayı görür, LLM çağrısını iptal edip
+  turu geri alır (yanıt başlığı beklenirken de, akış sürerken de)
+- Ölen worker'ı yeniden başlatır; worker sayısı değişirse anahtarların yalnızca ~1/N'i taşınır
+  (SESSION_BACKEND=sqlite ile taşınan oturumlar yeni worker'da diskten yüklenir)
+
+Kullanım:
+    python asistan_yonlendirici.py --workers 4 --port 8000
+    # veya: API_WORKERS=4 python asistan_api.py
+"""
+
+import argparse
+import asyncio
+import bisect
+import hashlib
+import itertools
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Sequence
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+
+from asistan_oturum import session_key_for
+
+logger = logging.getLogger("doctor-assistant-router")
+
+# Worker'lara iletilmeyen bağlantıya özgü (hop-by-hop) başlıklar
+_HOP_HEADERS = frozenset({
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailers", "transfer-encoding", "upgrade", "host", "content-length",
+})
+# Gövdesinden oturum anahtarı okunan endpoint'ler
+_SESSION_BODY_PATHS = frozenset({"/chat", "/chat/stream"})
+_BATCH_PATH = "/chat/batch"
+_UNAVAILABLE = "Sunucu şu anda yanıt veremiyor. Lütfen tekrar deneyin."
+
+
+def _body_session_key(data) -> Optional[str]:
+    if isinstance(data, dict) and isinstance(data.get("name"), str):
+        sid = data.get("session_id")
+        return session_key_for(data["name"], sid if isinstance(sid, str) else None)
+    return None
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Tutarlı hash halkası: her düğüm halkada `replicas` sanal noktaya yerleşir.
+    Anahtar, saat yönünde ilk noktanın düğümüne düşer; düğüm ekleme/çıkarma
+    yalnızca komşu aralıktaki anahtarları taşır.
+    """
+
+    def __init__(self, nodes: Sequence[str] = (), replicas: int = 128) -> None:
+        self.replicas = replicas
+        self._points: List[int] = []
+        self._owners: Dict[int, str] = {}
+        for node in nodes:
+            self.add(node)
+
+    def __len__(self) -> int:
+        return len(self._points) // self.replicas if self.replicas else 0
+
+    def add(self, node: str) -> None:
+        for i in range(self.replicas):
+            point = _hash(f"{node}#{i}")
+            if point in self._owners:
+                continue
+            self._owners[point] = node
+            bisect.insort(self._points, point)
+
+    def remove(self, node: str) -> None:
+        self._points = [p for p in self._points if self._owners[p] != node]
+        self._owners = {p: n for p, n in self._owners.items() if n != node}
+
+    def node_for(self, key: str) -> str:
+        if not self._points:
+            raise LookupError("halkada düğüm yok")
+        idx = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[self._points[idx]]
+
+
+class WorkerPool:
+    """API worker süreçlerini başlatır, sağlığını bekler ve ölenleri yeniden başlatır"""
+
+    def __init__(self, workers: int, base_port: int, app_path: str = "asistan_api:app",
+                 factory: bool = False, host: str = "127.0.0.1") -> None:
+        self.host = host
+        self.app_path = app_path
+        self.factory = factory
+        self.ports = [base_port + i for i in range(workers)]
+        self.procs: Dict[int, subprocess.Popen] = {}
+        self.restarts = 0
+
+    @property
+    def urls(self) -> List[str]:
+        return [f"http://{self.host}:{p}" for p in self.ports]
+
+    def _spawn(self, index: int, port: int) -> subprocess.Popen:
+        cmd = [sys.executable, "-m", "uvicorn", self.app_path, "--host", self.host,
+               "--port", str(port), "--log-level", "warning"]
+        if self.factory:
+            cmd.append("--factory")
+        env = dict(os.environ, WORKER_INDEX=str(index))
+        return subprocess.Popen(cmd, env=env)
+
+    def start(self) -> None:
+        for i, port in enumerate(self.ports):
+            self.procs[port] = self._spawn(i, port)
+
+    async def wait_ready(self, timeout: float = 60.0) -> None:
+        """Tüm worker'lar /health yanıtı verene kadar bekler"""
+        deadline = time.monotonic() + timeout
+        async with httpx.AsyncClient(timeout=1.0) as client:
+            for url in self.urls:
+                while True:
+                    try:
+                        if (await client.get(f"{url}/health")).status_code == 200:
+                            break
+                    except httpx.HTTPError:
+                        pass
+                    if time.monotonic() > deadline:
+                        raise RuntimeError(f"worker başlatılamadı: {url}")
+                    await asyncio.sleep(0.2)
+
+    async def supervise(self, interval: float = 1.0) -> None:
+        """Ölen worker'ı aynı portta yeniden başlatır (oturumları diskten tembel yüklenir)"""
+        while True:
+            await asyncio.sleep(interval)
+            for i, port in enumerate(self.ports):
+                proc = self.procs.get(port)
+                if proc is not None and proc.poll() is not None:
+                    logger.warning("worker port=%s exited code=%s; restarting", port, proc.returncode)
+                    self.procs[port] = self._spawn(i, port)
+                    self.restarts += 1
+
+    def stop(self, timeout: float = 10.0) -> None:
+        for proc in self.procs.values():
+            if proc.poll() is None:
+                proc.terminate()
+        for proc in self.procs.values():
+            try:
+                proc.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+async def wait_disconnect(request: Request) -> None:
+    """İstemci bağlantıyı kapatana kadar bekler (gövde okunduktan sonra çağrılmalı)"""
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+
+def routing_key(request: Request, body: bytes) -> Optional[str]:
+    """İsteğin oturum anahtarı (name:session_id); oturumsuz isteklerde None"""
+    if request.method == "POST" and request.url.path in _SESSION_BODY_PATHS and body:
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return None
+        return _body_session_key(data)
+    if request.url.path == "/session/stats":
+        name = request.query_params.get("name")
+        return session_key_for(name, request.query_params.get("session_id")) if name else None
+    return None
+
+
+def batch_items(request: Request, body: bytes) -> Optional[list]:
+    """Toplu isteğin öğeleri; toplu istek değilse veya gövde dizi değilse None (worker doğrular)"""
+    if request.method != "POST" or request.url.path != _BATCH_PATH or not body:
+        return None
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return None
+    return data if isinstance(data, list) and data else None
+
+
+def _remap_error_locations(content: bytes, indices: List[int]) -> bytes:
+    """Doğrulama hatasındaki öğe sırasını (loc: ["body", i, ...]) asıl toplu istekteki sıraya çevirir"""
+    try:
+        data = json.loads(content)
+        for error in data["detail"]:
+            loc = error["loc"]
+            if len(loc) > 1 and loc[0] == "body" and isinstance(loc[1], int):
+                loc[1] = indices[loc[1]]
+    except (ValueError, KeyError, TypeError, IndexError):
+        return content
+    return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+
+def _unavailable_line(index: int) -> str:
+    line = {"index": index, "status": 503, "detail": _UNAVAILABLE, "retry_after": 1}
+    return json.dumps(line, ensure_ascii=False) + "\n"
+
+
+def create_router(pool: WorkerPool, replicas: int = 128,
+                  upstream_timeout: Optional[float] = None) -> FastAPI:
+    """Worker havuzunun önündeki vekil uygulama"""
+    ring = HashRing(pool.urls, replicas=replicas)
+    round_robin = itertools.cycle(pool.urls)
+    routed: Dict[str, int] = {url: 0 for url in pool.urls}
+    state = {}
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        pool.start()
+        await pool.wait_ready()
+        supervisor = asyncio.create_task(pool.supervise())
+        state["client"] = httpx.AsyncClient(
+            timeout=httpx.Timeout(upstream_timeout),
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=256),
+        )
+        logger.info("router ready workers=%s", len(pool.ports))
+        try:
+            yield
+        finally:
+            supervisor.cancel()
+            await state["client"].aclose()
+            pool.stop()
+
+    app = FastAPI(title="Doktor Asistanı Yönlendirici", lifespan=lifespan,
+                  docs_url=None, redoc_url=None, openapi_url=None)
+
+    @app.get("/router/stats")
+    def router_stats():
+        """Worker başına yönlendirilen istek sayısı ve süreç durumu"""
+        return {
+            "workers": [
+                {"url": url, "routed": routed[url], "alive": pool.procs[port].poll() is None}
+                for url, port in zip(pool.urls, pool.ports)
+            ],
+            "restarts": pool.restarts,
+        }
+
+    def forward_headers(request: Request) -> list:
+        headers = [(k, v) for k, v in request.headers.items() if k.lower() not in _HOP_HEADERS]
+        if request.client:
+            headers.append(("x-forwarded-for", request.client.host))
+        return headers
+
+    def split_batch(items: list) -> Dict[str, List[int]]:
+        """worker → öğelerin asıl sıraları; oturumlu öğe oturumunun worker'ına, oturumsuz sırayla"""
+        groups: Dict[str, List[int]] = {}
+        for index, item in enumerate(items):
+            key = _body_session_key(item)
+            groups.setdefault(ring.node_for(key) if key else next(round_robin), []).append(index)
+        return groups
+
+    async def proxy_batch(request: Request, items: list, groups: Dict[str, List[int]]):
+        """
+        Alt toplu istekleri worker'lara paralel gönderir ve sonuç satırlarını geldikçe birleştirir.
+        Bir worker öğeleri reddederse (422/413) tüm istek o yanıtla döner (tek worker'daki gibi);
+        worker'a ulaşılamazsa yalnızca o worker'ın öğeleri 503 satırı alır.
+        """
+        client: httpx.AsyncClient = state["client"]
+        headers = forward_headers(request)
+        sends = {}
+        for target, indices in groups.items():
+            routed[target] += 1
+            upstream = client.build_request(
+                "POST", f"{target}{_BATCH_PATH}", params=request.query_params, headers=headers,
+                content=json.dumps([items[i] for i in indices], ensure_ascii=False).encode("utf-8"),
+            )
+            sends[target] = asyncio.ensure_future(client.send(upstream, stream=True))
+        opening = asyncio.gather(*sends.values(), return_exceptions=True)
+        disconnected = asyncio.ensure_future(wait_disconnect(request))
+        try:
+            await asyncio.wait((opening, disconnected), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            disconnected.cancel()
+            if not opening.done():
+                opening.cancel()
+                await asyncio.gather(opening, return_exceptions=True)
+        opened = {}
+        for target, task in sends.items():
+            if task.cancelled():
+                continue
+            if task.exception() is not None:
+                logger.warning("upstream %s failed: %s", target, task.exception())
+            else:
+                opened[target] = task.result()
+        if opening.cancelled():
+            for resp in opened.values():
+                await resp.aclose()
+            return Response(status_code=499)  # istemci kapattı
+
+        rejected = next((t for t, r in opened.items() if r.status_code != 200), None)
+        if rejected is not None:
+            resp = opened[rejected]
+            content = await resp.aread()
+            for other in opened.values():
+                await other.aclose()
+            if resp.status_code == 422:
+                content = _remap_error_locations(content, groups[rejected])
+            out_headers = {k: v for k, v in resp.headers.items()
+                           if k.lower() not in _HOP_HEADERS and k.lower() != "content-length"}
+            return Response(content, status_code=resp.status_code, headers=out_headers)
+
+        async def merged():
+            lines: asyncio.Queue = asyncio.Queue()
+            for target, indices in groups.items():
+                if target not in opened:
+                    for index in indices:
+                        lines.put_nowait(_unavailable_line(index))
+
+            async def pump(resp: httpx.Response, indices: List[int]) -> None:
+                # Alt toplu isteğin "index"i alt listedeki sıradır: asıl sıraya çevrilir
+                reported = set()
+                try:
+                    async for raw in resp.aiter_lines():
+                        if not raw.strip():
+                            continue
+                        line = json.loads(raw)
+                        reported.add(line["index"])
+                        line["index"] = indices[line["index"]]
+                        await lines.put(json.dumps(line, ensure_ascii=False) + "\n")
+                except Exception as exc:  # kopan bağlantı / bozuk satır: kalan öğeler 503 alır
+                    logger.warning("upstream batch stream failed: %s", exc)
+                finally:
+                    await resp.aclose()
+                for local, index in enumerate(indices):
+                    if local not in reported:
+                        await lines.put(_unavailable_line(index))
+                await lines.put(None)
+
+            pumps = [asyncio.ensure_future(pump(resp, groups[target])) for target, resp in opened.items()]
+            remaining = len(pumps)
+            try:
+                while remaining or not lines.empty():
+                    line = await lines.get()
+                    if line is None:
+                        remaining -= 1
+                        continue
+                    yield line
+            finally:
+                # İstemci koptuysa pompalar iptal edilir: worker bağlantıları kapanır, öğeler iptal olur
+                for task in pumps:
+                    task.cancel()
+                await asyncio.gather(*pumps, return_exceptions=True)
+
+        return StreamingResponse(
+            merged(),
+            media_type="application/x-ndjson",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
+    async def proxy(request: Request, path: str):
+        body = await request.body()
+        items = batch_items(request, body)
+        if items is not None:
+            groups = split_batch(items)
+            if len(groups) > 1:
+                return await proxy_batch(request, items, groups)
+            target = next(iter(groups))
+        else:
+            key = routing_key(request, body)
+            target = ring.node_for(key) if key else next(round_robin)
+        routed[target] += 1
+
+        headers = forward_headers(request)
+        client: httpx.AsyncClient = state["client"]
+        upstream = client.build_request(
+            request.method, f"{target}{request.url.path}",
+            params=request.query_params, headers=headers, content=body,
+        )
+        # /chat yanıt başlığını ancak tur bitince gönderir: beklerken istemcinin kopması da izlenir
+        sending = asyncio.ensure_future(client.send(upstream, stream=True))
+        disconnected = asyncio.ensure_future(wait_disconnect(request))
+        try:
+            await asyncio.wait((sending, disconnected), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            disconnected.cancel()
+            if not sending.done():
+                # İstemci ayrıldı: iptal worker bağlantısını kapatır, worker'ın kopma izleyicisi tetiklenir
+                sending.cancel()
+                await asyncio.gather(sending, return_exceptions=True)
+        if sending.cancelled():
+            return Response(status_code=499)  # istemci kapattı (yanıtı okuyan kimse yok)
+        try:
+            resp = sending.result()
+        except httpx.HTTPError as exc:
+            logger.warning("upstream %s failed: %s", target, exc)
+            return JSONResponse(
+                {"detail": "Sunucu şu anda yanıt veremiyor. Lütfen tekrar deneyin."},
+                status_code=503,
+                headers={"Retry-After": "1"},
+            )
+        out_headers = {k: v for k, v in resp.headers.items() if k.lower() not in _HOP_HEADERS}
+
+        async def relay():
+            # Akış istemci kopunca iptal edilir: worker yanıtı hemen kapatılır (akış da orada kesilir)
+            try:
+                async for chunk in resp.aiter_raw():
+                    yield chunk
+            finally:
+                await resp.aclose()
+
+        # Yanıt (SSE dahil) parça parça aktarılır; tamponlanmaz. Akış hiç başlamazsa yanıt arka planda kapatılır
+        return StreamingResponse(
+            relay(),
+            status_code=resp.status_code,
+            headers=out_headers,
+            background=BackgroundTask(resp.aclose),
+        )
+
+    return app
+
+
+def serve(workers: int, host: str = "0.0.0.0", port: int = 8000, base_port: int = 8100,
+          app_path: str = "asistan_api:app", factory: bool = False) -> None:
+    """Yönlendiriciyi ve worker'ları başlatır (Ctrl+C ile hepsi kapanır)"""
+    import uvicorn
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+    pool = WorkerPool(workers, base_port, app_path=app_path, factory=factory)
+    uvicorn.run(create_router(pool), host=host, port=port, log_level="warning")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Oturum bağlı çok süreçli Doktor Asistanı API")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("API_WORKERS", os.cpu_count() or 1)))
+    parser.add_argument("--host", default=os.getenv("API_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("API_PORT", "8000")))
+    parser.add_argument("--worker-base-port", type=int, default=int(os.getenv("WORKER_BASE_PORT", "8100")))
+    parser.add_argument("--app", default="asistan_api:app", help="Worker ASGI uygulaması (modül:nesne)")
+    parser.add_argument("--factory", action="store_true", help="--app bir fabrika fonksiyonudur")
+    args = parser.parse_args()
+    serve(args.workers, args.host, args.port, args.worker_base_port, args.app, args.factory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+asistan_yuk.py — Aşırı yükte geri basınç (backpressure) ve kullanıcı bazlı hız sınırı
+
+Ani yük altında sınırsız sayıda LLM çağrısı başlatmak sağlayıcının kota sınırına takılır ve
+herkes 500 alır. Bu modül:
+- ConcurrencyLimiter: Aynı anda işlenen sohbet isteklerini sınırlar; fazlası sınırlı bir
+  kuyrukta bekler (FIFO). Kuyruk doluysa veya bekleme süresi dolarsa istek hemen
+  OverloadedError ile reddedilir (HTTP 503 + Retry-After). Öncelikli (acil) istekler
+  ayrı bir kuyrukta bekler, boşalan yuvayı önce onlar alır ve kuyruk sınırına takılmaz
+- RateLimiter: Oturum anahtarı başına jeton kovası (token bucket); kısa patlamalara izin
+  verir, sürekli aşımda RateLimitedError (HTTP 429 + Retry-After)
+
+Retry-After tahmini, yuva tutma süresinin kayan ortalamasından ve kuyruk uzunluğundan
+hesaplanır: kuyruk uzadıkça istemciler daha geç tekrar dener.
+
+Not: Event loop içinden kullanılmak üzere tasarlanmıştır (kilit gerektirmez).
+"""
+
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict
+
+# Retry-After üst sınırı (saniye)
+MAX_RETRY_AFTER = 60
+
+
+class OverloadedError(Exception):
+    """Sunucu dolu: kuyruk dolu veya kuyrukta bekleme süresi aşıldı (HTTP 503)"""
+
+    def __init__(self, reason: str, retry_after: int) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class RateLimitedError(Exception):
+    """Kullanıcının istek hızı sınırı aşıldı (HTTP 429)"""
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__("rate_limited")
+        self.retry_after = retry_after
+
+
+def _clamp_retry_after(seconds: float) -> int:
+    return max(1, min(MAX_RETRY_AFTER, math.ceil(seconds)))
+
+
+class Slot:
+    """Alınmış işlem yuvası: 'with' bloğu veya release() ile bırakılır (iki kez bırakmak zararsız)"""
+
+    __slots__ = ("_limiter", "_start", "_released")
+
+    def __init__(self, limiter: "ConcurrencyLimiter") -> None:
+        self._limiter = limiter
+        self._start = time.monotonic()
+        self._released = False
+
+    def __enter__(self) -> "Slot":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.release()
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        self._limiter._release(time.monotonic() - self._start)
+
+
+class ConcurrencyLimiter:
+    """
+    Sınırlı kuyruklu eşzamanlılık sınırlayıcı.
+
+    Parametreler:
+    - max_in_flight: Aynı anda işlenebilecek en fazla istek (0 = sınırsız)
+    - max_queue: Yuva bekleyebilecek en fazla istek; fazlası hemen reddedilir
+    - queue_timeout: Kuyrukta en fazla bekleme süresi, saniye (0 = süresiz)
+
+    Bırakılan yuva sıradaki bekleyene doğrudan devredilir: yeni gelen istek kuyruktakilerin
+    önüne geçemez. Öncelikli bekleyenler normal kuyruktan önce yuva alır.
+    """
+
+    def __init__(self, max_in_flight: int, max_queue: int, queue_timeout: float) -> None:
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._priority: Deque[asyncio.Future] = deque()
+        # Yuva tutma süresinin üstel kayan ortalaması (Retry-After tahmini için)
+        self._hold_avg = 1.0
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {"queue_full": 0, "queue_timeout": 0}
+        self.wait_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_in_flight > 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters) + len(self._priority)
+
+    def retry_after(self) -> int:
+        """Kuyruğun boşalması için tahmini süre (saniye)"""
+        waves = self.queued / max(1, self.max_in_flight) + 1
+        return _clamp_retry_after(self._hold_avg * waves)
+
+    async def acquire(self, priority: bool = False) -> Slot:
+        """
+        Yuva alır; gerekirse kuyrukta bekler. Dolu/süre aşımında OverloadedError fırlatır.
+        priority=True: öncelikli kuyrukta bekler ve kuyruk sınırına takılmaz (yalnızca süre sınırı)
+        """
+        ahead = self._priority if priority else self.queued
+        if not self.enabled or (self.in_flight < self.max_in_flight and not ahead):
+            self.in_flight += 1
+            self.admitted += 1
+            return Slot(self)
+        if not priority and len(self._waiters) >= self.max_queue:
+            self.rejected["queue_full"] += 1
+            raise OverloadedError("queue_full", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        queue = self._priority if priority else self._waiters
+        queue.append(waiter)
+        start = time.monotonic()
+        try:
+            await asyncio.wait((waiter,), timeout=self.queue_timeout or None)
+        except asyncio.CancelledError:
+            # İstemci ayrıldı: yuva tam bu sırada devredildiyse sıradakine aktar
+            if not self._abandon(queue, waiter):
+                self._release(0.0)
+            raise
+        self.wait_seconds += time.monotonic() - start
+        if self._abandon(queue, waiter):
+            self.rejected["queue_timeout"] += 1
+            raise OverloadedError("queue_timeout", self.retry_after())
+        self.admitted += 1
+        return Slot(self)
+
+    def _abandon(self, queue: Deque[asyncio.Future], waiter: asyncio.Future) -> bool:
+        """Yuva devredilmediyse bekleyeni kuyruktan çıkarır (True); devredildiyse False"""
+        if waiter.done():
+            return False
+        waiter.cancel()
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            pass
+        return True
+
+    def _release(self, held: float) -> None:
+        self._hold_avg = 0.8 * self._hold_avg + 0.2 * held
+        for queue in (self._priority, self._waiters):
+            while queue:
+                waiter = queue.popleft()
+                if not waiter.done():
+                    waiter.set_result(None)  # yuva devredildi: in_flight değişmez
+                    return
+        self.in_flight -= 1
+
+
+class RateLimiter:
+    """
+    Anahtar (oturum) başına jeton kovası.
+
+    - per_minute: Dakikada dolan jeton sayısı (0 = kapalı)
+    - burst: Kova kapasitesi (art arda gönderilebilecek istek sayısı)
+    - max_keys: Bellekte tutulan en fazla kova; en eski kullanılan atılır (atılan kova doludur)
+    """
+
+    def __init__(self, per_minute: float, burst: int, max_keys: int = 100000) -> None:
+        self.rate = per_minute / 60.0
+        self.burst = max(1, burst)
+        self.max_keys = max_keys
+        # anahtar → [jeton, son güncelleme zamanı]
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+        self.limited = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def check(self, key: str) -> None:
+        """Jeton harcar; kova boşsa RateLimitedError fırlatır"""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(self.burst), now]
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] < 1.0:
+            self.limited += 1
+            raise RateLimitedError(_clamp_retry_after((1.0 - bucket[0]) / self.rate))
+        bucket[0] -= 1.0
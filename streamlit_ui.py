@@ -19,11 +19,12 @@ TEMEL ÖZELLİKLER
 
 KURULUM · ÇALIŞTIRMA · YAYINLAMA
 ────────────────────────────────────────────
-pip install streamlit requests
+pip install streamlit requests websockets
 streamlit run streamlit_ui.py
 —
 Streamlit Cloud, Deta, Heroku vb. platformlarda kolayca çalışır.
-API_URL ortam değişkeniyle backend adresi dışardan ayarlanabilir.
+API_URL ortam değişkeniyle backend adresi dışardan ayarlanabilir; USE_WEBSOCKET=true ile
+mesajlar tek bir kalıcı WebSocket bağlantısından (/chat/ws) gönderilir.
 ════════════════════════════════════════════════════════════════════════════════
 """
 
@@ -40,6 +41,15 @@ import streamlit as st
 # 📡 BACKEND BAĞLANTISI / API URL
 # ════════════════════════════════════════════════════════════════════════════
 API_URL = os.getenv("API_URL", "https://akilli-doktor-asistani-buef.onrender.com/chat")
+# Akış (SSE) endpoint'i: yanıt token token gelir, ilk kelime saniyeler yerine anında görünür
+API_STREAM_URL = os.getenv("API_STREAM_URL", API_URL.rstrip("/") + "/stream")
+USE_STREAMING = os.getenv("USE_STREAMING", "true").lower() == "true"
+# WebSocket kanalı: profil/oturum bağlantıda bir kez gönderilir, her mesaj aynı bağlantıdan akar
+# (mesaj başına HTTP isteği ve doğrulama yok). Açıkken USE_STREAMING yerine geçer
+API_WS_URL = os.getenv(
+    "API_WS_URL", API_URL.replace("https://", "wss://").replace("http://", "ws://").rstrip("/") + "/ws"
+)
+USE_WEBSOCKET = os.getenv("USE_WEBSOCKET", "false").lower() == "true"
 
 # ════════════════════════════════════════════════════════════════════════════
 # 🎨 TASARIM SİSTEMİ VE STİLLER
@@ -389,24 +399,140 @@ def send_and_append(message_text: str):
 
     append_message("Kullanıcı", message_text.strip())
 
+    payload = {
+        "name": user_name,
+        "age": int(age_txt),
+        "gender": normalize_gender(gender),               # (Backend kullanmasa da ileriye dönük)
+        "message": message_text.strip(),
+        "session_id": st.session_state.current_chat_id,
+    }
     try:
-        payload = {
-            "name": user_name,
-            "age": int(age_txt),
-            "gender": normalize_gender(gender),               # (Backend kullanmasa da ileriye dönük)
-            "message": message_text.strip(),
-            "session_id": st.session_state.current_chat_id,
-        }
-        with st.spinner("Yanıt hazırlanıyor..."):
-            resp = requests.post(API_URL, json=payload, timeout=90)
-        if resp.status_code == 200:
+        if USE_WEBSOCKET:
+            reply = ws_reply(payload)
+        elif USE_STREAMING:
+            reply = stream_reply(payload)
+        else:
+            with st.spinner("Yanıt hazırlanıyor..."):
+                resp = requests.post(API_URL, json=payload, timeout=90,
+                                     headers={"X-Request-Timeout": "85"})
+            if resp.status_code != 200:
+                st.error(f"Sunucu hatası [{resp.status_code}]: {resp.text}")
+                return
             reply = resp.json().get("response", "")
+        if reply is not None:
             append_message("Asistan", reply)
-        else:
-            st.error(f"Sunucu hatası [{resp.status_code}]: {resp.text}")
-    except requests.RequestException as exc:
+    except (requests.RequestException, OSError) as exc:
         st.error(f"Bağlantı hatası: {exc}")
 
+def show_typing(placeholder, parts):
+    """Akan yanıtı geçici "yazıyor…" balonunda gösterir"""
+    placeholder.markdown(
+        f"""
+        <div class="row left">
+          <div class="bubble bot">
+            <b>Asistan</b><span class="stamp">· yazıyor…</span><br>
+            {render_bubble_text("".join(parts))}
+          </div>
+        </div>
+        """,
+        unsafe_allow_html=True,
+    )
+
+def stream_reply(payload: dict):
+    """
+    /chat/stream endpoint'inden SSE parçalarını okur ve geçici bir balonda canlı gösterir.
+    Tam yanıtı döndürür; hata durumunda kullanıcıyı bilgilendirip None döner.
+    """
+    placeholder = st.empty()
+    parts = []
+    event = None
+    with requests.post(API_STREAM_URL, json=payload, stream=True, timeout=(10, 90)) as resp:
+        if resp.status_code != 200:
+            st.error(f"Sunucu hatası [{resp.status_code}]: {resp.text}")
+            return None
+        for line in resp.iter_lines(decode_unicode=True):
+            if not line:
+                event = None
+                continue
+            if line.startswith("event:"):
+                event = line[6:].strip()
+                continue
+            if not line.startswith("data:"):
+                continue
+            data = json.loads(line[5:].strip())
+            if event == "error":
+                st.error(f"Sunucu hatası: {data.get('detail', '')}")
+                return None
+            if event == "done":
+                return data.get("response", "".join(parts))
+            parts.append(data.get("delta", ""))
+            show_typing(placeholder, parts)
+    # "done" olayı gelmeden akış bittiyse sunucu turu hafızaya yazmamıştır
+    placeholder.empty()
+    st.error("Yanıt akışı yarıda kesildi. Lütfen tekrar deneyin.")
+    return None
+
+def ws_connection(payload: dict):
+    """
+    Profil + sohbet başına tek WebSocket bağlantısı (st.session_state'te saklanır, yeniden
+    çizimlerde korunur). Profil değişince eski bağlantı kapatılıp yenisi açılır.
+    """
+    from urllib.parse import urlencode
+    from websockets.sync.client import connect
+
+    key = (payload["name"], payload["age"], payload["gender"], payload["session_id"])
+    conns = st.session_state.setdefault("ws_conns", {})
+    conn = conns.get(key)
+    if conn is None:
+        for old in conns.values():
+            old.close()
+        conns.clear()
+        query = urlencode({k: payload[k] for k in ("name", "age", "gender", "session_id")})
+        conn = connect(f"{API_WS_URL}?{query}", open_timeout=10)
+        json.loads(conn.recv(timeout=10))  # {"type": "ready", ...}
+        conns[key] = conn
+    return conn
+
+def ws_reply(payload: dict):
+    """
+    /chat/ws kanalından yanıtı okur ve geçici bir balonda canlı gösterir. Bağlantı kopmuşsa
+    (sunucu yeniden başladı, boşta kapatıldı) bir kez yeniden bağlanır.
+    Tam yanıtı döndürür; hata durumunda kullanıcıyı bilgilendirip None döner.
+    """
+    from websockets.exceptions import ConnectionClosed
+
+    placeholder = st.empty()
+    parts = []
+    for attempt in range(2):
+        conn = ws_connection(payload)
+        try:
+            conn.send(payload["message"])
+            while True:
+                frame = json.loads(conn.recv(timeout=90))
+                kind = frame.get("type")
+                if kind == "delta":
+                    parts.append(frame.get("delta", ""))
+                    show_typing(placeholder, parts)
+                elif kind == "done":
+                    return frame.get("response", "".join(parts))
+                elif kind == "error":
+                    placeholder.empty()
+                    st.error(f"Sunucu hatası [{frame.get('status', '')}]: {frame.get('detail', '')}")
+                    return None
+                # ping: sunucu kalp atışı, yok sayılır
+        except ConnectionClosed:
+            st.session_state["ws_conns"].clear()
+            if parts or attempt:
+                break  # yanıt yarıda kesildi: sunucu turu hafızaya yazmamıştır
+        except TimeoutError:
+            # Geç gelen parçalar sonraki mesaja karışmasın: bağlantı kapatılır (sunucu turu iptal eder)
+            conn.close()
+            st.session_state["ws_conns"].clear()
+            break
+    placeholder.empty()
+    st.error("Yanıt akışı yarıda kesildi. Lütfen tekrar deneyin.")
+    return None
+
 # ════════════════════════════════════════════════════════════════════════════
 # 📐 SAYFA DÜZENİ — Sol: Sohbetler/Profil · Orta: Chat (chat üstte, butonlar altta)
 # ════════════════════════════════════════════════════════════════════════════
@@ -521,6 +647,7 @@ with col_chat:
     # (3) Hızlı başlat çipleri — Görsel olarak iyileştirildi
     st.caption("⚡ Hızlı başlat (örnek rahatsızlıklar)")
     st.markdown('<div class="chips">', unsafe_allow_html=True)
+    # Not: Bu sorular API'de ilk tur yanıt önbelleğinin anahtarıdır (asistan_onbellek.CHIP_PROMPTS ile aynı tutun)
     chip_data = [
         ("🤕 Baş ağrısı",       "Başım ağrıyor; ne yapmalıyım?"),
         ("🌡️ Ateş",             "Ateşim var; evde neler yapabilirim?"),
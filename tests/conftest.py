@@ -0,0 +1,24 @@
+"""
+Ortak test ortamı: sahte model, ağ/API anahtarı yok.
+
+Yapılandırma asistan_api yüklenirken okunduğu için ortam, testler içe aktarılmadan önce
+burada ayarlanır (tüm test dosyaları aynı süreçte aynı yapılandırmayı paylaşır).
+"""
+
+import os
+import sys
+
+os.environ.pop("GOOGLE_API_KEY", None)
+os.environ.update(
+    LLM_PROVIDER="fake",
+    FAKE_LLM_TTFT_MS="300",
+    FAKE_LLM_TTFT_SIGMA="0",
+    FAKE_LLM_TOKENS_PER_SEC="0",
+    FAKE_LLM_ERROR_RATE="0",
+    RESPONSE_CACHE_PREWARM="false",
+    RATE_LIMIT_PER_MINUTE="0",
+    # Profil yalnızca X-Debug-Profile başlığıyla açılır (örnekleme kapalı)
+    ADMIN_TOKEN="test-admin",
+    PROFILE_SAMPLE_RATE="0",
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
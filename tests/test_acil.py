@@ -0,0 +1,37 @@
+"""
+Acil belirti eşleyicisi testi: gerçek acil ifadeler yakalanmalı, aynı kökleri içeren sıradan
+sorular 112 uyarısı almamalı (uyarı ayrıca yuva kuyruğunun önüne geçirir).
+"""
+
+import pytest
+
+from asistan_acil import detect_emergency
+
+
+@pytest.mark.parametrize("message, category", [
+    ("Göğsümde ağrı var, sol koluma vuruyor", "chest_pain"),
+    ("Nefes alamıyorum", "breathing"),
+    ("Çocuğun dudakları morardı", "breathing"),
+    ("Babamın yüzü morarıyor", "breathing"),
+    ("Annem bayıldı, uyandıramıyoruz", "unconscious"),
+    ("Babam aniden konuşamıyor, yüzü kaydı", "stroke"),
+    ("Dili dolaşıyor ve kolunu kaldıramıyor", "stroke"),
+    ("Kardeşim zehirlendi galiba", "poisoning"),
+    ("Çocuk zehir içti", "poisoning"),
+    ("Bir kutu ilaç içtim", "poisoning"),
+    ("GOGSUM AGRIYOR", "chest_pain"),
+])
+def test_emergency_phrases_are_detected(message, category):
+    assert category in detect_emergency(message)
+
+
+@pytest.mark.parametrize("message", [
+    "Dizim çarpınca morardı",
+    "Bacağımda morarma var, geçer mi?",
+    "Bebeğim henüz konuşamıyor, normal mi?",
+    "Gıda zehirlenmesi sonrası ishal devam ediyor",
+    "Zehirlenme belirtileri nelerdir?",
+    "Başım ağrıyor; ne yapmalıyım?",
+])
+def test_ordinary_questions_are_not_emergencies(message):
+    assert detect_emergency(message) == []
@@ -0,0 +1,42 @@
+"""
+Eşzamanlılık testi: /chat çağrıları event loop'u bloklamamalı.
+
+Sahte model (LLM_PROVIDER=fake) sabit gecikmeyle yanıt verir; N paralel istek ~1 gecikmede
+bitmelidir (LLM çağrısı loop'u bloklasaydı süre ~N × gecikme olurdu).
+"""
+
+import asyncio
+import time
+
+import httpx
+
+import asistan_api
+
+LATENCY = 0.3
+PARALLEL = 20
+
+
+async def _parallel_chats(n: int) -> float:
+    transport = httpx.ASGITransport(app=asistan_api.app)
+    async with asistan_api.lifespan(asistan_api.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+            # Farklı kullanıcı ve soru: önbellek ve istek birleştirme devreye girmez, her istek LLM'e gider
+            payloads = [
+                {"name": f"Kullanici{i}", "age": 30, "gender": "Kadın",
+                 "message": f"Soru {i}: dizimde ağrı var", "session_id": f"test-{i}"}
+                for i in range(n)
+            ]
+            start = time.monotonic()
+            responses = await asyncio.gather(*(client.post("/chat", json=p) for p in payloads))
+            elapsed = time.monotonic() - start
+    assert [r.status_code for r in responses] == [200] * n
+    assert all(r.json()["response"] for r in responses)
+    return elapsed
+
+
+def test_parallel_chats_do_not_block_event_loop():
+    calls_before = asistan_api.runner.llm.calls
+    elapsed = asyncio.run(_parallel_chats(PARALLEL))
+    assert asistan_api.runner.llm.calls - calls_before == PARALLEL
+    # Seri çalışsaydı PARALLEL × LATENCY (6 sn) sürerdi
+    assert elapsed < LATENCY * 3, f"{PARALLEL} paralel istek {elapsed:.2f} sn sürdü"
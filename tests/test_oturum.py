@@ -0,0 +1,45 @@
+"""
+Oturum deposu testi: turu süren oturum, başka oturumların eklenmesiyle kapasiteden atılmamalı.
+
+max_sessions=1 iken A'nın turu sürerken B oluşturulur; A'nın turu hafızada kalmalı ve kalıcı
+arka uca yazılmalıdır (atılsaydı save_context artık depoda olmayan bir nesneye yazardı).
+"""
+
+import asyncio
+
+from langchain.memory import ConversationBufferMemory
+
+from asistan_depo import create_backend
+from asistan_oturum import SessionLocks, SessionStore
+
+
+def _memory() -> ConversationBufferMemory:
+    return ConversationBufferMemory(return_messages=True)
+
+
+def test_in_flight_session_is_not_evicted(tmp_path):
+    async def scenario():
+        locks = SessionLocks(max_queue=4)
+        store = SessionStore(max_sessions=1, max_bytes=10**9, ttl_seconds=0,
+                             backend=create_backend("sqlite", str(tmp_path / "oturum.db")),
+                             in_use=locks.busy)
+        async with locks.reserve("a:1"):
+            session_a = store.get_or_create("a:1", _memory)
+            # A'nın LLM çağrısı sürerken B'nin ilk mesajı gelir
+            async with locks.reserve("b:1"):
+                store.get_or_create("b:1", _memory)
+                assert "a:1" in store
+            session_a.memory.save_context({"input": "merhaba"}, {"response": "Merhaba"})
+            store.update_size("a:1")
+            assert store.get("a:1") is session_a
+        # Tur bitti: A artık korunmaz; sonraki ekleme sınırı geri indirir, A diske yazılır
+        store.get_or_create("c:1", _memory)
+        assert len(store) == 1
+        store.flush()
+        return store
+
+    store = asyncio.run(scenario())
+    restored = store.get("a:1")
+    assert restored is not None
+    assert [m.content for m in restored.memory.chat_memory.messages] == ["merhaba", "Merhaba"]
+    store.backend.close()
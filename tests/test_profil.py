@@ -0,0 +1,41 @@
+"""
+Profil testi: /chat/batch öğeleri eşzamanlı çalışırken span yolları birbirine karışmamalı.
+
+Her öğe ayrı bir görevde işlenir; span yolu görev başına ContextVar'dan kurulduğu için tüm
+span'ler izin kökünün doğrudan altında görünmelidir.
+"""
+
+import asyncio
+
+import httpx
+
+import asistan_api
+
+
+async def _profiled_batch(items: list) -> dict:
+    transport = httpx.ASGITransport(app=asistan_api.app)
+    async with asistan_api.lifespan(asistan_api.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+            resp = await client.post("/chat/batch", json=items,
+                                     headers={"X-Debug-Profile": asistan_api.ADMIN_TOKEN})
+            assert resp.status_code == 200
+            trace_id = resp.headers["x-trace-id"]
+            traces = await client.get("/admin/traces", params={"limit": 10},
+                                      headers={"X-Admin-Token": asistan_api.ADMIN_TOKEN})
+    assert traces.status_code == 200
+    return next(t for t in traces.json()["traces"] if t["id"] == trace_id)
+
+
+def test_batch_span_paths_are_not_interleaved():
+    items = [
+        {"name": f"Profil{i}", "age": 40, "gender": "Erkek",
+         "message": f"Profil sorusu {i}: omzum ağrıyor", "session_id": f"profil-{i}"}
+        for i in range(4)
+    ]
+    items.append({"name": "Profil9", "age": 40, "gender": "Erkek", "message": "göğsümde ağrı var"})
+    trace = asyncio.run(_profiled_batch(items))
+
+    spans = [s for s in trace["spans"] if s["name"] != "parse_validate"]
+    assert len([s for s in spans if s["name"] == "llm"]) == len(items)
+    for s in spans:
+        assert s["path"] == f"POST /chat/batch;{s['name']}", s["path"]
@@ -0,0 +1,70 @@
+"""
+Yönlendirici testi: çok süreçli modda /chat/batch öğeleri oturumlarının worker'ına bölünür ve
+sonuçlar asıl sıralarıyla tek NDJSON akışında birleşir.
+
+İki gerçek worker süreci başlatılır (sahte model; ortam conftest.py'den devralınır).
+"""
+
+import asyncio
+import json
+import socket
+
+import httpx
+
+from asistan_oturum import session_key_for
+from asistan_yonlendirici import HashRing, WorkerPool, create_router
+
+
+def _free_port_pair() -> int:
+    """Ardışık iki boş port bulur (worker'lar base_port, base_port + 1 kullanır)"""
+    for _ in range(50):
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            base = probe.getsockname()[1]
+        try:
+            with socket.socket() as second:
+                second.bind(("127.0.0.1", base + 1))
+            return base
+        except OSError:
+            continue
+    raise RuntimeError("boş port bulunamadı")
+
+
+async def _batch_through_router(items: list):
+    pool = WorkerPool(2, _free_port_pair())
+    router = create_router(pool)
+    transport = httpx.ASGITransport(app=router)
+    async with router.router.lifespan_context(router):
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=60) as client:
+            resp = await client.post("/chat/batch", json=items)
+            lines = [json.loads(line) for line in resp.text.splitlines() if line.strip()]
+            stats = await client.get("/router/stats")
+            sessions = [
+                (await client.get("/session/stats",
+                                  params={"name": item["name"], "session_id": item["session_id"]})).json()
+                for item in items if item.get("session_id")
+            ]
+    return resp, lines, stats.json(), sessions, pool
+
+
+def test_batch_spanning_workers_is_split_and_merged():
+    items = [
+        {"name": f"Bolum{i}", "age": 35, "gender": "Kadın",
+         "message": f"Soru {i}: dirseğim ağrıyor", "session_id": f"bolum-{i}"}
+        for i in range(8)
+    ]
+    items.append({"name": "Oturumsuz", "age": 35, "gender": "Kadın", "message": "Sırtım ağrıyor"})
+    items[5]["message"] = "Göğsümde ağrı var"  # acil öğe: index eşlemesini doğrulamak için
+    resp, lines, stats, sessions, pool = asyncio.run(_batch_through_router(items))
+
+    ring = HashRing(pool.urls)
+    owners = {ring.node_for(session_key_for(i["name"], i["session_id"])) for i in items if i.get("session_id")}
+    assert len(owners) == 2, "test öğeleri iki worker'a da düşmeli"
+    assert resp.status_code == 200
+    assert sorted(line["index"] for line in lines) == list(range(len(items)))
+    assert all(line["status"] == 200 for line in lines)
+    # index asıl sıraya çevrilmiştir: acil işaretli tek satır acil öğenin sırasını taşır
+    assert [line["index"] for line in lines if line["emergency"]] == [5]
+    # Oturumlar iki worker'a da düşer ve her oturum kendi worker'ında hafızaya yazılmıştır
+    assert all(w["routed"] > 0 for w in stats["workers"]), stats
+    assert all(s["messages"] == 3 for s in sessions), sessions